@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from auto_metamask import *
+from bench import EXTENSION_DIR, RECOVERY_PHRASE, PASSWORD, percentile
+
+# Latency of single actions on the webdriver and cdp backends, with the
+# stand-in extension of the offline benchmark.
+#
+#   python actions.py --repeat 200
+
+ACTIONS = ['script', 'find', 'wait', 'click', 'type']
+
+
+def measure(session, repeat):
+    page = session.page
+    catalog = session.catalog
+    samples = {action: [] for action in ACTIONS}
+
+    def timed(action, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        samples[action].append(time.perf_counter() - start)
+        return result
+
+    for _ in range(repeat):
+        timed('script', page.execute_script, 'return document.readyState;')
+        timed('find', catalog.find, page, 'send-button')
+        timed('wait', session.wait.until, catalog.clickable('send-button'))
+        tab = catalog.find(page, 'activity-tab')
+        timed('click', tab.click)
+
+    page.get(session.metamask_url + '#settings/networks/add-network')
+    field = session.wait.until(catalog.visible('network-form-input', n=1))
+    for _ in range(repeat):
+        timed('type', field.send_keys, 'x')
+    page.get(session.metamask_url + '#')
+    return samples
+
+
+def run(args, backend):
+    session = MetaMaskSession(EXTENSION_DIR, args.chrome, args.version, args.chromedriver,
+                              approvals='home', backend=backend)
+    try:
+        session.setupMetamask(RECOVERY_PHRASE, PASSWORD)
+        return measure(session, args.repeat)
+    finally:
+        session.quit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-action latency of the webdriver and cdp backends')
+    parser.add_argument('--repeat', type=int, default=100, help='samples per action')
+    parser.add_argument('--chrome', help='Chrome browser path')
+    parser.add_argument('--version', help='Chrome browser version')
+    parser.add_argument('--chromedriver', help='Chromedriver path')
+    args = parser.parse_args()
+
+    results = {backend: run(args, backend) for backend in ('webdriver', 'cdp')}
+
+    print('{:<10}{:>14}{:>14}{:>14}{:>14}{:>10}'.format(
+        'action', 'webdriver p50', 'webdriver p95', 'cdp p50', 'cdp p95', 'speedup'))
+    for action in ACTIONS:
+        w, c = results['webdriver'][action], results['cdp'][action]
+        print('{:<10}{:>12.2f}ms{:>12.2f}ms{:>12.2f}ms{:>12.2f}ms{:>9.1f}x'.format(
+            action, percentile(w, 50) * 1000, percentile(w, 95) * 1000,
+            percentile(c, 50) * 1000, percentile(c, 95) * 1000, percentile(w, 50) / percentile(c, 50)))
@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from auto_metamask import *
+from rpc import serveRpc
+
+# Offline benchmark of the public API. Drives a stand-in extension (extension/)
+# rendering the same data-testid elements as MetaMask 10.34, and a dapp (dapp/)
+# served on 127.0.0.1, so no download, public dapp or RPC is involved.
+#
+#   python bench.py --sessions 3 --rounds 5 --save baseline.json
+#   python bench.py --baseline baseline.json --threshold 0.2
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+EXTENSION_DIR = os.path.join(HERE, 'extension')
+DAPP_DIR = os.path.join(HERE, 'dapp')
+
+# Test account, please do not use for production environment
+RECOVERY_PHRASE = 'whip squirrel shine cabin access spell arrow review spread code fire marine'
+PASSWORD = 'testtest'
+
+APIS = ['setupMetamask', 'addNetwork', 'addNetworks', 'importAccounts', 'switchAccount', 'connect', 'confirm', 'approveTokens', 'waitPending', 'waitReceipts', 'drainPending']
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serveDapp():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=DAPP_DIR))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class Bench:
+
+    def __init__(self, args):
+        self.args = args
+        self.samples = {api: [] for api in APIS}
+        self.failures = {api: 0 for api in APIS}
+        self.memory = []
+
+    def timed(self, api, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.samples[api].append(time.perf_counter() - start)
+        # Wallet methods return None or an OperationResult, falsy when they failed
+        if isinstance(result, OperationResult) and not result.ok:
+            self.failures[api] += 1
+        return result
+
+    def click(self, driver, button_id):
+        WebDriverWait(driver, 20, 0.05).until(
+            EC.element_to_be_clickable((By.ID, button_id))).click()
+
+    def dappResult(self, driver, api, result):
+        # A request the wallet handled can still fail on the dapp side, it shows the outcome
+        if isinstance(result, OperationResult) and not result.ok:
+            return
+        try:
+            WebDriverWait(driver, 10, 0.05).until(
+                lambda d: d.find_element(By.ID, 'status').get_attribute('data-state') != 'pending')
+            ok = driver.find_element(By.ID, 'status').get_attribute('data-state') == 'ok'
+        except Exception:
+            ok = False
+        if not ok:
+            self.failures[api] += 1
+
+    def sentHash(self, driver):
+        try:
+            return json.loads(driver.find_element(By.ID, 'status').get_attribute('data-result'))
+        except Exception:
+            return None
+
+    def session(self, dapp_url, rpc_url):
+        args = self.args
+        session = MetaMaskSession(EXTENSION_DIR, args.chrome, args.version, args.chromedriver,
+                                  wait_engine=args.wait_engine, navigation=args.navigation, approvals=args.approvals,
+                                  profile=args.profile)
+        driver = session.driver
+        try:
+            self.timed('setupMetamask', session.setupMetamask, RECOVERY_PHRASE, PASSWORD)
+            self.timed('addNetwork', session.addNetwork, 'BENCH', rpc_url, '1337', 'ETH')
+            if args.networks:
+                self.timed('addNetworks', session.addNetworks, [
+                    ('BENCH-{}'.format(i), dapp_url + 'rpc/{}'.format(i), str(2000 + i), 'ETH') for i in range(args.networks)])
+            if args.accounts:
+                addresses = self.timed('importAccounts', session.importAccounts, [
+                    '{:064x}'.format(i + 1) for i in range(args.accounts)]).value or []
+                for address in addresses[:5]:
+                    self.timed('switchAccount', session.switchAccount, address)
+
+            driver.switch_to.new_window('tab')
+            driver.get(dapp_url)
+
+            self.click(driver, 'connectButton')
+            self.dappResult(driver, 'connect', self.timed('connect', session.connect))
+
+            for _ in range(args.rounds):
+                self.click(driver, 'personalSign')
+                self.dappResult(driver, 'confirm', self.timed('confirm', session.confirm))
+
+                self.click(driver, 'sendButton')
+                self.dappResult(driver, 'confirm', self.timed('confirm', session.confirm))
+                tx_hash = self.sentHash(driver)
+                self.timed('waitPending', session.waitPending, 20)
+                if tx_hash:
+                    start = time.perf_counter()
+                    receipts = session.waitReceipts([tx_hash], 20)
+                    self.samples['waitReceipts'].append(time.perf_counter() - start)
+                    if not receipts.get(tx_hash):
+                        self.failures['waitReceipts'] += 1
+
+                self.click(driver, 'approveTokens')
+                self.dappResult(driver, 'approveTokens', self.timed('approveTokens', session.approveTokens))
+                self.timed('waitPending', session.waitPending, 20)
+
+                # A burst of requests handled in one visit
+                for button in ('personalSign', 'sendButton', 'approveTokens'):
+                    self.click(driver, button)
+                start = time.perf_counter()
+                outcomes = session.drainPending()
+                self.samples['drainPending'].append(time.perf_counter() - start)
+                if len(outcomes) != 3 or not all(o['ok'] for o in outcomes):
+                    self.failures['drainPending'] += 1
+                session.waitPending(20)
+
+            usage = session.memoryUsage()
+            if usage:
+                self.memory.append(usage['pss'] or usage['rss'])
+        finally:
+            session.quit()
+
+    def run(self):
+        server = serveDapp()
+        rpc = serveRpc(block_time=self.args.block_time)
+        dapp_url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+        rpc_url = 'http://127.0.0.1:{}/'.format(rpc.server_address[1])
+        try:
+            for _ in range(self.args.sessions):
+                self.session(dapp_url, rpc_url)
+        finally:
+            server.shutdown()
+            rpc.shutdown()
+
+        if self.memory:
+            print('memory per browser: {:.0f} MB mean, {:.0f} MB max'.format(
+                sum(self.memory) / len(self.memory) / 2 ** 20, max(self.memory) / 2 ** 20))
+
+        return {api: {
+            'count': len(values),
+            'failures': self.failures[api],
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+        } for api, values in self.samples.items() if values}
+
+
+def compare(results, baseline, threshold, min_delta):
+    """Regressions of p50/p95 over the baseline, beyond threshold (ratio) and min_delta (seconds)
+    """
+    regressions = []
+    for api, result in results.items():
+        if api not in baseline:
+            continue
+        for key in ('p50', 'p95'):
+            before, after = baseline[api][key], result[key]
+            if after - before > min_delta and after > before * (1 + threshold):
+                regressions.append((api, key, before, after))
+    return regressions
+
+
+def report(results, baseline):
+    print('{:<16}{:>7}{:>10}{:>10}{:>10}{:>10}{:>10}'.format(
+        'function', 'count', 'failed', 'p50', 'p95', 'base p50', 'base p95'))
+    for api in APIS:
+        if api not in results:
+            continue
+        r = results[api]
+        b = baseline.get(api, {})
+        print('{:<16}{:>7}{:>10}{:>9.3f}s{:>9.3f}s{:>10}{:>10}'.format(
+            api, r['count'], r['failures'], r['p50'], r['p95'],
+            '{:.3f}s'.format(b['p50']) if b else '-', '{:.3f}s'.format(b['p95']) if b else '-'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline auto_metamask benchmark')
+    parser.add_argument('--sessions', type=int, default=3, help='browsers launched, each onboards once')
+    parser.add_argument('--rounds', type=int, default=5, help='sign/send/approve rounds per browser')
+    parser.add_argument('--chrome', help='Chrome browser path')
+    parser.add_argument('--version', help='Chrome browser version')
+    parser.add_argument('--chromedriver', help='Chromedriver path')
+    parser.add_argument('--networks', type=int, default=15, help='networks added with one addNetworks call per browser')
+    parser.add_argument('--accounts', type=int, default=100, help='private keys imported with one importAccounts call per browser')
+    parser.add_argument('--block-time', type=float, default=1.0, help='block time of the stand-in RPC node (seconds)')
+    parser.add_argument('--profile', default='stealth', help='launch profile, e.g. stealth or lean-headless')
+    parser.add_argument('--wait-engine', default='event', choices=['event', 'poll'])
+    parser.add_argument('--navigation', default='fast', choices=['fast', 'reload'])
+    parser.add_argument('--approvals', default='notification', choices=['notification', 'home'])
+    parser.add_argument('--trace', help='write the spans of the run to this JSON lines file')
+    parser.add_argument('--save', help='write the results to this file, e.g. as a baseline')
+    parser.add_argument('--baseline', help='results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown ratio, default is 0.2')
+    parser.add_argument('--min-delta', type=float, default=0.05, help='slowdowns below this (seconds) are noise')
+    args = parser.parse_args()
+
+    if args.trace:
+        addSink(JsonLinesSink(args.trace))
+
+    results = Bench(args).run()
+    flushSpans()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    report(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.time(), 'args': vars(args), 'results': results}, f, indent=2)
+
+    status = 0
+    if any(r['failures'] for r in results.values()):
+        print('FAILED: some operations did not complete')
+        status = 1
+    for api, key, before, after in compare(results, baseline, args.threshold, args.min_delta):
+        print('REGRESSION: {} {} {:.3f}s -> {:.3f}s'.format(api, key, before, after))
+        status = 1
+    sys.exit(status)
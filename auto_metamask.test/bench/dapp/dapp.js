@@ -0,0 +1,57 @@
+var output = document.getElementById('status');
+var accounts = [];
+var requests = 0;
+
+function request(method, params) {
+    requests += 1;
+    var id = requests;
+    output.dataset.request = String(id);
+    output.dataset.state = 'pending';
+    delete output.dataset.result;
+    output.textContent = method + ' pending';
+    return window.ethereum.request({method: method, params: params}).then(function (result) {
+        if (output.dataset.request !== String(id)) return result;
+        output.dataset.state = 'ok';
+        output.dataset.result = JSON.stringify(result);
+        output.textContent = method + ': ' + JSON.stringify(result);
+        return result;
+    }, function (error) {
+        if (output.dataset.request === String(id)) {
+            output.dataset.state = 'error';
+            output.textContent = method + ' failed: ' + error.message;
+        }
+        throw error;
+    });
+}
+
+function pad(hex) {
+    return ('0000000000000000000000000000000000000000000000000000000000000000' + hex.replace(/^0x/, '')).slice(-64);
+}
+
+document.getElementById('connectButton').onclick = function () {
+    request('eth_requestAccounts', []).then(function (result) {
+        accounts = result;
+        document.getElementById('accounts').textContent = result.join(', ');
+    });
+};
+
+document.getElementById('personalSign').onclick = function () {
+    request('personal_sign', ['0x4578616d706c652060706572736f6e616c5f7369676e60206d657373616765', accounts[0]]);
+};
+
+document.getElementById('sendButton').onclick = function () {
+    request('eth_sendTransaction', [{from: accounts[0], to: '0x0c54fccd2e384b4bb6f2e405bf5cbc15a017aafb',
+                                     value: '0x0', gasLimit: '0x5208'}]);
+};
+
+document.getElementById('approveTokens').onclick = function () {
+    var spender = '0x9bc5baf874d2da8d216ae9f137804184ee5afef4';
+    request('eth_sendTransaction', [{from: accounts[0], to: '0x5fbdb2315678afecb367f032d93f642f64180aa3',
+                                     data: '0x095ea7b3' + pad(spender) + pad((7).toString(16))}]);
+};
+
+// The provider is injected asynchronously by the extension
+(function enable() {
+    if (!window.ethereum) return setTimeout(enable, 20);
+    Array.prototype.forEach.call(document.querySelectorAll('button'), function (b) { b.disabled = false; });
+})();
@@ -0,0 +1,517 @@
+// UI of home.html and notification.html. Renders the same data-testid and
+// class hooks as MetaMask 10.34, only re-rendering when what is shown changes
+// so that elements found by the automation stay attached.
+
+var bg = chrome.extension.getBackgroundPage().bench;
+var isNotification = location.pathname.indexOf('notification') >= 0;
+var app = document.getElementById('app-content');
+
+var ui = {
+    popover: null,
+    tab: 'assets',
+    showTestNetworks: false,
+    networkAdded: null,
+    words: [],
+    pinStep: 0,
+    requestId: null,
+    requestStep: 0,
+    cap: '',
+    disconnectOrigin: null
+};
+var currentKey = null;
+
+function h(tag, attrs) {
+    var el = document.createElement(tag);
+    Object.keys(attrs || {}).forEach(function (name) {
+        var value = attrs[name];
+        if (value === null || value === undefined || value === false) return;
+        if (name.indexOf('on') === 0) {
+            el.addEventListener(name.slice(2), value);
+        } else if (name === 'disabled' || name === 'checked' || name === 'value') {
+            el[name] = value;
+        } else {
+            el.setAttribute(name, value === true ? '' : value);
+        }
+    });
+    for (var i = 2; i < arguments.length; i++) {
+        append(el, arguments[i]);
+    }
+    return el;
+}
+
+function append(el, child) {
+    if (child === null || child === undefined || child === false) return;
+    if (Array.isArray(child)) {
+        child.forEach(function (c) { append(el, c); });
+    } else {
+        el.appendChild(typeof child === 'string' ? document.createTextNode(child) : child);
+    }
+}
+
+function setRoute(route) {
+    if (location.hash !== route) history.replaceState(null, '', route);
+}
+
+function render(force) {
+    var view = currentView();
+    if (!force && view.key === currentKey) return;
+    currentKey = view.key;
+    while (app.firstChild) app.removeChild(app.firstChild);
+    append(app, view.build());
+}
+
+function rerender() {
+    render(true);
+}
+
+function currentView() {
+    var state = bg.state;
+    if (!bg.ready) {
+        return {key: 'loading', build: function () {
+            return h('div', {'class': 'loading-overlay__container'}, 'Loading');
+        }};
+    }
+
+    if (isNotification) {
+        if (bg.pending.length) return approvalView(bg.pending[0]);
+        return {key: 'done', build: function () {
+            bg.notificationClosing();
+            setTimeout(function () { window.close(); }, 0);
+            return h('div', {'class': 'notification-done'}, 'Done');
+        }};
+    }
+
+    if (!state.onboarded) return onboardingView(bg.onboardingStep);
+    if (!bg.unlocked) return {key: 'unlock', build: unlockView};
+
+    var route = location.hash;
+    if (route.indexOf('#settings/networks/add-network') === 0) return {key: 'add-network', build: addNetworkView};
+    if (route.indexOf('#new-account/import') === 0) return {key: 'import-account', build: importAccountView};
+    if (bg.pending.length) return approvalView(bg.pending[0]);
+
+    var key = JSON.stringify([route, state.network, state.networks.length, state.accounts, state.selected,
+                              state.welcomeSeen, state.connected, state.activity.map(function (tx) { return tx.status; }),
+                              ui.popover, ui.tab, ui.showTestNetworks, ui.networkAdded]);
+    return {key: 'home' + key, build: homeView};
+}
+
+// Onboarding
+
+function onboardingView(step) {
+    var builders = {
+        welcome: welcomeView,
+        metametrics: metametricsView,
+        'import': importSrpView,
+        password: passwordView,
+        complete: completeView,
+        pin: pinView
+    };
+    return {key: 'onboarding-' + step + '-' + ui.pinStep, build: builders[step] || welcomeView};
+}
+
+function welcomeView() {
+    setRoute('#onboarding/welcome');
+    var importButton = h('button', {'class': 'btn-primary', 'data-testid': 'onboarding-import-wallet', disabled: true,
+                                     onclick: function () { bg.setOnboardingStep('metametrics'); }},
+                         'Import an existing wallet');
+    return h('div', {'class': 'onboarding-welcome'},
+        h('h2', {}, "Let's get started"),
+        h('label', {},
+            h('input', {type: 'checkbox', 'data-testid': 'onboarding-terms-checkbox',
+                        onchange: function (e) { importButton.disabled = !e.target.checked; }}),
+            ' I agree to the Terms of use'),
+        importButton);
+}
+
+function metametricsView() {
+    setRoute('#onboarding/metametrics');
+    return h('div', {'class': 'onboarding-metametrics'},
+        h('h2', {}, 'Help us improve MetaMask'),
+        h('button', {'class': 'btn-secondary', 'data-testid': 'metametrics-no-thanks',
+                     onclick: function () { bg.setOnboardingStep('import'); }}, 'No thanks'),
+        h('button', {'class': 'btn-primary', 'data-testid': 'metametrics-i-agree',
+                     onclick: function () { bg.setOnboardingStep('import'); }}, 'I agree'));
+}
+
+function importSrpView() {
+    setRoute('#onboarding/import-with-recovery-phrase');
+    var words = h('div', {'class': 'import-srp__words'});
+    var confirm = h('button', {'class': 'btn-primary', 'data-testid': 'import-srp-confirm', disabled: true,
+                               onclick: function () {
+                                   ui.words = Array.prototype.map.call(words.querySelectorAll('input'), function (i) {
+                                       return i.value.trim();
+                                   });
+                                   bg.setOnboardingStep('password');
+                               }},
+                     'Confirm Secret Recovery Phrase');
+
+    function check() {
+        var inputs = words.querySelectorAll('input');
+        confirm.disabled = !Array.prototype.every.call(inputs, function (i) { return i.value.trim(); });
+    }
+
+    function showWords(count) {
+        while (words.firstChild) words.removeChild(words.firstChild);
+        for (var i = 0; i < count; i++) {
+            words.appendChild(h('div', {'class': 'import-srp__srp-word'},
+                h('label', {}, (i + 1) + '.'),
+                h('input', {type: 'text', 'data-testid': 'import-srp__srp-word-' + i, oninput: check})));
+        }
+        check();
+    }
+
+    var select = h('select', {'class': 'dropdown__select', onchange: function (e) { showWords(Number(e.target.value)); }},
+        [12, 15, 18, 21, 24].map(function (n) {
+            return h('option', {value: String(n)}, 'I have a ' + n + '-word phrase');
+        }));
+    showWords(12);
+
+    return h('div', {'class': 'import-srp'},
+        h('h2', {}, 'Access your wallet with your Secret Recovery Phrase'),
+        h('div', {'class': 'import-srp__container'},
+            h('div', {'class': 'import-srp__dropdown'}, select),
+            words),
+        confirm);
+}
+
+function passwordView() {
+    setRoute('#onboarding/create-password');
+    var newPassword, confirmPassword, terms, submit;
+
+    function check() {
+        submit.disabled = !(newPassword.value.length >= 8 && newPassword.value === confirmPassword.value && terms.checked);
+    }
+
+    newPassword = h('input', {type: 'password', 'data-testid': 'create-password-new', oninput: check});
+    confirmPassword = h('input', {type: 'password', 'data-testid': 'create-password-confirm', oninput: check});
+    terms = h('input', {type: 'checkbox', 'data-testid': 'create-password-terms', onchange: check});
+    submit = h('button', {'class': 'btn-primary', 'data-testid': 'create-password-import', disabled: true,
+                          onclick: function () { bg.createWallet(ui.words, newPassword.value); }},
+               'Import my wallet');
+
+    return h('div', {'class': 'create-password'},
+        h('h2', {}, 'Create password'),
+        h('label', {}, 'New password (8 characters min)', newPassword),
+        h('label', {}, 'Confirm password', confirmPassword),
+        h('label', {}, terms, ' I understand that MetaMask cannot recover this password for me.'),
+        submit);
+}
+
+function completeView() {
+    setRoute('#onboarding/completion');
+    return h('div', {'class': 'creation-successful'},
+        h('h2', {}, 'Wallet creation successful'),
+        h('button', {'class': 'btn-primary', 'data-testid': 'onboarding-complete-done',
+                     onclick: function () { bg.setOnboardingStep('pin'); }}, 'Got it!'));
+}
+
+function pinView() {
+    setRoute('#onboarding/pin-extension');
+    if (ui.pinStep === 0) {
+        return h('div', {'class': 'onboarding-pin-extension'},
+            h('h2', {}, 'Your MetaMask install is complete!'),
+            h('button', {'class': 'btn-primary', 'data-testid': 'pin-extension-next',
+                         onclick: function () { ui.pinStep = 1; rerender(); }}, 'Next'));
+    }
+    return h('div', {'class': 'onboarding-pin-extension'},
+        h('h2', {}, 'Pin MetaMask on your browser'),
+        h('button', {'class': 'btn-primary', 'data-testid': 'pin-extension-done',
+                     onclick: function () { setRoute('#'); bg.finishOnboarding(); }}, 'Done'));
+}
+
+function unlockView() {
+    var password = h('input', {type: 'password', id: 'password', 'data-testid': 'unlock-password'});
+    var error = h('p', {'class': 'unlock-page__error'});
+    return h('div', {'class': 'unlock-page'},
+        h('h2', {}, 'Welcome back!'),
+        password,
+        error,
+        h('button', {'class': 'btn-primary', 'data-testid': 'unlock-submit', onclick: function () {
+            if (!bg.unlock(password.value)) error.textContent = 'Incorrect password';
+        }}, 'Unlock'));
+}
+
+// Home
+
+function homeView() {
+    var state = bg.state;
+    var popover = state.welcomeSeen ? ui.popover : 'welcome';
+
+    // Popovers come first so that lookups by text find their items before the header
+    return [
+        popoverView(popover),
+        h('div', {'class': 'app-header'},
+            h('button', {'class': 'network-display', 'data-testid': 'network-display',
+                         onclick: function () { ui.popover = 'networks'; rerender(); }},
+                h('span', {}, state.network)),
+            h('button', {'data-testid': 'account-menu-icon',
+                         onclick: function () { ui.popover = 'accounts'; rerender(); }}, 'Account'),
+            h('button', {'data-testid': 'account-options-menu-button',
+                         onclick: function () { ui.popover = 'options'; rerender(); }}, '⋮')),
+        h('div', {'class': 'home'},
+            ui.networkAdded && h('div', {'class': 'home__new-network-added'},
+                h('p', {}, '“' + ui.networkAdded + '” was successfully added!'),
+                h('button', {'class': 'btn-primary home__new-network-added__switch-to-button', onclick: function () {
+                    var name = ui.networkAdded;
+                    ui.networkAdded = null;
+                    bg.update(function (s) { s.network = name; });
+                }}, 'Switch to ' + ui.networkAdded)),
+            h('div', {'class': 'eth-overview'},
+                h('div', {'class': 'selected-account'}, state.accounts[state.selected] || ''),
+                h('div', {'class': 'eth-overview__balance'}, '0 ' + currentSymbol()),
+                // Only available when no popover covers the page
+                !popover && h('button', {'class': 'btn-primary', 'data-testid': 'eth-overview-send'}, 'Send')),
+            h('ul', {'class': 'tabs'},
+                h('li', {'data-testid': 'home__asset-tab', onclick: function () { ui.tab = 'assets'; rerender(); }}, 'Assets'),
+                h('li', {'data-testid': 'home__activity-tab', onclick: function () { ui.tab = 'activity'; rerender(); }}, 'Activity')),
+            ui.tab === 'activity' ? activityView() : h('div', {'class': 'asset-list'}, currentSymbol()))
+    ];
+}
+
+function currentSymbol() {
+    var state = bg.state;
+    var network = state.networks.filter(function (n) { return n.name === state.network; })[0];
+    return network ? network.symbol : 'ETH';
+}
+
+function activityView() {
+    var activity = bg.state.activity;
+    if (!activity.length) return h('div', {'class': 'transaction-list__empty'}, 'You have no transactions');
+    return h('div', {'class': 'transaction-list'}, activity.map(function (tx) {
+        return h('div', {'class': 'transaction-list-item'},
+            h('span', {}, tx.type === 'allowance' ? 'Approve spend limit' : 'Send'),
+            h('div', {'class': 'transaction-status-label transaction-status-label--' + tx.status},
+                tx.status === 'pending' ? 'Pending' : 'Confirmed'));
+    }));
+}
+
+function closePopover() {
+    ui.popover = null;
+    rerender();
+}
+
+function popoverView(popover) {
+    var state = bg.state;
+    if (popover === 'welcome') {
+        return h('section', {'class': 'popover-wrap whats-new-popup__popover'},
+            h('header', {}, "What's new",
+                h('button', {'data-testid': 'popover-close', 'aria-label': 'Close', onclick: function () {
+                    bg.update(function (s) { s.welcomeSeen = true; });
+                }}, '×')),
+            h('p', {}, 'Stand-in extension for offline benchmarks'));
+    }
+
+    if (popover === 'networks') {
+        var networks = state.networks.filter(function (n) { return ui.showTestNetworks || !n.test; });
+        return h('section', {'class': 'popover-wrap multichain-network-list-menu'},
+            h('label', {'class': 'toggle-button', onclick: function () {
+                ui.showTestNetworks = !ui.showTestNetworks;
+                rerender();
+            }}, h('div', {'class': 'toggle-button__status'}, ui.showTestNetworks ? 'On' : 'Off'), 'Show test networks'),
+            h('div', {'class': 'multichain-network-list-menu__networks'}, networks.map(function (n) {
+                return h('div', {'class': 'multichain-network-list-item'},
+                    h('span', {onclick: function () {
+                        ui.popover = null;
+                        bg.update(function (s) { s.network = n.name; });
+                    }}, n.name));
+            })),
+            h('button', {'class': 'btn-secondary', onclick: function () {
+                ui.popover = null;
+                location.hash = '#settings/networks/add-network';
+            }}, 'Add network'));
+    }
+
+    if (popover === 'accounts') {
+        return h('section', {'class': 'multichain-account-menu-popover'},
+            state.accounts.map(function (address, index) {
+                return h('div', {'class': 'multichain-account-list-item', onclick: function () {
+                    ui.popover = null;
+                    bg.update(function (s) { s.selected = index; });
+                }}, address);
+            }),
+            h('button', {'class': 'mm-button-base mm-button-base--size-sm'}, 'Add account'),
+            h('button', {'class': 'mm-button-base mm-button-base--size-sm', onclick: function () {
+                ui.popover = null;
+                location.hash = '#new-account/import';
+            }}, 'Import account'),
+            h('button', {'class': 'mm-button-base mm-button-base--size-sm'}, 'Add hardware wallet'),
+            h('button', {'class': 'btn-secondary', onclick: closePopover}, 'Close'));
+    }
+
+    if (popover === 'options') {
+        return h('div', {'class': 'menu'},
+            h('button', {'data-testid': 'global-menu-connected-sites', onclick: function () {
+                ui.popover = 'connected';
+                rerender();
+            }}, 'Connected sites'),
+            h('button', {'class': 'btn-secondary', onclick: closePopover}, 'Close'));
+    }
+
+    if (popover === 'connected') {
+        // Same nesting as MetaMask, automation addresses the first site by position
+        return h('div', {id: 'popover-content'},
+            h('div', {},
+                h('div', {},
+                    h('section', {},
+                        h('div', {'class': 'connected-sites__header'}, 'Connected sites'),
+                        h('div', {},
+                            h('main', {}, state.connected.map(function (origin) {
+                                return h('div', {'class': 'connected-sites-list__content-row'},
+                                    h('span', {}, origin),
+                                    h('a', {href: '#', onclick: function (e) {
+                                        e.preventDefault();
+                                        ui.disconnectOrigin = origin;
+                                        ui.popover = 'disconnect';
+                                        rerender();
+                                    }}, 'Disconnect'));
+                            })))))));
+    }
+
+    if (popover === 'disconnect') {
+        return h('section', {'class': 'popover-wrap'},
+            h('p', {}, 'Disconnect ' + ui.disconnectOrigin + '?'),
+            h('button', {'class': 'btn-secondary', onclick: closePopover}, 'Cancel'),
+            h('button', {'class': 'btn-primary', onclick: function () {
+                ui.popover = null;
+                bg.disconnect(ui.disconnectOrigin);
+            }}, 'Disconnect'));
+    }
+    return null;
+}
+
+function addNetworkView() {
+    var fields = ['Network name', 'New RPC URL', 'Chain ID', 'Currency symbol'];
+    var inputs = fields.map(function (label) {
+        return h('input', {type: 'text', 'aria-label': label, oninput: check});
+    });
+    var save = h('button', {'class': 'btn-primary', disabled: true, onclick: function () {
+        var network = {name: inputs[0].value.trim(), rpcUrl: inputs[1].value.trim(), chainId: inputs[2].value.trim(),
+                       symbol: inputs[3].value.trim(), test: false};
+        ui.networkAdded = network.name;
+        setRoute('#');
+        bg.update(function (s) {
+            s.networks = s.networks.filter(function (n) { return n.name !== network.name; }).concat([network]);
+        });
+    }}, 'Save');
+
+    function check() {
+        save.disabled = !inputs.every(function (i) { return i.value.trim(); });
+    }
+
+    return h('div', {'class': 'networks-tab__add-network-form'},
+        h('div', {'class': 'networks-tab__add-network-form-body'},
+            fields.map(function (label, index) {
+                return h('label', {}, label, inputs[index]);
+            })),
+        h('div', {'class': 'networks-tab__add-network-form-footer'},
+            h('button', {'class': 'btn-secondary', onclick: function () { location.hash = '#'; }}, 'Cancel'),
+            save));
+}
+
+function importAccountView() {
+    var key = h('input', {type: 'password', id: 'private-key-box'});
+    return h('div', {'class': 'new-account-import-form'},
+        h('h2', {}, 'Import account'),
+        key,
+        h('button', {'class': 'btn-primary', 'data-testid': 'import-account-confirm-button', onclick: function () {
+            if (!key.value.trim()) return;
+            setRoute('#');
+            bg.importAccount(key.value.trim());
+        }}, 'Import'));
+}
+
+// Dapp requests
+
+var APPROVAL_ROUTES = {
+    connect: '#connect/',
+    signature: '#signature-request/',
+    transaction: '#confirm-transaction/',
+    allowance: '#token-allowance/'
+};
+
+function approvalView(request) {
+    if (ui.requestId !== request.id) {
+        ui.requestId = request.id;
+        ui.requestStep = 0;
+        ui.cap = '';
+    }
+    return {key: 'approval-' + request.id + '-' + ui.requestStep, build: function () {
+        setRoute(APPROVAL_ROUTES[request.type] + request.id);
+        return h('div', {'class': 'page-container'},
+            h('div', {'class': 'page-container__header'}, request.origin),
+            h('div', {'class': 'page-container__content'}, approvalContent(request)),
+            approvalFooter(request));
+    }};
+}
+
+function approvalContent(request) {
+    var params = request.params || [];
+    if (request.type === 'connect') {
+        return ui.requestStep === 0
+            ? h('div', {'class': 'permissions-connect-choose-account'}, 'Select the account to use on this site',
+                h('div', {}, bg.state.accounts[bg.state.selected]))
+            : h('div', {'class': 'permission-approval-container'}, 'Allow this site to see your address');
+    }
+    if (request.type === 'signature') {
+        return h('div', {'class': 'request-signature__body'}, 'Message: ' + String(params[0] || ''));
+    }
+    var tx = params[0] || {};
+    if (request.type === 'allowance' && ui.requestStep === 0) {
+        return h('div', {'class': 'token-allowance-container'},
+            h('label', {'for': 'custom-spending-cap'}, 'Custom spending cap'),
+            h('input', {type: 'text', id: 'custom-spending-cap', value: ui.cap, oninput: function (e) {
+                ui.cap = e.target.value;
+                updateNext();
+            }}),
+            h('button', {'class': 'btn-link', onclick: function () {
+                ui.cap = '1000';
+                document.getElementById('custom-spending-cap').value = ui.cap;
+                updateNext();
+            }}, 'Use default'));
+    }
+    return h('div', {'class': 'confirm-page-container-content'},
+        h('div', {}, 'To: ' + (tx.to || '')),
+        h('div', {}, 'Value: ' + (tx.value || '0x0')),
+        request.type === 'allowance' ? h('div', {}, 'Spending cap: ' + ui.cap) : null);
+}
+
+function nextLabel(request) {
+    if (request.type === 'connect') return ui.requestStep === 0 ? 'Next' : 'Connect';
+    if (request.type === 'signature') return 'Sign';
+    if (request.type === 'allowance') return ui.requestStep === 0 ? 'Next' : 'Approve';
+    return 'Confirm';
+}
+
+function isLastStep(request) {
+    return (request.type !== 'connect' && request.type !== 'allowance') || ui.requestStep === 1;
+}
+
+function updateNext() {
+    var next = document.querySelector("[data-testid='page-container-footer-next']");
+    if (next) next.disabled = !ui.cap.trim();
+}
+
+function approvalFooter(request) {
+    var needsCap = request.type === 'allowance' && ui.requestStep === 0;
+    return h('div', {'class': 'page-container__footer'},
+        h('footer', {},
+            h('button', {'class': 'btn-secondary', 'data-testid': 'page-container-footer-cancel', onclick: function () {
+                setRoute('#');
+                bg.reject(request);
+            }}, 'Reject'),
+            h('button', {'class': 'btn-primary', 'data-testid': 'page-container-footer-next',
+                         disabled: needsCap && !ui.cap.trim(), onclick: function () {
+                if (!isLastStep(request)) {
+                    ui.requestStep += 1;
+                    rerender();
+                    return;
+                }
+                setRoute('#');
+                bg.approve(request, ui.cap || null);
+            }}, nextLabel(request))));
+}
+
+bg.subscribe(render);
+window.addEventListener('hashchange', function () { render(); });
+window.addEventListener('unload', function () { bg.unsubscribe(render); });
+render();
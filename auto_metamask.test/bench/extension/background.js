@@ -0,0 +1,318 @@
+// Wallet state shared with home.html and notification.html through
+// chrome.extension.getBackgroundPage().bench. Persisted in chrome.storage.local
+// so that profile snapshots keep the onboarded wallet, the unlocked flag is not.
+
+// Time a sent transaction stays pending (ms)
+var PENDING_TIME = 1000;
+
+var DEFAULT_NETWORKS = [
+    {name: 'Ethereum Mainnet', rpcUrl: 'https://mainnet.infura.io', chainId: '1', symbol: 'ETH', test: false},
+    {name: 'Goerli', rpcUrl: 'https://goerli.infura.io', chainId: '5', symbol: 'GoerliETH', test: true},
+    {name: 'Sepolia', rpcUrl: 'https://sepolia.infura.io', chainId: '11155111', symbol: 'SepoliaETH', test: true}
+];
+
+var bench = {
+    ready: false,
+    unlocked: false,
+    onboardingStep: 'welcome',
+    state: {
+        onboarded: false,
+        password: null,
+        accounts: [],
+        selected: 0,
+        networks: DEFAULT_NETWORKS.slice(),
+        network: 'Ethereum Mainnet',
+        connected: [],
+        activity: [],
+        welcomeSeen: false
+    },
+    // Requests waiting for the user, oldest first
+    pending: [],
+    listeners: [],
+    notificationWindow: null
+};
+
+function save() {
+    chrome.storage.local.set({state: bench.state});
+}
+
+function changed() {
+    bench.listeners.slice().forEach(function (fn) {
+        try {
+            fn();
+        } catch (e) {
+            // The page is gone
+            bench.unsubscribe(fn);
+        }
+    });
+}
+
+bench.subscribe = function (fn) {
+    bench.listeners.push(fn);
+};
+
+bench.unsubscribe = function (fn) {
+    bench.listeners = bench.listeners.filter(function (f) { return f !== fn; });
+};
+
+bench.update = function (fn) {
+    fn(bench.state);
+    save();
+    changed();
+};
+
+bench.setOnboardingStep = function (step) {
+    bench.onboardingStep = step;
+    changed();
+};
+
+bench.createWallet = function (words, password) {
+    bench.unlocked = true;
+    bench.onboardingStep = 'complete';
+    bench.update(function (state) {
+        state.password = password;
+        state.accounts = [addressOf(words.join(' '))];
+    });
+};
+
+bench.finishOnboarding = function () {
+    bench.onboardingStep = 'done';
+    bench.update(function (state) {
+        state.onboarded = true;
+    });
+};
+
+bench.unlock = function (password) {
+    if (password !== bench.state.password) return false;
+    bench.unlocked = true;
+    changed();
+    return true;
+};
+
+bench.importAccount = function (key) {
+    bench.update(function (state) {
+        state.accounts.push(addressOf(key));
+        state.selected = state.accounts.length - 1;
+    });
+};
+
+function addressOf(secret) {
+    // Not a real derivation, a stable 20 byte hex string is all the bench needs
+    var hash = 0x811c9dc5, hex = '';
+    for (var round = 0; round < 5; round++) {
+        for (var i = 0; i < secret.length; i++) {
+            hash = Math.imul(hash ^ secret.charCodeAt(i) ^ round, 16777619) >>> 0;
+        }
+        hex += ('00000000' + hash.toString(16)).slice(-8);
+    }
+    return '0x' + hex;
+}
+
+function currentNetwork() {
+    var state = bench.state;
+    return state.networks.filter(function (n) { return n.name === state.network; })[0] || state.networks[0];
+}
+
+function randomHex(bytes) {
+    var hex = '0x';
+    for (var i = 0; i < bytes; i++) {
+        hex += ('0' + Math.floor(Math.random() * 256).toString(16)).slice(-2);
+    }
+    return hex;
+}
+
+// Dapp requests
+
+function openNotification() {
+    if (bench.notificationWindow !== null) return;
+    bench.notificationWindow = -1;
+    chrome.windows.create({url: 'notification.html', type: 'popup', width: 360, height: 620}, function (win) {
+        bench.notificationWindow = win.id;
+    });
+}
+
+chrome.windows.onRemoved.addListener(function (windowId) {
+    if (windowId !== bench.notificationWindow) return;
+    bench.notificationWindow = null;
+    // Like MetaMask, closing the window rejects what is left
+    bench.pending.splice(0).forEach(function (request) {
+        request.reject({code: 4001, message: 'User rejected the request.'});
+    });
+    changed();
+});
+
+// Called by the notification page before it closes itself, requests coming
+// in meanwhile open a new window
+bench.notificationClosing = function () {
+    bench.notificationWindow = null;
+};
+
+function enqueue(type, origin, params) {
+    return new Promise(function (resolve, reject) {
+        bench.pending.push({id: randomHex(8), type: type, origin: origin, params: params,
+                            resolve: resolve, reject: reject});
+        openNotification();
+        changed();
+    });
+}
+
+bench.approve = function (request, value) {
+    bench.pending = bench.pending.filter(function (r) { return r !== request; });
+    var result;
+    if (request.type === 'connect') {
+        bench.update(function (state) {
+            if (state.connected.indexOf(request.origin) < 0) state.connected.push(request.origin);
+        });
+        result = [bench.state.accounts[bench.state.selected]];
+    } else if (request.type === 'signature') {
+        result = randomHex(65);
+    } else {
+        result = randomHex(32);
+        var hash = result;
+        bench.update(function (state) {
+            state.activity.unshift({hash: hash, type: request.type, value: value || null, status: 'pending'});
+        });
+        setTimeout(function () {
+            bench.update(function (state) {
+                state.activity.forEach(function (tx) {
+                    if (tx.hash === hash) tx.status = 'confirmed';
+                });
+            });
+        }, PENDING_TIME);
+    }
+    request.resolve(result);
+    changed();
+};
+
+bench.reject = function (request) {
+    bench.pending = bench.pending.filter(function (r) { return r !== request; });
+    request.reject({code: 4001, message: 'User rejected the request.'});
+    changed();
+};
+
+bench.disconnect = function (origin) {
+    bench.update(function (state) {
+        state.connected = state.connected.filter(function (o) { return o !== origin; });
+    });
+};
+
+function handleRpc(payload, origin) {
+    var state = bench.state, params = payload.params || [];
+    var connected = state.connected.indexOf(origin) >= 0;
+    switch (payload.method) {
+        case 'eth_chainId':
+            return Promise.resolve('0x' + Number(currentNetwork().chainId).toString(16));
+        case 'net_version':
+            return Promise.resolve(String(currentNetwork().chainId));
+        case 'eth_accounts':
+            return Promise.resolve(connected && bench.unlocked ? [state.accounts[state.selected]] : []);
+        case 'eth_requestAccounts':
+            if (connected && bench.unlocked) return Promise.resolve([state.accounts[state.selected]]);
+            return enqueue('connect', origin, params);
+        case 'personal_sign':
+        case 'eth_signTypedData_v4':
+            return enqueue('signature', origin, params);
+        case 'eth_sendTransaction':
+            var data = (params[0] && params[0].data) || '';
+            // approve(address,uint256)
+            return enqueue(data.indexOf('0x095ea7b3') === 0 ? 'allowance' : 'transaction', origin, params);
+        default:
+            return Promise.reject({code: 4200, message: 'Unsupported method ' + payload.method});
+    }
+}
+
+chrome.runtime.onMessage.addListener(function (message, sender, sendResponse) {
+    if (message.type !== 'rpc') return false;
+    var origin = sender.url ? new URL(sender.url).origin : 'unknown';
+    handleRpc(message.payload, origin).then(function (result) {
+        sendResponse({result: result});
+    }, function (error) {
+        sendResponse({error: error});
+    });
+    // The response comes once the user decides
+    return true;
+});
+
+// Background API of the UI, like MetaMask's 'controller' stream: messages
+// {name: 'controller', data: {id, method, params}} on a runtime port.
+var UI_PORTS = ['fullscreen', 'popup', 'notification'];
+
+var APPROVAL_TYPES = {connect: 'wallet_requestPermissions', signature: 'personal_sign',
+                      transaction: 'transaction', allowance: 'transaction'};
+
+var api = {
+    upsertNetworkConfiguration: function (config, options) {
+        if (!options || !options.referrer || !options.source) throw new Error('referrer and source are required');
+        var network = {name: config.nickname, rpcUrl: config.rpcUrl, chainId: String(parseInt(config.chainId, 16)),
+                       symbol: config.ticker, test: false};
+        bench.update(function (state) {
+            state.networks = state.networks.filter(function (n) { return n.rpcUrl !== network.rpcUrl; }).concat([network]);
+            if (options.setActive) state.network = network.name;
+        });
+        return network.rpcUrl;
+    },
+    importAccountWithStrategy: function (strategy, args) {
+        if (strategy !== 'privateKey') throw new Error('Unexpected import strategy: ' + strategy);
+        var address = addressOf(args[0]);
+        if (bench.state.accounts.indexOf(address) >= 0) {
+            throw new Error("The account you're are trying to import is a duplicate");
+        }
+        bench.importAccount(args[0]);
+    },
+    setSelectedAddress: function (address) {
+        var index = bench.state.accounts.indexOf(address.toLowerCase());
+        if (index < 0) throw new Error("Identity for '" + address + "' not found");
+        bench.update(function (state) { state.selected = index; });
+    },
+    getState: function () {
+        var configurations = {};
+        bench.state.networks.forEach(function (n) {
+            configurations[n.rpcUrl] = {nickname: n.name, rpcUrl: n.rpcUrl, ticker: n.symbol,
+                                        chainId: '0x' + Number(n.chainId).toString(16), rpcPrefs: {}};
+        });
+        var current = currentNetwork(), approvals = {}, transactions = {};
+        bench.pending.forEach(function (request, index) {
+            approvals[request.id] = {id: request.id, origin: request.origin, time: index,
+                                     type: APPROVAL_TYPES[request.type]};
+            if (APPROVAL_TYPES[request.type] === 'transaction') {
+                transactions[request.id] = {id: request.id, txParams: (request.params || [])[0] || {}};
+            }
+        });
+        var identities = {};
+        bench.state.accounts.forEach(function (address, index) {
+            identities[address] = {address: address, name: 'Account ' + (index + 1)};
+        });
+        return {isInitialized: bench.state.onboarded, isUnlocked: bench.unlocked,
+                identities: identities, selectedAddress: bench.state.accounts[bench.state.selected],
+                networkConfigurations: configurations,
+                providerConfig: {type: 'rpc', nickname: current.name, rpcUrl: current.rpcUrl},
+                pendingApprovals: approvals, unapprovedTxs: transactions};
+    }
+};
+
+chrome.runtime.onConnect.addListener(function (port) {
+    if (UI_PORTS.indexOf(port.name) < 0) return;
+    port.onMessage.addListener(function (message) {
+        if (!message || message.name !== 'controller') return;
+        var data = message.data, response = {jsonrpc: '2.0', id: data.id};
+        try {
+            if (!api[data.method]) throw new Error('Method not found: ' + data.method);
+            response.result = api[data.method].apply(null, data.params || []);
+        } catch (e) {
+            response.error = {message: e.message};
+        }
+        port.postMessage({name: 'controller', data: response});
+    });
+});
+
+chrome.runtime.onInstalled.addListener(function (details) {
+    if (details.reason === 'install') {
+        chrome.tabs.create({url: 'home.html#onboarding/welcome'});
+    }
+});
+
+chrome.storage.local.get('state', function (items) {
+    if (items.state) bench.state = items.state;
+    bench.ready = true;
+    changed();
+});
@@ -0,0 +1,16 @@
+// Injects the provider into the page and relays its requests to the background page
+var script = document.createElement('script');
+script.src = chrome.runtime.getURL('inpage.js');
+script.onload = function () { script.remove(); };
+(document.head || document.documentElement).appendChild(script);
+
+window.addEventListener('message', function (event) {
+    if (event.source !== window || !event.data || event.data.target !== 'bench-contentscript') return;
+    var payload = event.data.payload;
+    chrome.runtime.sendMessage({type: 'rpc', payload: payload}, function (response) {
+        if (chrome.runtime.lastError || !response) {
+            response = {error: {code: -32603, message: 'Extension did not respond'}};
+        }
+        window.postMessage({target: 'bench-inpage', id: payload.id, response: response}, '*');
+    });
+});
@@ -0,0 +1,51 @@
+// Minimal EIP-1193 provider
+(function () {
+    var nextId = 1, callbacks = {}, listeners = {};
+
+    window.addEventListener('message', function (event) {
+        if (event.source !== window || !event.data || event.data.target !== 'bench-inpage') return;
+        var callback = callbacks[event.data.id];
+        if (!callback) return;
+        delete callbacks[event.data.id];
+        var response = event.data.response;
+        if (response.error) {
+            var error = new Error(response.error.message);
+            error.code = response.error.code;
+            callback.reject(error);
+        } else {
+            callback.resolve(response.result);
+        }
+    });
+
+    function emit(name, value) {
+        (listeners[name] || []).forEach(function (fn) { fn(value); });
+    }
+
+    window.ethereum = {
+        isMetaMask: true,
+        selectedAddress: null,
+        request: function (args) {
+            var id = nextId++;
+            return new Promise(function (resolve, reject) {
+                callbacks[id] = {resolve: resolve, reject: reject};
+                window.postMessage({target: 'bench-contentscript',
+                                    payload: {id: id, method: args.method, params: args.params || []}}, '*');
+            }).then(function (result) {
+                if (args.method === 'eth_requestAccounts' || args.method === 'eth_accounts') {
+                    window.ethereum.selectedAddress = result[0] || null;
+                    emit('accountsChanged', result);
+                }
+                return result;
+            });
+        },
+        on: function (name, fn) {
+            (listeners[name] = listeners[name] || []).push(fn);
+            return window.ethereum;
+        },
+        removeListener: function (name, fn) {
+            listeners[name] = (listeners[name] || []).filter(function (f) { return f !== fn; });
+            return window.ethereum;
+        }
+    };
+    window.dispatchEvent(new Event('ethereum#initialized'));
+})();
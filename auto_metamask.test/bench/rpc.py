@@ -0,0 +1,84 @@
+import json
+import time
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Stand-in JSON-RPC node for the offline benchmark. A transaction is "mined"
+# block_time seconds after its hash is first asked for, every block_time a
+# block is produced. Hashes ending in 'dead' are mined reverted.
+
+
+class StandInChain:
+
+    def __init__(self, chain_id=1337, block_time=1.0):
+        self.chain_id = chain_id
+        self.block_time = block_time
+        self.start = time.monotonic()
+        self.first_seen = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def blockNumber(self):
+        return int((time.monotonic() - self.start) / self.block_time) + 1
+
+    def receipt(self, tx_hash):
+        with self.lock:
+            seen = self.first_seen.setdefault(tx_hash, time.monotonic())
+        if time.monotonic() - seen < self.block_time:
+            return None
+        block = int((seen + self.block_time - self.start) / self.block_time) + 1
+        return {
+            'transactionHash': tx_hash,
+            'status': '0x0' if tx_hash.endswith('dead') else '0x1',
+            'gasUsed': hex(21000),
+            'effectiveGasPrice': hex(1000000000),
+            'blockNumber': hex(block),
+            'blockHash': '0x' + hashlib.sha256(str(block).encode()).hexdigest(),
+            'contractAddress': None,
+        }
+
+    def handle(self, call):
+        method, params = call.get('method'), call.get('params') or []
+        if method == 'eth_getTransactionReceipt':
+            result = self.receipt(params[0])
+        elif method == 'eth_blockNumber':
+            result = hex(self.blockNumber())
+        elif method == 'eth_chainId':
+            result = hex(self.chain_id)
+        elif method == 'net_version':
+            result = str(self.chain_id)
+        else:
+            return {'jsonrpc': '2.0', 'id': call.get('id'), 'error': {'code': -32601, 'message': 'Method not found'}}
+        return {'jsonrpc': '2.0', 'id': call.get('id'), 'result': result}
+
+
+class RpcHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like a real node
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        chain = self.server.chain
+        with chain.lock:
+            chain.requests += 1
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        if isinstance(payload, list):
+            reply = [chain.handle(call) for call in payload]
+        else:
+            reply = chain.handle(payload)
+        body = json.dumps(reply).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serveRpc(chain_id=1337, block_time=1.0):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RpcHandler)
+    server.chain = StandInChain(chain_id, block_time)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
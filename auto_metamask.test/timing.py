@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auto_metamask import *
+
+# Runs the test.py flow with the original settings (polling waits, reload on every
+# call, packed extension, UI clicks step by step, requests handled in the metamask tab)
+# and the current defaults, and prints how long each public
+# function took.
+
+METAMASK_URL = 'https://github.com/MetaMask/metamask-extension/releases/download/v10.34.0/metamask-chrome-10.34.0.zip'
+CHROME_PATH = '/Applications/Chromium.app/Contents/MacOS/Chromium'
+CHROMEDRIVER_PATH = 'chromedriver_mac64/chromedriver'
+
+
+def timed(timings, name, func, *args):
+    start = time.perf_counter()
+    func(*args)
+    timings.append((name, time.perf_counter() - start))
+
+
+def run(metamask_path, wait_engine, navigation, extension_mode, compile_flows, approvals):
+    session = MetaMaskSession(metamask_path, CHROME_PATH, None, CHROMEDRIVER_PATH, wait_engine=wait_engine,
+                              navigation=navigation, extension_mode=extension_mode,
+                              compile_flows=compile_flows, approvals=approvals)
+    timings = [('launch', session.launch_time)]
+    driver = session.driver
+
+    # Test account, please do not use for production environment
+    timed(timings, 'setupMetamask', session.setupMetamask,
+          'whip squirrel shine cabin access spell arrow review spread code fire marine', 'testtest')
+    timed(timings, 'addNetwork', session.addNetwork, 'MY_MATIC', 'https://rpc-mumbai.maticvigil.com', '80001', 'MATIC')
+    timed(timings, 'changeNetwork', session.changeNetwork, 'MY_MATIC')
+    timed(timings, 'importPK', session.importPK, 'bb334564f93fc3a40a3b6a89e0560101bb86e5b75c773381f1e6d2f37fc5c5ba')
+
+    driver.switch_to.new_window()
+    driver.get('https://metamask.github.io/test-dapp/')
+    wait = WebDriverWait(driver, 20, 1)
+
+    wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button[id='connectButton']"))).click()
+    timed(timings, 'connect', session.connect)
+
+    wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button[id='personalSign']"))).click()
+    timed(timings, 'confirm', session.confirm)
+
+    wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button[id='sendButton']"))).click()
+    timed(timings, 'confirm', session.confirm)
+    timed(timings, 'waitPending', session.waitPending, 20)
+
+    wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button[id='createToken']"))).click()
+    timed(timings, 'confirm', session.confirm)
+    timed(timings, 'waitPending', session.waitPending, 20)
+
+    wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button[id='approveTokens']"))).click()
+    timed(timings, 'approveTokens', session.approveTokens, 6)
+    timed(timings, 'waitPending', session.waitPending, 20)
+
+    session.quit()
+    return timings, session.capabilities_size
+
+
+if __name__ == '__main__':
+
+    metamask_path = downloadMetamask(METAMASK_URL)
+
+    before, before_size = run(metamask_path, 'poll', 'reload', 'packed', False, 'home')
+    after, after_size = run(metamask_path, 'event', 'fast', 'unpacked', True, 'notification')
+
+    print('{:<16}{:>10}{:>10}'.format('function', 'before', 'after'))
+    for (name, poll), (_, event) in zip(before, after):
+        print('{:<16}{:>9.2f}s{:>9.2f}s'.format(name, poll, event))
+    print('{:<16}{:>9.2f}s{:>9.2f}s'.format('total', sum(t for _, t in before), sum(t for _, t in after)))
+    print('{:<16}{:>9}B{:>9}B'.format('session request', before_size, after_size))
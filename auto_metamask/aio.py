@@ -0,0 +1,153 @@
+import os
+import asyncio
+import logging
+import threading
+from functools import partial, wraps
+from concurrent.futures import ThreadPoolExecutor
+from .session import MetaMaskSession
+
+logger = logging.getLogger(__name__)
+
+# Shared by every AsyncMetaMaskSession without its own executor
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def getExecutor():
+    """Get the shared executor the blocking WebDriver calls run in
+
+    Its size bounds how many browser operations run at the same time, whatever the number of
+    sessions. Set AUTO_METAMASK_WORKERS to change it, default is 32.
+
+    :return: Executor
+    :rtype: ThreadPoolExecutor
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=int(os.environ.get('AUTO_METAMASK_WORKERS', 32)),
+                                           thread_name_prefix='auto-metamask')
+        return _executor
+
+
+def _asyncMethod(name):
+    method = getattr(MetaMaskSession, name)
+
+    @wraps(method)
+    async def call(self, *args, timeout=None, **kwargs):
+        return await self.run(getattr(self.session, name), *args, timeout=timeout, **kwargs)
+    return call
+
+
+class AsyncMetaMaskSession:
+    """asyncio wrapper of a MetaMaskSession, e.g. await session.confirm()
+
+    One event loop can drive many sessions. Each call runs the blocking session method in a
+    bounded executor; calls on the same session wait for each other, so two coroutines never
+    interleave clicks in the same browser. Every method takes a timeout keyword argument
+    (seconds). On timeout or cancellation the running waits are interrupted, the browser is left
+    idle, and asyncio.TimeoutError or CancelledError is raised.
+
+    :param session: Session to drive
+    :type session: MetaMaskSession
+    :param executor: Executor the blocking calls run in, default is getExecutor().
+    :type executor: concurrent.futures.Executor
+    """
+
+    def __init__(self, session, executor=None):
+        self.session = session
+        self.executor = executor
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def create(cls, *args, executor=None, **kwargs):
+        """Start a browser, same arguments as MetaMaskSession
+
+        :return: Session
+        :rtype: AsyncMetaMaskSession
+        """
+        loop = asyncio.get_running_loop()
+        session = await loop.run_in_executor(executor or getExecutor(), partial(MetaMaskSession, *args, **kwargs))
+        return cls(session, executor)
+
+    @classmethod
+    async def launch(cls, *args, executor=None, **kwargs):
+        """Start an onboarded browser, same arguments as MetaMaskSession.launch
+
+        :return: Onboarded session
+        :rtype: AsyncMetaMaskSession
+        """
+        loop = asyncio.get_running_loop()
+        session = await loop.run_in_executor(executor or getExecutor(), partial(MetaMaskSession.launch, *args, **kwargs))
+        return cls(session, executor)
+
+    @property
+    def driver(self):
+        return self.session.driver
+
+    async def run(self, func, *args, timeout=None, **kwargs):
+        """Run a blocking function in the executor, serialized with the other calls of this session
+
+        e.g. await session.run(session.driver.get, url)
+
+        :param func: Function to run
+        :type func: Callable
+        :param timeout: Timeout (seconds), default is None.
+        :type timeout: Number
+        :return: Value returned by the function
+        """
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor or getExecutor(), partial(func, *args, **kwargs))
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                # The thread can't be killed, stop its waits and keep the lock until it returns
+                self.session.cancel_event.set()
+                await self._settle(future)
+                raise
+            finally:
+                self.session.cancel_event.clear()
+
+    @staticmethod
+    async def _settle(future):
+        while not future.done():
+            try:
+                await asyncio.shield(future)
+            except asyncio.CancelledError:
+                continue
+            except Exception:
+                break
+        if future.done() and not future.cancelled() and future.exception():
+            logger.info("Cancelled operation ended with " + repr(future.exception()))
+
+    setupMetamask = _asyncMethod('setupMetamask')
+    unlockMetamask = _asyncMethod('unlockMetamask')
+    addNetwork = _asyncMethod('addNetwork')
+    addNetworks = _asyncMethod('addNetworks')
+    changeNetwork = _asyncMethod('changeNetwork')
+    importPK = _asyncMethod('importPK')
+    importAccounts = _asyncMethod('importAccounts')
+    switchAccount = _asyncMethod('switchAccount')
+    connect = _asyncMethod('connect')
+    approve = _asyncMethod('approve')
+    approveTokens = _asyncMethod('approveTokens')
+    confirm = _asyncMethod('confirm')
+    drainPending = _asyncMethod('drainPending')
+    waitPending = _asyncMethod('waitPending')
+    waitReceipts = _asyncMethod('waitReceipts')
+    disconnect = _asyncMethod('disconnect')
+    restart = _asyncMethod('restart')
+
+    async def quit(self):
+        """Close the browser, waiting for the running call first
+        """
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor or getExecutor(), self.session.quit)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.quit()
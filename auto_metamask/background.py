@@ -0,0 +1,172 @@
+import logging
+from .catalog import _versionTuple
+from .flow import _scriptTimeout
+
+logger = logging.getLogger(__name__)
+
+# Methods of the MetaMask background API used instead of the UI, for each
+# version range [since, until). Extension pages reach the API over a runtime
+# port, the same 'controller' stream the MetaMask UI sends its actions on.
+_API = [
+    ('10.28.0', '12.0.0', {
+        'port': 'fullscreen',
+        'upsert-network': 'upsertNetworkConfiguration',
+        'import-account': 'importAccountWithStrategy',
+        'select-account': 'setSelectedAddress',
+        'state': 'getState',
+    }),
+]
+
+_CALL_SCRIPT = """
+var batches = arguments[0], timeout = arguments[1], done = arguments[arguments.length - 1];
+var port = chrome.runtime.connect({name: arguments[2]}), waiting = {}, nextId = 1, finished = false;
+var results = [];
+
+function finish(error) {
+    if (finished) return;
+    finished = true;
+    clearTimeout(timer);
+    // Calls still waiting for an answer
+    for (var id in waiting) waiting[id]({error: error});
+    try { port.disconnect(); } catch (e) {}
+    done(results);
+}
+
+port.onMessage.addListener(function (message) {
+    var data = message && message.name === 'controller' && message.data;
+    if (!data || !waiting[data.id]) return;
+    var resolve = waiting[data.id];
+    delete waiting[data.id];
+    resolve(data.error ? {error: data.error.message || String(data.error)} : {result: data.result});
+});
+port.onDisconnect.addListener(function () { finish('disconnected'); });
+var timer = setTimeout(function () { finish('timeout'); }, timeout);
+
+function call(method, params) {
+    return new Promise(function (resolve) {
+        var id = 'auto-metamask-' + nextId++;
+        waiting[id] = resolve;
+        port.postMessage({name: 'controller', data: {jsonrpc: '2.0', id: id, method: method, params: params}});
+    });
+}
+
+// The calls of a batch run together, batches one after the other
+(function run(index) {
+    if (finished) return;
+    if (index === batches.length) return finish(null);
+    Promise.all(batches[index].map(function (c) { return call(c[0], c[1]); })).then(function (batch) {
+        results.push(batch);
+        run(index + 1);
+    });
+})(0);
+"""
+
+
+def backgroundApi(version):
+    """Background API methods of a MetaMask version
+
+    :param version: MetaMask extension version
+    :type version: String
+    :return: Method names by purpose, None when the version is not supported
+    :rtype: Dict
+    """
+    for since, until, api in _API:
+        if _versionTuple(since) <= _versionTuple(version) < _versionTuple(until):
+            return api
+    return None
+
+
+def callBackground(driver, api, batches, timeout=20):
+    """Call the MetaMask background API from an extension page, in one round trip
+
+    :param driver: Selenium WebDriver (or CdpPage) on a MetaMask page
+    :type driver: WebDriver
+    :param api: Background API of the version, see backgroundApi
+    :type api: Dict
+    :param batches: Lists of (method, params), the calls of a batch run concurrently, batches run in order
+    :type batches: List
+    :param timeout: Timeout (seconds), default is 20.
+    :type timeout: Number
+    :return: For every batch, a list of {'result': ...} or {'error': String} in call order
+    :rtype: List
+    """
+    with _scriptTimeout(driver, timeout + 5):
+        results = driver.execute_async_script(
+            _CALL_SCRIPT, [[[method, list(params)] for method, params in batch] for batch in batches],
+            int(timeout * 1000), api['port'])
+    for batch in results:
+        for result in batch:
+            if 'error' in result:
+                logger.warning("Background call failed: " + str(result['error']))
+    return results
+
+
+def chainIdNumber(chain_id):
+    """Chain ID as a number, from '1337', '0x539' or 1337
+    """
+    if isinstance(chain_id, int):
+        return chain_id
+    chain_id = str(chain_id).strip()
+    return int(chain_id, 16) if chain_id.lower().startswith('0x') else int(chain_id)
+
+
+def networkConfiguration(network_name, rpc_url, chain_id, currency_symbol):
+    """Network configuration in the format of the MetaMask NetworkController
+
+    :return: Configuration
+    :rtype: Dict
+    """
+    return {
+        'nickname': network_name,
+        'rpcUrl': rpc_url,
+        'chainId': hex(chainIdNumber(chain_id)),
+        'ticker': currency_symbol,
+        'rpcPrefs': {},
+    }
+
+
+def accountAddresses(state):
+    """Addresses of the wallet accounts in a background state, in the order of the account list
+
+    :param state: Background state, see backgroundApi 'state'
+    :type state: Dict
+    :return: Addresses
+    :rtype: List
+    """
+    return [identity.get('address') or address for address, identity in (state.get('identities') or {}).items()]
+
+
+# Approval types of the ApprovalController, by request kind
+_APPROVAL_KINDS = {
+    'wallet_requestPermissions': 'connect',
+    'personal_sign': 'signature',
+    'eth_sign': 'signature',
+    'eth_signTypedData': 'signature',
+    'transaction': 'transaction',
+}
+
+# approve(address,uint256)
+_APPROVE_SELECTOR = '0x095ea7b3'
+
+
+def pendingRequests(state):
+    """Pending approvals of a background state, with their kind, origin and value
+
+    :param state: Background state, see backgroundApi 'state'
+    :type state: Dict
+    :return: Requests by approval id, {'id', 'kind', 'origin', 'value'}, value is the transaction value in wei
+    :rtype: Dict
+    """
+    transactions = state.get('unapprovedTxs') or {}
+    requests = {}
+    for approval in (state.get('pendingApprovals') or {}).values():
+        kind = _APPROVAL_KINDS.get(approval.get('type'), approval.get('type'))
+        value = None
+        tx = transactions.get(approval['id'])
+        if kind == 'transaction' and tx:
+            params = tx.get('txParams') or {}
+            value = int(params.get('value') or '0x0', 16)
+            if (params.get('data') or '').startswith(_APPROVE_SELECTOR):
+                kind = 'allowance'
+        requests[approval['id']] = {'id': approval['id'], 'kind': kind, 'origin': approval.get('origin'), 'value': value}
+    return requests
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+from urllib.parse import urlparse, unquote
+import requests
+
+logger = logging.getLogger(__name__)
+
+cache_path = os.environ.get('AUTO_METAMASK_CACHE', os.path.join(
+    os.path.expanduser('~'), '.cache', 'auto-metamask'))
+
+# Base URL or directory tried before the original URL, for air-gapped CI
+mirror = os.environ.get('AUTO_METAMASK_MIRROR')
+
+
+@contextmanager
+def fileLock(path):
+    """Hold an exclusive lock on a file, shared by every process on the machine
+
+    :param path: Lock file path, created if needed
+    :type path: String
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 seconds
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _atomicWrite(path, data):
+    fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(temp_file, path)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _sources(url, mirror_url):
+    name = url.split('/')[-1]
+    if mirror_url:
+        if '://' in mirror_url:
+            yield mirror_url.rstrip('/') + '/' + name
+        else:
+            yield 'file://' + os.path.abspath(os.path.join(mirror_url, name))
+    yield url
+
+
+def _fetch(source, f):
+    if source.startswith('file://'):
+        with open(unquote(urlparse(source).path), 'rb') as src:
+            shutil.copyfileobj(src, f)
+        return
+
+    with requests.get(source, stream=True, timeout=60) as r:
+        r.raise_for_status()
+        for chunk in r.iter_content(1 << 20):
+            f.write(chunk)
+
+
+def fetchArtifact(url, sha256=None, cache_dir=None, mirror_url=None):
+    """Download a file once per machine into a content-addressed cache
+
+    Concurrent callers (threads or processes) wait for the one that downloads. The file is
+    written to a temporary name, verified and renamed into place, so an interrupted download
+    is never used.
+
+    :param url: Download address, http(s):// or file://
+    :type url: String
+    :param sha256: Expected SHA-256 of the file, not checked if not provided, default is None.
+    :type sha256: String
+    :param cache_dir: Cache directory, default is AUTO_METAMASK_CACHE or ~/.cache/auto-metamask.
+    :type cache_dir: String
+    :param mirror_url: Base URL or directory tried first, default is AUTO_METAMASK_MIRROR.
+    :type mirror_url: String
+    :return: Cached file path
+    :rtype: String
+    """
+    root = os.path.join(cache_dir or cache_path, 'artifacts')
+    url_key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    index_file = os.path.join(root, 'urls', url_key + '.json')
+    suffix = os.path.splitext(url.split('/')[-1])[1]
+
+    with fileLock(os.path.join(root, 'locks', url_key + '.lock')):
+        try:
+            with open(index_file, encoding='utf-8') as f:
+                entry = json.load(f)
+            path = os.path.join(root, 'sha256', entry['sha256'] + suffix)
+            # The content is hashed again, a file corrupted on disk keeps its size
+            intact = os.path.getsize(path) == entry['size'] and _sha256(path) == entry['sha256']
+            if intact and (not sha256 or sha256.lower() == entry['sha256']):
+                logger.info("Artifact " + url + " found in cache")
+                return path
+            logger.warning("Artifact " + url + " in cache doesn't match, downloading again")
+            if not intact:
+                os.remove(path)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        os.makedirs(os.path.join(root, 'sha256'), exist_ok=True)
+        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        temp_dir = os.path.join(root, 'tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        # Leftovers of crashed downloads
+        for name in os.listdir(temp_dir):
+            if os.path.getmtime(os.path.join(temp_dir, name)) < time.time() - 3600:
+                os.remove(os.path.join(temp_dir, name))
+
+        error = None
+        for source in _sources(url, mirror_url if mirror_url is not None else mirror):
+            fd, temp_file = tempfile.mkstemp(dir=temp_dir, suffix='.part')
+            try:
+                logger.info("Downloading " + source)
+                with os.fdopen(fd, 'wb') as f:
+                    _fetch(source, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                digest = _sha256(temp_file)
+                if sha256 and sha256.lower() != digest:
+                    raise ValueError("Checksum mismatch for " + source + ": " + digest)
+
+                path = os.path.join(root, 'sha256', digest + suffix)
+                os.replace(temp_file, path)
+                _atomicWrite(index_file, {'url': url, 'sha256': digest, 'size': os.path.getsize(path)})
+                return path
+            except Exception as e:
+                logger.warning("Download " + source + " failed: " + str(e))
+                error = e
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+
+        raise error
@@ -0,0 +1,343 @@
+import os
+import json
+import logging
+import tempfile
+import threading
+from .cache import cache_path
+from .results import MetaMaskError
+
+logger = logging.getLogger(__name__)
+
+selector_cache_file = os.path.join(cache_path, 'selectors.json')
+
+# Logical elements and their candidate selectors, most likely first. Each entry
+# applies from its MetaMask version on, later entries override earlier ones.
+# Selectors are formatted with the parameters of the lookup, e.g. {i}.
+_CATALOG = [
+    ('10.0.0', {
+        'popover-close': [('css', "button[data-testid='popover-close']"),
+                          ('css', "section.popover-wrap button[aria-label='Close']")],
+        'footer-next': [('css', "button[data-testid='page-container-footer-next']"),
+                        ('css', "button[data-testid='confirm-footer-button']"),
+                        ('css', ".page-container__footer button.btn-primary")],
+        'footer-cancel': [('css', "button[data-testid='page-container-footer-cancel']"),
+                          ('css', "button[data-testid='confirm-footer-cancel-button']"),
+                          ('css', ".page-container__footer button.btn-secondary")],
+        'request-origin': [('css', ".site-origin"),
+                           ('css', ".confirm-page-container-summary__origin"),
+                           ('css', ".request-signature__origin"),
+                           ('css', ".page-container__header")],
+        'send-button': [('css', "button[data-testid='eth-overview-send']"),
+                        ('css', "button[data-testid='coin-overview-send']")],
+        'loading-overlay': [('css', "div[class='loading-overlay__container']")],
+        'onboarding-terms': [('css', "input[data-testid='onboarding-terms-checkbox']")],
+        'onboarding-import': [('css', "button[data-testid='onboarding-import-wallet']")],
+        'metametrics-no-thanks': [('css', "button[data-testid='metametrics-no-thanks']")],
+        'srp-dropdown': [('xpath', "//div[@class='import-srp__container']//select[@class='dropdown__select']"),
+                         ('xpath', "//*[contains(@class, 'dropdown__select')]"),
+                         ('xpath', "//*[@id='app-content']/div/div[2]/div/div/div/div[4]/div/div/div[2]/select")],
+        'srp-word': [('css', "input[data-testid='import-srp__srp-word-{i}']")],
+        'srp-confirm': [('css', "button[data-testid='import-srp-confirm']")],
+        'password-new': [('css', "input[data-testid='create-password-new']")],
+        'password-confirm': [('css', "input[data-testid='create-password-confirm']")],
+        'password-terms': [('css', "input[data-testid='create-password-terms']")],
+        'password-import': [('css', "button[data-testid='create-password-import']")],
+        'onboarding-done': [('css', "button[data-testid='onboarding-complete-done']")],
+        'pin-next': [('css', "button[data-testid='pin-extension-next']")],
+        'pin-done': [('css', "button[data-testid='pin-extension-done']")],
+        'unlock-password': [('css', "input[data-testid='unlock-password']"), ('css', '#password')],
+        'unlock-submit': [('css', "button[data-testid='unlock-submit']")],
+        'network-form-input': [('xpath', "(//div[@class='networks-tab__add-network-form-body']//input)[{n}]"),
+                               ('xpath', "(//div[contains(@class, 'networks-tab__add-network-form-body')]//input)[{n}]")],
+        'network-form-save': [('xpath', "//div[contains(@class, 'networks-tab__add-network-form-footer')]//button[contains(@class, 'btn-primary')]")],
+        'network-switch-to': [('xpath', "//button[contains(@class, 'home__new-network-added__switch-to-button')]")],
+        'network-display': [('css', "button[data-testid='network-display']")],
+        'network-test-toggle': [('css', "label.toggle-button")],
+        'network-item': [('xpath', "//span[text()='{name}']")],
+        'network-current': [('xpath', "//p[text()='{name}']"),
+                            ('xpath', "//button[@data-testid='network-display']//span[text()='{name}']")],
+        'account-menu': [('css', "button[data-testid='account-menu-icon']")],
+        'account-import': [('xpath', "(//section[contains(@class, 'multichain-account-menu-popover')]//button[contains(@class, 'mm-button-base--size-sm')])[2]"),
+                           ('xpath', "//section[contains(@class, 'multichain-account-menu-popover')]//button[contains(., 'Import account')]")],
+        'private-key-input': [('css', '#private-key-box')],
+        'import-account-confirm': [('css', "button[data-testid='import-account-confirm-button']")],
+        # The list shows the address shortened to '0x12345...abcde', in checksum case
+        'account-item': [('xpath', "//div[contains(@class, 'multichain-account-list-item')][contains(translate(., 'ABCDEF', 'abcdef'), '{short}')]"),
+                         ('xpath', "//div[contains(@class, 'multichain-account-list-item')][contains(translate(., 'ABCDEF', 'abcdef'), '{address}')]")],
+        'approve-button': [('xpath', "//button[contains(@class, 'btn-primary')]")],
+        'use-default': [('xpath', "//button[text()='Use default']")],
+        'spending-cap': [('css', "input[id='custom-spending-cap']")],
+        'activity-tab': [('css', "li[data-testid='home__activity-tab']")],
+        'pending-label': [('css', '.transaction-status-label--pending')],
+        'account-options': [('xpath', "//button[@data-testid='account-options-menu-button']")],
+        'connected-sites': [('css', "button[data-testid='global-menu-connected-sites']")],
+        'connected-site-disconnect': [('xpath', '//*[@id="popover-content"]/div/div/section/div[2]/main/div/a')],
+        'disconnect-button': [('xpath', "//button[contains(text(),'Disconnect')]")],
+        # Errors MetaMask shows, raced against the waits, see ERROR_INDICATORS
+        'error-wrong-password': [('css', '#password-helper-text'),
+                                 ('xpath', "//*[contains(@class, 'unlock-page')]//*[contains(text(), 'Incorrect password')]")],
+        'error-insufficient-funds': [('xpath', "//*[contains(@class, 'confirm-page-container')]//*[contains(text(), 'nsufficient funds')]")],
+        'error-transaction': [('xpath', "//*[contains(@class, 'confirm-page-container')]//*[contains(@class, 'actionable-message--danger') or contains(@class, 'mm-banner-alert--severity-danger')]")],
+        'error-transaction-failed': [('xpath', "(//*[contains(@class, 'transaction-list-item')])[1]//*[contains(@class, 'transaction-status-label--failed') or contains(@class, 'transaction-status-label--dropped')]")],
+        'error-private-key': [('xpath', "//*[contains(@class, 'new-account-import-form')]//*[contains(@class, 'error')]")],
+        'error-network-form': [('xpath', "//*[contains(@class, 'networks-tab__add-network-form-body')]//*[contains(@class, 'form-field__error')]")],
+    }),
+]
+
+# Catalog element showing each kind of error
+ERROR_INDICATORS = {
+    'wrong-password': 'error-wrong-password',
+    'insufficient-funds': 'error-insufficient-funds',
+    'transaction-error': 'error-transaction',
+    'transaction-failed': 'error-transaction-failed',
+    'invalid-key': 'error-private-key',
+    'invalid-network': 'error-network-form',
+}
+
+# Shared by the lookups below and the compiled flows
+DOM_HELPERS = """
+function findCandidate(candidate) {
+    if (candidate.by === 'xpath') {
+        return document.evaluate(candidate.selector, document, null,
+            XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    }
+    return document.querySelector(candidate.selector);
+}
+
+function isVisible(el) {
+    if (!el || !el.isConnected) return false;
+    var rect = el.getBoundingClientRect(), style = getComputedStyle(el);
+    return rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden' && style.display !== 'none';
+}
+
+function isReady(condition, el) {
+    switch (condition) {
+        case 'present': return !!el;
+        case 'visible': return isVisible(el);
+        case 'invisible': return !isVisible(el);
+        default: return isVisible(el) && !el.disabled;
+    }
+}
+
+// First candidate whose element meets the condition. For 'invisible' every
+// candidate has to be invisible, index is then -1.
+function locate(candidates, condition) {
+    var invisible = true;
+    for (var i = 0; i < candidates.length; i++) {
+        var el = null;
+        try {
+            el = findCandidate(candidates[i]);
+        } catch (e) {}
+        if (condition === 'invisible') {
+            invisible = invisible && !isVisible(el);
+        } else if (isReady(condition, el)) {
+            return {index: i, element: el};
+        }
+    }
+    return condition === 'invisible' && invisible ? {index: -1, element: null} : null;
+}
+
+// First error indicator showing a message, see SelectorCatalog.errorCandidates
+function firstError(errors) {
+    for (var i = 0; i < (errors || []).length; i++) {
+        var found = locate(errors[i].candidates, 'visible');
+        var text = found && (found.element.textContent || '').trim();
+        if (text) return {kind: errors[i].kind, detail: text.slice(0, 200)};
+    }
+    return null;
+}
+"""
+
+_LOCATE_SCRIPT = DOM_HELPERS + """
+return locate(arguments[0], arguments[1]);
+"""
+
+# Same lookup, and while the element doesn't match, the first error shown
+_RACE_SCRIPT = DOM_HELPERS + """
+var found = locate(arguments[0], arguments[1]);
+if (found) return found;
+var error = firstError(arguments[2]);
+return error ? {index: null, error: error.kind, detail: error.detail} : null;
+"""
+
+
+def _versionTuple(version):
+    return tuple(int(p) if p.isdigit() else 0 for p in version.split('-')[0].split('.'))
+
+
+class SelectorCatalog:
+    """Selectors of one MetaMask version, with the winning candidate of each element remembered on disk
+
+    :param version: MetaMask extension version
+    :type version: String
+    :param cache_file: File the winning candidates are saved to, default is selectors.json in the cache directory.
+    :type cache_file: String
+    """
+
+    def __init__(self, version, cache_file=None):
+        self.version = version
+        self.cache_file = cache_file or selector_cache_file
+        self.selectors = {}
+        for since, selectors in _CATALOG:
+            if _versionTuple(version) >= _versionTuple(since):
+                self.selectors.update(selectors)
+
+        self._lock = threading.Lock()
+        self._winners = {}
+        try:
+            with open(self.cache_file, encoding='utf-8') as f:
+                self._winners = json.load(f).get(version, {})
+        except (OSError, ValueError):
+            pass
+
+    def candidates(self, name, **params):
+        """Candidates of an element, the one that won last time first
+
+        :param name: Logical element name, e.g. 'footer-next'
+        :type name: String
+        :param params: Selector parameters, e.g. i=3 for 'srp-word'
+        :return: Candidates, [{'by': 'css' or 'xpath', 'selector': String}]
+        :rtype: List
+        """
+        chain = self.selectors[name]
+        winner = self._winners.get(name)
+        if winner is not None and 0 < winner < len(chain):
+            chain = [chain[winner]] + chain[:winner] + chain[winner + 1:]
+        return [{'by': by, 'selector': selector.format(**params), 'index': self.selectors[name].index((by, selector))}
+                for by, selector in chain]
+
+    def remember(self, name, index):
+        """Remember which candidate of an element matched
+
+        :param name: Logical element name
+        :type name: String
+        :param index: Index of the candidate in the catalog
+        :type index: Number
+        """
+        if self._winners.get(name, 0) == index:
+            return
+        with self._lock:
+            self._winners[name] = index
+            logger.info("Selector " + name + " matched candidate " + str(index))
+            self._save()
+
+    def _save(self):
+        try:
+            with open(self.cache_file, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data.setdefault(self.version, {}).update(self._winners)
+
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(self.cache_file))
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(temp_file, self.cache_file)
+        except OSError:
+            logger.warning("Save selector cache failed")
+
+    def find(self, driver, name, condition='clickable', **params):
+        """Look all candidates of an element up with a single DOM call
+
+        :param driver: Selenium WebDriver
+        :type driver: WebDriver
+        :param name: Logical element name
+        :type name: String
+        :param condition: 'present', 'visible', 'clickable' or 'invisible', default is 'clickable'.
+        :type condition: String
+        :param params: Selector parameters
+        :return: Element of the first matching candidate, True for a met 'invisible' condition, None if nothing matches
+        :rtype: WebElement
+        """
+        return self._locate(driver, name, condition, **params)[0]
+
+    def errorCandidates(self, kinds):
+        """Candidates of the error indicators of some kinds, for racing them against a wait
+
+        :param kinds: Error kinds, e.g. ('insufficient-funds',), see ERROR_INDICATORS
+        :type kinds: List
+        :return: [{'kind', 'candidates'}], kinds the version has no indicator for are left out
+        :rtype: List
+        """
+        return [{'kind': kind, 'candidates': self.candidates(ERROR_INDICATORS[kind])}
+                for kind in kinds if ERROR_INDICATORS.get(kind) in self.selectors]
+
+    def _locate(self, driver, name, condition, errors=None, **params):
+        candidates = self.candidates(name, **params)
+        if errors:
+            found = driver.execute_script(_RACE_SCRIPT, candidates, condition, self.errorCandidates(errors))
+            if found and found.get('error'):
+                raise MetaMaskError(found['error'], name, found['detail'])
+        else:
+            found = driver.execute_script(_LOCATE_SCRIPT, candidates, condition)
+        if not found:
+            return None, None
+        if found['index'] < 0:
+            return True, None
+        candidate = candidates[found['index']]
+        self.remember(name, candidate['index'])
+        return found['element'], candidate
+
+    def condition(self, name, condition='clickable', errors=None, **params):
+        """Build a wait condition, e.g. wait.until(catalog.condition('footer-next'))
+
+        :param name: Logical element name
+        :type name: String
+        :param condition: 'present', 'visible', 'clickable' or 'invisible', default is 'clickable'.
+        :type condition: String
+        :param errors: Error kinds raced against the element, checked in the same DOM call while it doesn't match, default is None.
+        :type errors: List
+        :param params: Selector parameters
+        :return: Callable returning the element, or False while it doesn't match, raising MetaMaskError once an error shows
+        :rtype: Callable
+        """
+        def check(driver):
+            result, candidate = self._locate(driver, name, condition, errors, **params)
+            if candidate:
+                check.selector = candidate['selector']
+            return result or False
+        # Read by TracedWait
+        check.element = name
+        check.condition = condition
+        check.selector = None
+        return check
+
+    def clickable(self, name, **params):
+        """Shortcut for condition(name, 'clickable', **params)
+        """
+        return self.condition(name, 'clickable', **params)
+
+    def visible(self, name, **params):
+        """Shortcut for condition(name, 'visible', **params)
+        """
+        return self.condition(name, 'visible', **params)
+
+    def present(self, name, **params):
+        """Shortcut for condition(name, 'present', **params)
+        """
+        return self.condition(name, 'present', **params)
+
+    def invisible(self, name, **params):
+        """Shortcut for condition(name, 'invisible', **params)
+        """
+        return self.condition(name, 'invisible', **params)
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def getCatalog(version):
+    """Get the shared selector catalog of a MetaMask version
+
+    :param version: MetaMask extension version
+    :type version: String
+    :return: Selector catalog
+    :rtype: SelectorCatalog
+    """
+    with _catalogs_lock:
+        if version not in _catalogs:
+            _catalogs[version] = SelectorCatalog(version)
+        return _catalogs[version]
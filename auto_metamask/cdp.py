@@ -0,0 +1,481 @@
+import json
+import time
+import base64
+import itertools
+from selenium.common.exceptions import (JavascriptException, NoSuchElementException, NoSuchWindowException,
+                                        StaleElementReferenceException, TimeoutException, WebDriverException)
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.timeouts import Timeouts
+from .tracing import span
+
+# Runs a WebDriver style script (a function body reading `arguments`) in the
+# page. Elements cross the protocol as {__element__: id} references into a
+# registry kept by the document, like chromedriver's own element cache.
+_WRAPPER = """
+(function (args, fn, isAsync) {
+    var registry = window.__autoMetamaskElements;
+    if (!registry) {
+        registry = window.__autoMetamaskElements = {next: 1, elements: {}, count: 0};
+    }
+
+    function unwrap(value) {
+        if (value && typeof value === 'object') {
+            if (value.__element__) {
+                var el = registry.elements[value.__element__];
+                if (!el || !el.isConnected) throw new Error('stale element reference');
+                return el;
+            }
+            if (Array.isArray(value)) return value.map(unwrap);
+            var object = {};
+            for (var key in value) object[key] = unwrap(value[key]);
+            return object;
+        }
+        return value;
+    }
+
+    function wrap(value) {
+        if (value instanceof Node) {
+            if (!value.__autoMetamaskId || registry.elements[value.__autoMetamaskId] !== value) {
+                value.__autoMetamaskId = String(registry.next++);
+                registry.elements[value.__autoMetamaskId] = value;
+                if (++registry.count > 1000) {
+                    // Forget removed elements
+                    for (var id in registry.elements) {
+                        if (!registry.elements[id].isConnected) delete registry.elements[id];
+                    }
+                    registry.count = Object.keys(registry.elements).length;
+                }
+            }
+            return {__element__: value.__autoMetamaskId};
+        }
+        if (Array.isArray(value) || value instanceof NodeList || value instanceof HTMLCollection) {
+            return Array.prototype.map.call(value, wrap);
+        }
+        if (value && typeof value === 'object') {
+            var object = {};
+            for (var key in value) object[key] = wrap(value[key]);
+            return object;
+        }
+        return value === undefined ? null : value;
+    }
+
+    if (!isAsync) return wrap(fn.apply(null, unwrap(args)));
+    return new Promise(function (resolve, reject) {
+        var list = unwrap(args);
+        list.push(function (value) { resolve(wrap(value)); });
+        try {
+            fn.apply(null, list);
+        } catch (e) {
+            reject(e);
+        }
+    });
+})
+"""
+
+_CLICK_POINT = """
+var el = arguments[0];
+el.scrollIntoView({block: 'center', inline: 'center'});
+var rect = el.getBoundingClientRect();
+return [rect.left + rect.width / 2, rect.top + rect.height / 2, el.tagName];
+"""
+
+_SELECT_OPTION = """
+var option = arguments[0], select = option.closest('select');
+option.selected = true;
+if (select) select.dispatchEvent(new Event('change', {bubbles: true}));
+"""
+
+_FOCUS = """
+var el = arguments[0];
+el.focus();
+if (typeof el.selectionStart === 'number') el.selectionStart = el.selectionEnd = el.value.length;
+"""
+
+_FIND = """
+var root = arguments[0] || document, by = arguments[1], value = arguments[2];
+if (by === 'xpath') {
+    var result = document.evaluate(value, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null), found = [];
+    for (var i = 0; i < result.snapshotLength; i++) found.push(result.snapshotItem(i));
+    return found;
+}
+return root.querySelectorAll(value);
+"""
+
+# Errors of scripts that ran while the page was navigating
+_NAVIGATION_ERRORS = ('Execution context was destroyed', 'Cannot find context', 'Inspected target navigated')
+
+
+def _encode(value):
+    if isinstance(value, CdpElement):
+        return {'__element__': value.id}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    return value
+
+
+class CdpConnection:
+    """Persistent DevTools websocket to one target (requires websocket-client)
+
+    :param url: webSocketDebuggerUrl of the target
+    :type url: String
+    :param timeout: Default command timeout (seconds), default is 30.
+    :type timeout: Number
+    """
+
+    def __init__(self, url, timeout=30):
+        try:
+            import websocket
+        except ImportError:
+            raise ImportError("The cdp backend requires websocket-client, pip install auto-metamask[cdp]")
+        self.url = url
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        # Chrome refuses websockets with an Origin header unless --remote-allow-origins is set
+        self._ws = websocket.create_connection(url, timeout=timeout, suppress_origin=True)
+
+    def send(self, method, params=None, timeout=None):
+        """Send a command and wait for its response
+
+        :param method: Command, e.g. 'Runtime.evaluate'
+        :type method: String
+        :param params: Command parameters, default is None.
+        :type params: Dict
+        :param timeout: Timeout (seconds), default is the connection timeout.
+        :type timeout: Number
+        :return: Command result
+        :rtype: Dict
+        """
+        import websocket
+        command_id = next(self._ids)
+        end_time = time.monotonic() + (timeout or self.timeout)
+        try:
+            self._ws.send(json.dumps({'id': command_id, 'method': method, 'params': params or {}}))
+            while True:
+                self._ws.settimeout(max(end_time - time.monotonic(), 0.001))
+                message = json.loads(self._ws.recv())
+                # Events and responses to commands that timed out earlier
+                if message.get('id') != command_id:
+                    continue
+                if 'error' in message:
+                    raise WebDriverException(method + ': ' + message['error'].get('message', ''))
+                return message.get('result', {})
+        except websocket.WebSocketTimeoutException:
+            raise TimeoutException(method + " timed out")
+        except (websocket.WebSocketConnectionClosedException, ConnectionError):
+            raise NoSuchWindowException("Target closed")
+
+    def post(self, method, params=None):
+        """Send a DevTools command without waiting for its result, e.g. to acknowledge an event
+
+        :param method: Command, e.g. 'Page.screencastFrameAck'
+        :type method: String
+        :param params: Command parameters, default is None.
+        :type params: Dict
+        """
+        self._ws.send(json.dumps({'id': next(self._ids), 'method': method, 'params': params or {}}))
+
+    def receive(self, timeout=None):
+        """Next event sent by the target, for connections only used to listen to events
+
+        :param timeout: Timeout (seconds), default is the connection timeout.
+        :type timeout: Number
+        :return: Event message ({'method', 'params'}), None if none arrived in time
+        :rtype: Dict
+        """
+        import websocket
+        end_time = time.monotonic() + (timeout or self.timeout)
+        try:
+            while True:
+                self._ws.settimeout(max(end_time - time.monotonic(), 0.001))
+                message = json.loads(self._ws.recv())
+                # Responses to posted commands
+                if 'method' in message:
+                    return message
+        except websocket.WebSocketTimeoutException:
+            return None
+        except (websocket.WebSocketConnectionClosedException, ConnectionError):
+            raise NoSuchWindowException("Target closed")
+
+    def close(self):
+        try:
+            self._ws.close()
+        except Exception:
+            pass
+
+
+class _SwitchTo:
+
+    def __init__(self, page):
+        self._page = page
+
+    def window(self, handle):
+        self._page.switchWindow(handle)
+
+
+class CdpPage:
+    """The subset of WebDriver the session uses, over direct DevTools websockets
+
+    Selenium still launches the browser and lists windows. Scripts run with Runtime.evaluate, clicks
+    and typing are dispatched with Input.dispatchMouseEvent and Input.insertText, each a single
+    websocket message instead of an HTTP request to chromedriver relayed to the browser.
+
+    :param driver: Selenium Chrome WebDriver, used to find the DevTools address
+    :type driver: WebDriver
+    :param handle: Window handle to start on
+    :type handle: String
+    """
+
+    def __init__(self, driver, handle):
+        self.driver = driver
+        self.debugger_address = driver.capabilities['goog:chromeOptions']['debuggerAddress']
+        self.switch_to = _SwitchTo(self)
+        self._handle = handle
+        self._connections = {}
+        self._script_timeout = 30
+
+    @staticmethod
+    def _targetId(handle):
+        # Window handles are target ids, older chromedrivers prefix them
+        return handle[-32:]
+
+    @property
+    def current_window_handle(self):
+        return self._handle
+
+    def switchWindow(self, handle):
+        """Make a window the target of the next commands and bring it to the front
+
+        :param handle: Window handle
+        :type handle: String
+        """
+        self._handle = handle
+        self.command('Page.bringToFront')
+
+    def _connection(self):
+        target_id = self._targetId(self._handle)
+        connection = self._connections.get(target_id)
+        if connection is None:
+            connection = CdpConnection('ws://' + self.debugger_address + '/devtools/page/' + target_id)
+            self._connections[target_id] = connection
+        return connection
+
+    def command(self, method, timeout=None, **params):
+        """Send a DevTools command to the current window
+
+        :param method: Command, e.g. 'Page.reload'
+        :type method: String
+        :param timeout: Timeout (seconds), default is None.
+        :type timeout: Number
+        :return: Command result
+        :rtype: Dict
+        """
+        try:
+            return self._connection().send(method, params, timeout)
+        except NoSuchWindowException:
+            self._connections.pop(self._targetId(self._handle)).close()
+            raise
+
+    def _evaluate(self, script, args, is_async, timeout=None):
+        # The script is inlined, extension pages don't allow new Function
+        expression = _WRAPPER + '(' + json.dumps(_encode(list(args))) + ', function () {\n' + script + '\n}, ' + \
+            ('true' if is_async else 'false') + ')'
+        result = self.command('Runtime.evaluate', timeout=timeout, expression=expression,
+                              returnByValue=True, awaitPromise=is_async, userGesture=True)
+        if 'exceptionDetails' in result:
+            details = result['exceptionDetails']
+            message = details.get('exception', {}).get('description') or details.get('text', '')
+            if 'stale element reference' in message:
+                raise StaleElementReferenceException(message)
+            raise JavascriptException(message)
+        return self._decode(result['result'].get('value'))
+
+    def _decode(self, value):
+        if isinstance(value, dict):
+            if '__element__' in value and len(value) == 1:
+                return CdpElement(self, value['__element__'])
+            return {k: self._decode(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._decode(v) for v in value]
+        return value
+
+    def execute_script(self, script, *args):
+        """Same as WebDriver.execute_script
+        """
+        return self._evaluate(script, args, False)
+
+    def execute_async_script(self, script, *args):
+        """Same as WebDriver.execute_async_script
+        """
+        return self._evaluate(script, args, True, self._script_timeout)
+
+    def set_script_timeout(self, time_to_wait):
+        self._script_timeout = time_to_wait
+
+    @property
+    def timeouts(self):
+        """Same as WebDriver.timeouts, only the script timeout is set
+        """
+        return Timeouts(script=self._script_timeout)
+
+    @property
+    def current_url(self):
+        return self.execute_script('return location.href;')
+
+    def get(self, url):
+        """Same as WebDriver.get, returns once the new document is loaded
+        """
+        self._load('Page.navigate', url=url)
+
+    def refresh(self):
+        """Same as WebDriver.refresh
+        """
+        self._load('Page.reload')
+
+    def get_screenshot_as_png(self):
+        """Same as WebDriver.get_screenshot_as_png
+        """
+        return base64.b64decode(self.command('Page.captureScreenshot', format='png')['data'])
+
+    def _load(self, method, **params):
+        # Mark the current document to tell it apart from the new one
+        token = str(time.monotonic())
+        try:
+            self.execute_script('window.__autoMetamaskLoad = arguments[0];', token)
+        except WebDriverException:
+            pass
+        result = self.command(method, **params)
+        if method == 'Page.navigate' and not result.get('loaderId'):
+            # Same document navigation, e.g. a hash change
+            return
+
+        end_time = time.monotonic() + 40
+        while time.monotonic() < end_time:
+            try:
+                if self.execute_script("return document.readyState === 'complete' && window.__autoMetamaskLoad !== arguments[0];", token):
+                    return
+            except WebDriverException as e:
+                if not any(error in str(e) for error in _NAVIGATION_ERRORS):
+                    raise
+            time.sleep(0.01)
+        raise TimeoutException("Page load timed out")
+
+    def find_element(self, by=By.ID, value=None):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(by + ': ' + str(value))
+        return elements[0]
+
+    def find_elements(self, by=By.ID, value=None):
+        return _findElements(self, None, by, value)
+
+    def close(self):
+        """Close the websockets, the browser is left running
+        """
+        for connection in self._connections.values():
+            connection.close()
+        self._connections = {}
+
+
+def _findElements(page, root, by, value):
+    if by == By.XPATH:
+        return page.execute_script(_FIND, root, 'xpath', value)
+    if by == By.ID:
+        value = '[id="' + value + '"]'
+    elif by == By.NAME:
+        value = '[name="' + value + '"]'
+    elif by == By.CLASS_NAME:
+        value = '.' + value
+    elif by == By.TAG_NAME:
+        pass
+    elif by != By.CSS_SELECTOR:
+        raise WebDriverException("Unsupported locator " + by)
+    return page.execute_script(_FIND, root, 'css', value)
+
+
+class CdpElement:
+    """Element found through CdpPage, with the WebElement methods the session and Select use
+
+    :param page: Page the element was found in
+    :type page: CdpPage
+    :param id: Registry id of the element in its document
+    :type id: String
+    """
+
+    def __init__(self, page, id):
+        self.page = page
+        self.id = id
+        # Element name in the click and type spans, set by TracedWait
+        self.trace_name = None
+
+    def __eq__(self, other):
+        return isinstance(other, CdpElement) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return '<CdpElement {}>'.format(self.id)
+
+    def _script(self, script, *args):
+        return self.page.execute_script(script, self, *args)
+
+    def click(self):
+        with span('click', element=self.trace_name, backend='cdp'):
+            x, y, tag = self._script(_CLICK_POINT)
+            if tag == 'OPTION':
+                # Options of a native select can't be clicked with the mouse
+                self._script(_SELECT_OPTION)
+                return
+            for event in ('mousePressed', 'mouseReleased'):
+                self.page.command('Input.dispatchMouseEvent', type=event, x=x, y=y, button='left', clickCount=1)
+
+    def send_keys(self, *value):
+        # The typed text is not recorded, it is often a password or a key
+        with span('type', element=self.trace_name, backend='cdp'):
+            self._script(_FOCUS)
+            self.page.command('Input.insertText', text=''.join(str(v) for v in value))
+
+    def clear(self):
+        self._script("var el = arguments[0]; el.value = ''; el.dispatchEvent(new Event('input', {bubbles: true}));")
+
+    @property
+    def tag_name(self):
+        return self._script('return arguments[0].tagName.toLowerCase();')
+
+    @property
+    def text(self):
+        return self._script('return arguments[0].innerText;')
+
+    def get_attribute(self, name):
+        return self._script(
+            'var el = arguments[0], name = arguments[1];'
+            'var value = name in el && typeof el[name] !== "object" ? el[name] : el.getAttribute(name);'
+            'return value === null || value === undefined ? null : String(value);', name)
+
+    def get_dom_attribute(self, name):
+        return self._script('return arguments[0].getAttribute(arguments[1]);', name)
+
+    def get_property(self, name):
+        return self._script('return arguments[0][arguments[1]];', name)
+
+    def is_displayed(self):
+        return self._script(
+            'var el = arguments[0], rect = el.getBoundingClientRect(), style = getComputedStyle(el);'
+            'return rect.width > 0 && rect.height > 0 && style.visibility !== "hidden" && style.display !== "none";')
+
+    def is_enabled(self):
+        return self._script('return !arguments[0].disabled;')
+
+    def is_selected(self):
+        return self._script('return !!(arguments[0].selected || arguments[0].checked);')
+
+    def find_element(self, by=By.ID, value=None):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(by + ': ' + str(value))
+        return elements[0]
+
+    def find_elements(self, by=By.ID, value=None):
+        return _findElements(self.page, self, by, value)
@@ -1,248 +1,136 @@
 import os
-import requests
-import shutil
 import logging
-from functools import wraps
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.wait import WebDriverWait
-from selenium.webdriver.support.select import Select
-from selenium.webdriver.support import expected_conditions as EC
-from selenium_stealth import stealth
-from webdriver_manager.chrome import ChromeDriverManager
+from .cache import fetchArtifact
+from .extension import downloadMetamask, extractMetamask, extensionId, extensionVersion
+from .resolver import resolveChromedriver, registerChromedriver, chromeVersion
+from .tracing import span, addSink, removeSink, flushSpans, JsonLinesSink, MemorySink, OTelSink
+from .session import MetaMaskSession, MetaMaskPool, switchPage
+from .aio import AsyncMetaMaskSession
+from .waits import OperationCancelled
+from .results import OperationResult, MetaMaskError
+from .receipts import ReceiptWaiter, Receipt, RpcError
+from .policy import ApprovalPolicy, Rule
+from .profiles import LaunchProfile, registerProfile, getProfile, processTreeMemory
+from .health import HealthMonitor, HealthPolicy
+from .diagnostics import DiagnosticsRecorder
+from .deadlines import LatencyProfile, Deadline
 
 file_path = os.getcwd()
 log_format = "%(asctime)s %(levelname)s %(message)s"
 date_format = "%m-%d-%Y %H:%M:%S"
-logging.basicConfig(filename=file_path+"/auto-metamask.log", level=logging.INFO,
-                    format=log_format, datefmt=date_format)
-
-
-def downloadMetamask(url):
-    """Download the metamask extension
-
-    :param url: Metamask extension download address (.zip)
-    :type url: String
-    :return: Extension file path
-    :rtype: String
-    """
-    logging.info("Downloading metamask...")
-    local_filename = file_path + '/' + url.split('/')[-1]
-
-    if os.path.exists(local_filename):
-        logging.info("Metamask " + local_filename + " found in cache")
-        return local_filename
+# Records of the package's loggers only, the root logger of the application is left alone.
+# Opened on the first record, the pytest plugin points it at a file per worker before that.
+log_handler = logging.FileHandler(os.environ.get('AUTO_METAMASK_LOG', file_path+"/auto-metamask.log"), delay=True)
+log_handler.setFormatter(logging.Formatter(log_format, date_format))
+logger = logging.getLogger('auto_metamask')
+logger.setLevel(logging.INFO)
+logger.addHandler(log_handler)
+
+# The module level functions drive this session, use MetaMaskSession directly
+# to drive several browsers from one process.
+current_session = None
+
+
+def _useSession(new_session):
+    global current_session, driver, wait, wait_fast, wait_slow, metamask_handle, metamask_url
+    current_session = new_session
+    driver = new_session.driver
+    wait = new_session.wait
+    wait_fast = new_session.wait_fast
+    wait_slow = new_session.wait_slow
+    metamask_handle = new_session.metamask_handle
+    metamask_url = new_session.metamask_url
+    if _restarted not in new_session.restart_callbacks:
+        new_session.restart_callbacks.append(_restarted)
+    return driver
 
-    with requests.get(url, stream=True) as r:
-        with open(local_filename, 'wb') as f:
-            shutil.copyfileobj(r.raw, f)
 
-    return local_filename
+def _restarted(session):
+    # A restarted session has a new driver, keep the module state pointing at it
+    if session is current_session:
+        _useSession(session)
 
 
-def setupWebdriver(metamask_path, chrome_path=None, version=None, chromedriver_path=None):
+def setupWebdriver(metamask_path, chrome_path=None, version=None, chromedriver_path=None, user_data_dir=None, **kwargs):
     """Initialize chrome browser and install metamask extension
 
     :param metamask_path: Extension file path
     :type metamask_path: String
     :param chrome_path: Chrome browser path, default is None.
     :type chrome_path: String
-    :param version: Chrome browser version, make sure it matches the chromedriver version, if not provided, the latest version will be used, default is None. if chromedriver_path is provided, this parameter will be ignored.
+    :param version: Chrome browser version, make sure it matches the chromedriver version, if not provided, it is detected from the installed browser, default is None. if chromedriver_path is provided, this parameter will be ignored.
     :type version: String
     :param chromedriver_path: Chromedriver file path, default is None.
     :type chromedriver_path: String
+    :param user_data_dir: Chrome user data directory, a temporary profile is used if not provided, default is None.
+    :type user_data_dir: String
+    :param kwargs: Other MetaMaskSession arguments (wait_engine, navigation, approvals, compile_flows, extension_mode, backend, profile, raise_errors, latency_profile)
+    :type kwargs: Dict
     :return: Selenium Chrome WebDriver
     :rtype: WebDriver
     """
 
-    options = Options()
-    # options.add_argument('--start-maximized')
-    options.add_argument("--window-size=1440,900")
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-
-    # Chrome is controlled by automated test software
-    # options.binary_location = "/Applications/Google Chrome Dev.app/Contents/MacOS/Google Chrome Dev"
-    options.add_experimental_option('excludeSwitches', ['enable-automation'])
-    options.add_experimental_option('useAutomationExtension', False)
-    options.add_extension(metamask_path)
-    if chrome_path and version:
-        if os.path.exists(chrome_path):
-            options.binary_location = chrome_path
-            logging.info("Chrome path is " + chrome_path + ", version is " + version)
-        else:
-            logging.warning("Chrome path not found")
-    else:
-        logging.warning("Chrome path or version not provided, using default")
-
-    if chromedriver_path:
-        s = Service(chromedriver_path)
-    else:
-        s = Service(ChromeDriverManager(version=version, path=chromedriver_path).install())
-    global driver
-    driver = webdriver.Chrome(service=s, options=options)
-
-    # Selenium Stealth settings
-    stealth(driver,
-            languages=['en-US', 'en'],
-            vendor='Google Inc.',
-            platform='Win32',
-            webgl_vendor='Intel Inc.',
-            renderer='Intel Iris OpenGL Engine',
-            fix_hairline=True,
-            )
-
-    global wait
-    wait = WebDriverWait(driver, 20, 1)
-
-    global wait_fast
-    wait_fast = WebDriverWait(driver, 3, 1)
-
-    global wait_slow
-    wait_slow = WebDriverWait(driver, 40, 1)
-
-    wait.until(EC.number_of_windows_to_be(2))
-
-    global metamask_handle
-    metamask_handle = driver.window_handles[1]
-
-    driver.switch_to.window(metamask_handle)
-    wait.until(EC.url_contains('home'))
-
-    global metamask_url
-    metamask_url = driver.current_url.split('#')[0]
-
-    return driver
-
+    return _useSession(MetaMaskSession(metamask_path, chrome_path, version, chromedriver_path, user_data_dir, **kwargs))
 
-def switchPage(func):
-    @wraps(func)
-    def switch(*args, **kwargs):
-        current_handle = driver.current_window_handle
-        driver.switch_to.window(metamask_handle)
 
-        driver.get(metamask_url)
+def launchMetamask(metamask_path, recovery_phrase, password, networks=None, chrome_path=None, version=None, chromedriver_path=None, **kwargs):
+    """Start a browser with an onboarded wallet, reusing a profile snapshot when possible
 
-        try:
-            wait_fast.until(EC.element_to_be_clickable(
-                (By.CSS_SELECTOR, "button[data-testid='popover-close']"))).click()
-        except Exception:
-            logging.warning("No popover")
+    The first launch runs the full onboarding, adds the networks and saves the profile as a snapshot.
+    Later launches clone the snapshot into a throwaway profile and only unlock the wallet.
 
-        func(*args, **kwargs)
-
-        try:
-            wait_fast.until(EC.element_to_be_clickable(
-                (By.CSS_SELECTOR, "button[data-testid='popover-close']"))).click()
-        except Exception:
-            logging.warning("No popover")
+    :param metamask_path: Extension file path (.zip) or unpacked extension directory
+    :type metamask_path: String
+    :param recovery_phrase: Recovery phrase (12 words)
+    :type recovery_phrase: String
+    :param password: Wallet password (minimum 8 characters)
+    :type password: String
+    :param networks: Custom networks, a list of (network_name, rpc_url, chain_id, currency_symbol), default is None.
+    :type networks: List
+    :param chrome_path: Chrome browser path, default is None.
+    :type chrome_path: String
+    :param version: Chrome browser version, default is None.
+    :type version: String
+    :param chromedriver_path: Chromedriver file path, default is None.
+    :type chromedriver_path: String
+    :param kwargs: Other MetaMaskSession arguments (wait_engine, navigation, approvals, compile_flows, extension_mode, backend, profile, raise_errors, latency_profile)
+    :type kwargs: Dict
+    :return: Selenium Chrome WebDriver
+    :rtype: WebDriver
+    """
 
-        driver.switch_to.window(current_handle)
-    return switch
+    return _useSession(MetaMaskSession.launch(
+        metamask_path, recovery_phrase, password, networks,
+        chrome_path=chrome_path, version=version, chromedriver_path=chromedriver_path, **kwargs))
 
 
-@switchPage
-def setupMetamask(recovery_phrase, password):
+def setupMetamask(recovery_phrase, password, deadline=None):
     """Setup metamask wallet
 
     :param recovery_phrase: Recovery phrase (12 words)
     :type recovery_phrase: String
     :param password: Wallet password (minimum 8 characters)
     :type password: String
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
     """
 
-    wait_slow.until(EC.invisibility_of_element_located(
-        (By.CSS_SELECTOR, "div[class='loading-overlay__container']")))
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "input[data-testid='onboarding-terms-checkbox']"))).click()
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "button[data-testid='onboarding-import-wallet']"))).click()
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "button[data-testid='metametrics-no-thanks']"))).click()
-
-    # Split the recovery phrase into individual words
-    words = recovery_phrase.split(' ')
-    word_count = len(words)
-
-    # Check if the length of the words is valid
-    if word_count not in [12, 15, 18, 21, 24]:
-        logging.error(
-            "Invalid recovery phrase. The phrase should be 12, 15, 18, 21, or 24 words long.")
-    else:
-        # Select the dropdown
-        # //*[@id="app-content"]/div/div[2]/div/div/div/div[4]/div/div/div[2]/select
-        # //*[contains(@class, 'dropdown__select')]
-        # //div[@class='import-srp__container']//select[@class='dropdown__select']
-        select = Select(wait.until(EC.element_to_be_clickable(
-            (By.XPATH, "//div[@class='import-srp__container']//select[@class='dropdown__select']"))))
-
-        # Select option by value (number of words)
-        select.select_by_value(str(word_count))
-        # For each input field
-        for i in range(word_count):
-            # Get the corresponding word
-            word = words[i]
-
-            # Input the word into the field
-            wait.until(EC.visibility_of_element_located(
-                (By.CSS_SELECTOR, f"input[data-testid='import-srp__srp-word-{i}']"))).send_keys(word)
-
-    # Click the confirm button
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "button[data-testid='import-srp-confirm']"))).click()
-
-    # find the password input and type the password
-    new_password = wait.until(
-        EC.visibility_of_element_located((By.CSS_SELECTOR, "input[data-testid='create-password-new']")))
-    new_password.send_keys(password)
-
-    # find the confirm password input and type the password
-    confirm_password = wait.until(
-        EC.visibility_of_element_located((By.CSS_SELECTOR, "input[data-testid='create-password-confirm']")))
-    confirm_password.send_keys(password)
-
-    # find the terms checkbox and click
-    terms_checkbox = driver.find_element(
-        By.CSS_SELECTOR, "input[data-testid='create-password-terms']")
-    terms_checkbox.click()
-
-    # find the submit button and click
-    submit_button = driver.find_element(
-        By.CSS_SELECTOR, "button[data-testid='create-password-import']")
-    submit_button.click()
-
-    # find the all done button and click
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "button[data-testid='onboarding-complete-done']"))).click()
-
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "button[data-testid='pin-extension-next']"))).click()
-
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "button[data-testid='pin-extension-done']"))).click()
-
-    try:
-        wait.until(EC.element_to_be_clickable(
-            (By.CSS_SELECTOR, "button[data-testid='popover-close']"))).click()
-    except Exception:
-        logging.warning("No welcome popover")
-        return
-
-    try:
-        # This button is only available when the popup is closed
-        wait.until(EC.element_to_be_clickable(
-            (By.CSS_SELECTOR, "button[data-testid='eth-overview-send']")))
-    except Exception:
-        logging.error("Setup failed")
-        return
-
-    logging.info('Setup success')
-
-
-@switchPage
-def addNetwork(network_name, rpc_url, chain_id, currency_symbol):
+    return current_session.setupMetamask(recovery_phrase, password, deadline=deadline)
+
+
+def unlockMetamask(password, deadline=None):
+    """Unlock metamask wallet
+
+    :param password: Wallet password
+    :type password: String
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
+    """
+
+    return current_session.unlockMetamask(password, deadline=deadline)
+
+
+def addNetwork(network_name, rpc_url, chain_id, currency_symbol, deadline=None):
     """Add a custom network
 
     :param network_name: Network name
@@ -253,270 +141,181 @@ def addNetwork(network_name, rpc_url, chain_id, currency_symbol):
     :type chain_id: String
     :param currency_symbol: Currency symbol
     :type currency_symbol: String
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
     """
 
-    # Switch to the settings page
-    driver.get(metamask_url + '#settings/networks/add-network')
-
-    # network-display
-    # wait.until(EC.element_to_be_clickable(
-    #     (By.CSS_SELECTOR, "button[data-testid='network-display']"))).click()
-
-    # //div[contains(@class, 'multichain-network-list-menu-content-wrapper')]//button[contains(@class, 'mm-button-secondary')]
-    # wait.until(EC.element_to_be_clickable(
-    #     (By.XPATH, "//div[contains(@class, 'multichain-network-list-menu-content-wrapper')]//button[contains(@class, 'mm-button-secondary')]"))).click()
-
-    inputs = wait.until(
-        EC.visibility_of_all_elements_located((By.XPATH, "//div[@class='networks-tab__add-network-form-body']//input")))
+    return current_session.addNetwork(network_name, rpc_url, chain_id, currency_symbol, deadline=deadline)
 
-    inputs[0].send_keys(network_name)
-    inputs[1].send_keys(rpc_url)
-    inputs[2].send_keys(chain_id)
-    inputs[3].send_keys(currency_symbol)
 
-    wait.until(EC.element_to_be_clickable(
-        (By.XPATH, "//div[contains(@class, 'networks-tab__add-network-form-footer')]//button[contains(@class, 'btn-primary')]"))).click()
+def addNetworks(networks, select=None, deadline=None):
+    """Add several custom networks at once, through the MetaMask background when the version supports it
 
-    try:
-        wait.until(EC.element_to_be_clickable(
-            (By.XPATH, "//button[contains(@class, 'home__new-network-added__switch-to-button')]"))).click()
-    except Exception:
-        logging.error("Add network failed")
-        return
+    :param networks: Custom networks, a list of (network_name, rpc_url, chain_id, currency_symbol)
+    :type networks: List
+    :param select: Name of the network to switch to, the current network is kept if not provided, default is None.
+    :type select: String
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
+    :return: Result, its value is the names of the networks added
+    :rtype: OperationResult
+    """
 
-    logging.info('Add network success')
+    return current_session.addNetworks(networks, select, deadline=deadline)
 
 
-@switchPage
-def changeNetwork(network_name):
+def changeNetwork(network_name, deadline=None):
     """Switch to a network
 
     :param network_name: Network name
     :type network_name: String
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
     """
 
-    logging.info('Change network')
-
-    # display the network list
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "button[data-testid='network-display']"))).click()
-
-
-
-    try:
-        wait.until(EC.element_to_be_clickable(
-            (By.CSS_SELECTOR, "label.toggle-button"))).click()
-
-    except Exception:
-        logging.error("no need to show test networks")
-
-    # click the network name
-    wait.until(EC.presence_of_element_located(
-        (By.XPATH, "//span[text()='{}']".format(network_name)))).click()
-
-    try:
-        # check if the network is changed
-        wait.until(EC.element_to_be_clickable(
-            (By.XPATH, "//p[text()='{}']".format(network_name))))
-    except Exception:
-        logging.error("Change network failed")
-        return
-
-    logging.info('Change network success')
+    return current_session.changeNetwork(network_name, deadline=deadline)
 
 
-@switchPage
-def importPK(priv_key):
+def importPK(priv_key, deadline=None):
     """Import private key
 
     :param priv_key: Private key
     :type priv_key: String
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
     """
 
-    # Click the account menu
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "button[data-testid='account-menu-icon']"))).click()
-    # Click the import account button
-    wait.until(EC.element_to_be_clickable(
-        (By.XPATH, "(//section[contains(@class, 'multichain-account-menu-popover')]//button[contains(@class, 'mm-button-base--size-sm')])[2]"))).click()
+    return current_session.importPK(priv_key, deadline=deadline)
 
-    key_input = wait.until(EC.visibility_of_element_located(
-        (By.CSS_SELECTOR, '#private-key-box')))
 
-    key_input.send_keys(priv_key)
+def importAccounts(private_keys, deadline=None):
+    """Import several private keys at once
 
-    # Click the import button
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "button[data-testid='import-account-confirm-button']"))).click()
+    :param private_keys: Private keys
+    :type private_keys: List
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
+    :return: Result, its value is the addresses (lowercase) of the new accounts
+    :rtype: OperationResult
+    """
 
-    try:
-        # This button is only available when the popup is closed
-        wait.until(EC.element_to_be_clickable(
-            (By.CSS_SELECTOR, "button[data-testid='eth-overview-send']")))
-    except Exception:
-        logging.error("Import PK failed")
-        return
+    return current_session.importAccounts(private_keys, deadline=deadline)
 
-    logging.info('Import PK success')
 
+def switchAccount(address, deadline=None):
+    """Select the active account
 
-@switchPage
-def connect():
-    """Connect wallet
+    :param address: Account address
+    :type address: String
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
     """
 
-    # Next
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "button[data-testid='page-container-footer-next']"))).click()
+    return current_session.switchAccount(address, deadline=deadline)
 
-    # Confirm
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "button[data-testid='page-container-footer-next']"))).click()
 
-    try:
-        # This button is only available when the popup is closed
-        wait.until(EC.element_to_be_clickable(
-            (By.CSS_SELECTOR, "button[data-testid='eth-overview-send']")))
-    except Exception:
-        logging.error("Connect wallet failed")
-        return
+def connect(deadline=None):
+    """Connect wallet
+
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
+    """
 
-    logging.info('Connect wallet successfully')
+    return current_session.connect(deadline=deadline)
 
 
-@switchPage
-def approve():
+def approve(deadline=None):
     """Approve wallet
-    """
 
-    wait.until(EC.element_to_be_clickable(
-        (By.XPATH, "//button[contains(@class, 'btn-primary')]"))).click()
-    
-    wait.until(EC.element_to_be_clickable(
-        (By.XPATH, "//button[contains(@class, 'btn-primary')]"))).click()
-
-    try:
-        # This button is only available when the popup is closed
-        wait.until(EC.element_to_be_clickable(
-            (By.CSS_SELECTOR, "button[data-testid='eth-overview-send']")))
-    except Exception:
-        logging.error("Approve failed")
-        return
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
+    """
 
-    logging.info('Approve successfully')
+    return current_session.approve(deadline=deadline)
 
 
-@switchPage
-def approveTokens(cap=None):
+def approveTokens(cap=None, deadline=None):
     """Approve tokens
 
     :param cap: Spending limit, must be greater than 0, default is None.
     :type cap: Number
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
     """
 
-    try:
-        wait_fast.until(EC.element_to_be_clickable(
-        (By.XPATH, "//button[text()='Use default']")))
-    except Exception:
-        logging.warning('Refresh page')
-        driver.refresh()
-
-    if cap:
-        if isinstance(cap, int) and cap > 0:
-            wait.until(EC.visibility_of_element_located(
-                (By.CSS_SELECTOR, "input[id='custom-spending-cap']"))).send_keys(str(cap))
-        else:
-            logging.error("Invalid cap")
-            return
-    else:
-        wait.until(EC.element_to_be_clickable(
-            (By.XPATH, "//button[text()='Use default']"))).click()
-    
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "button[data-testid='page-container-footer-next']"))).click()
-    
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "button[data-testid='page-container-footer-next']"))).click()
-
-    try:
-        # This button is only available when the popup is closed
-        wait.until(EC.element_to_be_clickable(
-            (By.CSS_SELECTOR, "button[data-testid='eth-overview-send']")))
-    except Exception:
-        logging.error("Approve failed")
-        return
-
-    logging.info('Approve successfully')
-
-
-@switchPage
-def confirm():
+    return current_session.approveTokens(cap, deadline=deadline)
+
+
+def confirm(deadline=None):
     """Confirm wallet
 
     Use for Transaction, Sign, Deploy Contract, Create Token, Add Token, Sign In, etc.
+
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
     """
 
-    try:
-        wait_fast.until(EC.element_to_be_clickable(
-            (By.CSS_SELECTOR, "button[data-testid='page-container-footer-next']")))
-    except Exception:
-        logging.warning('Refresh page')
-        driver.refresh()
+    return current_session.confirm(deadline=deadline)
 
-    wait.until(EC.element_to_be_clickable(
-            (By.CSS_SELECTOR, "button[data-testid='page-container-footer-next']"))).click()
 
-    try:
-        wait.until(EC.element_to_be_clickable(
-            (By.CSS_SELECTOR, "button[data-testid='eth-overview-send']")))
-    except Exception:
-        logging.error("Connect wallet failed")
-        return
+def drainPending(policy=None, deadline=None):
+    """Handle every pending request in one visit, in the order MetaMask shows them
+
+    :param policy: ApprovalPolicy, or a function taking the request and returning a Rule or 'approve'/'reject', approves everything if not provided, default is None.
+    :type policy: ApprovalPolicy
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
+    :return: Outcome of each request, {'id', 'kind', 'origin', 'value', 'action', 'ok', 'error', 'elapsed'}
+    :rtype: List
+    """
 
-    logging.info('Sign successfully')
+    return current_session.drainPending(policy, deadline=deadline)
 
 
-@switchPage
-def waitPending(timeout=40):
+def waitPending(timeout=None, deadline=None):
     """Wait pending
 
-    :param timeout: Timeout (seconds)
+    :param timeout: Timeout (seconds), default is the deadline learned with a latency profile, else 40.
     :type timeout: Number
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
     """
 
-    wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "li[data-testid='home__activity-tab']"))).click()
+    return current_session.waitPending(timeout, deadline=deadline)
 
-    try:
-        if timeout and isinstance(timeout, int):
-            wait_temp = WebDriverWait(driver, timeout, 1)
-        else:
-            wait_temp = WebDriverWait(driver, 40, 1)
 
-        wait_temp.until_not(EC.visibility_of_any_elements_located(
-            (By.CSS_SELECTOR, '.transaction-status-label--pending')))
-    except Exception:
-        logging.error("Wait pending failed or timeout")
-        return
+def waitReceipts(tx_hashes, timeout=120, rpc_url=None):
+    """Wait until transactions are mined, asking the chain instead of the wallet UI
+
+    :param tx_hashes: Transaction hashes
+    :type tx_hashes: List
+    :param timeout: Timeout (seconds), default is 120.
+    :type timeout: Number
+    :param rpc_url: RPC URL, default is the one of the selected network.
+    :type rpc_url: String
+    :return: Receipt of each transaction by hash, None for the ones still pending at the timeout
+    :rtype: Dict
+    """
 
-    logging.info('Wait pending successfully')
+    return current_session.waitReceipts(tx_hashes, timeout, rpc_url)
 
-@switchPage
-def disconnect():
+
+def memoryUsage():
+    """Memory of the whole browser: chromedriver, Chrome and all its processes
+
+    :return: {'rss': bytes, 'pss': bytes or None, 'processes': Number}, None if it can't be measured
+    :rtype: Dict
+    """
+
+    return current_session.memoryUsage()
+
+
+def disconnect(deadline=None):
     """
     Disconnect wallet from given sites after transaction done.
-    :return:
+
+    :param deadline: Time the whole call must end by (seconds), default is None.
+    :type deadline: Number
     """
-    try:
-        wait.until(EC.element_to_be_clickable(
-            (By.XPATH, "//button[@data-testid='account-options-menu-button']"))).click()
-        wait.until(EC.element_to_be_clickable(
-            (By.CSS_SELECTOR, "button[data-testid='global-menu-connected-sites'"))).click()
-        wait.until(EC.element_to_be_clickable(
-            (By.XPATH, '//*[@id="popover-content"]/div/div/section/div[2]/main/div/a'))).click()
-        wait.until(EC.element_to_be_clickable(
-            (By.XPATH, "//button[contains(text(),'Disconnect')]"))).click()
-        logging.info('Disconnect successfully')
-    except Exception:
-        logging.warning('Disconnect failed')
-        return
+
+    return current_session.disconnect(deadline=deadline)
@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from collections import deque
+from selenium.common.exceptions import TimeoutException
+from .cache import cache_path, fileLock
+
+profile_path = os.path.join(cache_path, 'latency-profile.json')
+
+
+class LatencyProfile:
+    """Observed duration of every step, kept across runs to derive the step deadlines from
+
+    A step is an element waited for (its catalog name), a compiled flow step, the notification
+    window or the pending transactions. Only successful waits are recorded. The deadline of a
+    step is a high percentile of its recent durations times a margin, and the fixed timeout
+    until enough durations were seen.
+
+    :param path: JSON file the durations are loaded from and saved to, default is profile_path.
+    :type path: String
+    :param window: Number of recent durations kept per step, default is 200.
+    :type window: Number
+    :param percentile: Percentile the deadlines are derived from, default is 0.99.
+    :type percentile: Number
+    :param margin: Deadline as a multiple of the percentile, default is 2.
+    :type margin: Number
+    :param min_samples: Durations needed before the fixed timeout of a step is replaced, default is 10.
+    :type min_samples: Number
+    :param minimum: Shortest deadline (seconds), default is 0.5.
+    :type minimum: Number
+    :param maximum: Longest deadline (seconds), default is 60.
+    :type maximum: Number
+    """
+
+    def __init__(self, path=profile_path, window=200, percentile=0.99, margin=2, min_samples=10, minimum=0.5, maximum=60):
+        self.path = path
+        self.window = window
+        self.percentile = percentile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.minimum = minimum
+        self.maximum = maximum
+        self._samples = {}
+        # Recorded since the last save, merged into the file by save, at most window per step
+        self._new = {}
+        self._deadlines = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path) as f:
+            steps = json.load(f).get('steps', {})
+        for step, samples in steps.items():
+            self._samples[step] = deque(samples, maxlen=self.window)
+
+    def record(self, step, duration):
+        """Record a successful run of a step
+
+        :param step: Step name, e.g. 'footer-next'
+        :type step: String
+        :param duration: Duration (seconds)
+        :type duration: Number
+        """
+        duration = round(duration, 4)
+        with self._lock:
+            samples = self._samples.get(step)
+            if samples is None:
+                samples = self._samples[step] = deque(maxlen=self.window)
+            samples.append(duration)
+            new = self._new.get(step)
+            if new is None:
+                new = self._new[step] = deque(maxlen=self.window)
+            new.append(duration)
+            self._deadlines.pop(step, None)
+
+    def quantile(self, step, q=None):
+        """Percentile of the recent durations of a step
+
+        :param step: Step name
+        :type step: String
+        :param q: Percentile between 0 and 1, default is the profile percentile.
+        :type q: Number
+        :return: Duration (seconds), None if the step was never recorded
+        :rtype: Number
+        """
+        with self._lock:
+            return self._quantile(step, self.percentile if q is None else q)
+
+    def _quantile(self, step, q):
+        # Called with the lock held
+        samples = sorted(self._samples.get(step, ()))
+        if not samples:
+            return None
+        return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+    def deadline(self, step, default):
+        """Deadline of a step
+
+        :param step: Step name
+        :type step: String
+        :param default: Fixed timeout (seconds), used until enough durations were recorded
+        :type default: Number
+        :return: Deadline (seconds)
+        :rtype: Number
+        """
+        with self._lock:
+            deadline = self._deadlines.get(step)
+            if deadline is None:
+                samples = self._samples.get(step)
+                if samples is None or len(samples) < self.min_samples:
+                    return default
+                deadline = min(max(self._quantile(step, self.percentile) * self.margin, self.minimum), self.maximum)
+                self._deadlines[step] = deadline
+            return deadline
+
+    def summary(self):
+        """Figures of every step
+
+        :return: {step: {'count', 'p50', 'p99', 'deadline'}}, deadline is None until enough durations were recorded
+        :rtype: Dict
+        """
+        with self._lock:
+            steps = list(self._samples)
+        return {step: {
+            'count': len(self._samples[step]),
+            'p50': self.quantile(step, 0.5),
+            'p99': self.quantile(step, 0.99),
+            'deadline': self.deadline(step, None),
+        } for step in steps}
+
+    def save(self):
+        """Merge the durations recorded since the last save into the file
+
+        Several processes (e.g. xdist workers) can share the file, each adds its own durations.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            new, self._new = self._new, {}
+        if not new:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with fileLock(self.path + '.lock'):
+            steps = {}
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    steps = json.load(f).get('steps', {})
+            for step, samples in new.items():
+                steps[step] = (steps.get(step, []) + list(samples))[-self.window:]
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'saved': time.time(), 'steps': steps}, f)
+            os.replace(tmp, self.path)
+
+
+class Deadline:
+    """End time of a whole call, every wait of the call ends by then
+
+    :param seconds: Time the call may take (seconds)
+    :type seconds: Number
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.end_time = time.monotonic() + seconds
+
+    def remaining(self):
+        """Time left (seconds), 0 once expired
+        """
+        return max(self.end_time - time.monotonic(), 0)
+
+
+class WaitBudget:
+    """Timeouts of the waits of a session, from its latency profile and the deadline of the running call
+
+    :param profile: Latency profile, fixed timeouts if not provided, default is None.
+    :type profile: LatencyProfile
+    """
+
+    def __init__(self, profile=None):
+        self.profile = profile
+        # Set by switchPage for calls given a deadline
+        self.deadline = None
+
+    def timeout(self, step, default, adaptive=True):
+        """Timeout of the next wait for a step
+
+        :param step: Step name
+        :type step: String
+        :param default: Fixed timeout (seconds)
+        :type default: Number
+        :param adaptive: Use the deadline learned for the step, default is True.
+        :type adaptive: Boolean
+        :return: Timeout (seconds)
+        :rtype: Number
+        """
+        timeout = default
+        if adaptive and self.profile is not None and step:
+            timeout = self.profile.deadline(step, default)
+        return self.limit(timeout, step)
+
+    def limit(self, timeout, step=None):
+        """Shorten a timeout to the deadline of the running call
+
+        :param timeout: Timeout (seconds)
+        :type timeout: Number
+        :param step: Step name, reported when the deadline has passed, default is None.
+        :type step: String
+        :return: Timeout (seconds)
+        :rtype: Number
+        """
+        if self.deadline is None:
+            return timeout
+        remaining = self.deadline.remaining()
+        if remaining <= 0:
+            e = TimeoutException("Deadline of {}s exceeded".format(self.deadline.seconds))
+            # Read by OperationResult.fromException
+            e.step = step
+            raise e
+        return min(timeout, remaining)
+
+    def record(self, step, duration):
+        """Record a successful wait in the profile
+
+        :param step: Step name
+        :type step: String
+        :param duration: Duration (seconds)
+        :type duration: Number
+        """
+        if self.profile is not None and step:
+            self.profile.record(step, duration)
@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import gzip
+import base64
+import queue
+import shutil
+import logging
+import threading
+from collections import deque
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Outer HTML of a clone of the page, the live document is left untouched. Input values are
+# redacted (React mirrors them into the value attribute), only whether a field was filled is kept.
+_DOM_SCRIPT = """
+var root = document.documentElement;
+if (!root) return [location.href, ''];
+var live = root.querySelectorAll('input, textarea');
+var clone = root.cloneNode(true);
+var fields = clone.querySelectorAll('input, textarea');
+for (var i = 0; i < fields.length; i++) {
+    var field = fields[i];
+    if (field.tagName === 'TEXTAREA') field.textContent = '';
+    field.removeAttribute('value');
+    if (live[i] && live[i].value) field.setAttribute('data-auto-metamask-filled', 'true');
+}
+return [location.href, clone.outerHTML];
+"""
+
+
+class DiagnosticsRecorder:
+    """Keep the last moments of a session in memory and save them when an operation fails
+
+    In 'dom' mode a clone of the page (outer HTML with the input values redacted, and URL) is
+    snapshotted before every operation, the session only pays for the script round trip,
+    compression runs on a background thread.
+    In 'screencast' mode the window the operation acts in (the metamask tab, or the notification
+    window of a request) streams its frames over a DevTools websocket of its own (requires
+    websocket-client), read and decoded on a background thread, without any round trip from
+    the session.
+
+    Nothing is written while operations succeed. When one fails, a screenshot and a final DOM
+    snapshot are taken and the ring is written with the result into a directory of its own. The
+    oldest of those directories are removed to stay under the disk quota.
+
+    :param session: Session to record
+    :type session: MetaMaskSession
+    :param directory: Directory the failures are saved in, default is 'auto-metamask-diagnostics'.
+    :type directory: String
+    :param capacity: Number of snapshots or frames kept, default is 20.
+    :type capacity: Number
+    :param mode: 'dom' or 'screencast', default is 'dom'.
+    :type mode: String
+    :param quota: Disk space the saved failures may use (bytes), default is 200 MB.
+    :type quota: Number
+    :param every_nth_frame: In 'screencast' mode, keep one frame out of this many, default is 1.
+    :type every_nth_frame: Number
+    """
+
+    def __init__(self, session, directory='auto-metamask-diagnostics', capacity=20, mode='dom', quota=200 * 1024 * 1024, every_nth_frame=1):
+        if mode not in ('dom', 'screencast'):
+            raise ValueError("Unknown diagnostics mode " + repr(mode) + ", expected 'dom' or 'screencast'")
+        self.session = session
+        self.directory = directory
+        self.capacity = capacity
+        self.mode = mode
+        self.quota = quota
+        self.every_nth_frame = every_nth_frame
+        # Snapshots dropped before compression because the thread fell behind
+        self.dropped = 0
+        self.saved = []
+        # (time, label, url, gzipped html) or (time, 'frame', None, jpeg)
+        self._ring = deque(maxlen=capacity)
+        self._ring_lock = threading.Lock()
+        self._pending = queue.Queue(maxsize=capacity)
+        self._stop = threading.Event()
+        self._reconnect = threading.Event()
+        # Window the screencast streams, the metamask tab if None
+        self._handle = None
+        if mode == 'dom':
+            self._thread = threading.Thread(target=self._compress, name='auto-metamask-diagnostics', daemon=True)
+        else:
+            self._thread = threading.Thread(target=self._screencast, name='auto-metamask-screencast', daemon=True)
+        self._thread.start()
+        session.restart_callbacks.append(self._restarted)
+        session.diagnostics = self
+
+    def capture(self, label):
+        """Snapshot the DOM of the current tab into the ring ('dom' mode), or move the screencast to
+        the window of the operation ('screencast' mode)
+
+        :param label: What the session was about to do, e.g. the operation name
+        :type label: String
+        """
+        if self.mode != 'dom':
+            handle = self.session.notification_handle or self.session.metamask_handle
+            if handle != (self._handle or self.session.metamask_handle):
+                self._handle = handle
+                self._reconnect.set()
+            return
+        snapshot = self._snapshot()
+        if snapshot is None:
+            return
+        item = (time.time(), label) + snapshot
+        try:
+            self._pending.put_nowait(item)
+        except queue.Full:
+            # The compression thread fell behind, the oldest snapshot makes room
+            try:
+                self._pending.get_nowait()
+                self._pending.task_done()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            self._pending.put_nowait(item)
+
+    def _snapshot(self):
+        try:
+            url, html = self.session.page.execute_script(_DOM_SCRIPT)
+            return url, html
+        except Exception:
+            logger.warning("Diagnostics snapshot failed")
+            return None
+
+    def _compress(self):
+        while True:
+            item = self._pending.get()
+            try:
+                if item is None:
+                    return
+                captured_at, label, url, html = item
+                data = gzip.compress(html.encode('utf-8'), 6)
+                with self._ring_lock:
+                    self._ring.append((captured_at, label, url, data))
+            finally:
+                self._pending.task_done()
+
+    def _screencast(self):
+        from .cdp import CdpConnection
+        connection = None
+        while not self._stop.is_set():
+            if connection is not None and self._reconnect.is_set():
+                connection.close()
+                connection = None
+            if connection is None:
+                self._reconnect.clear()
+                session = self.session
+                handle = self._handle or session.metamask_handle
+                try:
+                    address = session.driver.capabilities['goog:chromeOptions']['debuggerAddress']
+                    connection = CdpConnection('ws://' + address + '/devtools/page/' + handle[-32:])
+                    connection.post('Page.startScreencast', {'format': 'jpeg', 'quality': 60, 'everyNthFrame': self.every_nth_frame})
+                except ImportError:
+                    logger.error("Screencast diagnostics require websocket-client, pip install auto-metamask[cdp]")
+                    return
+                except Exception:
+                    connection = None
+                    if handle != session.metamask_handle:
+                        # The notification window closed, back to the metamask tab
+                        self._handle = None
+                        continue
+                    # Browser starting or restarting
+                    self._stop.wait(1)
+                    continue
+            try:
+                event = connection.receive(1)
+                if not event or event['method'] != 'Page.screencastFrame':
+                    continue
+                # Chrome sends the next frame once this one is acknowledged
+                connection.post('Page.screencastFrameAck', {'sessionId': event['params']['sessionId']})
+            except Exception:
+                connection.close()
+                connection = None
+                continue
+            with self._ring_lock:
+                self._ring.append((time.time(), 'frame', None, base64.b64decode(event['params']['data'])))
+        if connection is not None:
+            connection.close()
+
+    def _restarted(self, session):
+        # The screencast thread reconnects to the new metamask tab
+        self._handle = None
+        self._reconnect.set()
+
+    def _drain(self, timeout=5):
+        # Wait for the snapshots already taken to be compressed
+        end_time = time.monotonic() + timeout
+        while self._pending.unfinished_tasks and time.monotonic() < end_time:
+            time.sleep(0.01)
+
+    def flush(self, result):
+        """Save the ring, a screenshot and a final DOM snapshot of a failed operation
+
+        :param result: Result of the failed operation
+        :type result: OperationResult
+        :return: Directory the failure was saved in, None if nothing could be saved
+        :rtype: String
+        """
+        with span('diagnostics', operation=result.operation, mode=self.mode) as current:
+            screenshot = None
+            try:
+                screenshot = self.session.page.get_screenshot_as_png()
+            except Exception:
+                logger.warning("Diagnostics screenshot failed")
+            snapshot = self._snapshot()
+            self._drain()
+            with self._ring_lock:
+                entries = list(self._ring)
+                self._ring.clear()
+
+            files = []
+            for i, (captured_at, label, url, data) in enumerate(entries):
+                if label == 'frame':
+                    files.append(('{:03d}-frame.jpg'.format(i), data, {'time': captured_at}))
+                else:
+                    files.append(('{:03d}-{}.html.gz'.format(i, label), data,
+                                  {'time': captured_at, 'label': label, 'url': url}))
+            if snapshot:
+                url, html = snapshot
+                files.append(('failure.html.gz', gzip.compress(html.encode('utf-8'), 6),
+                              {'time': time.time(), 'label': 'failure', 'url': url}))
+            if screenshot:
+                files.append(('screenshot.png', screenshot, {'time': time.time()}))
+
+            # The most recent files first when the failure alone is over the quota
+            size = 0
+            kept = []
+            for name, data, meta in reversed(files):
+                if size + len(data) > self.quota:
+                    break
+                size += len(data)
+                kept.append((name, data, meta))
+            if not kept:
+                logger.warning("Diagnostics of %s exceed the quota, not saved", result.operation)
+                return None
+            self._evict(size)
+
+            path = os.path.join(self.directory, time.strftime('%Y%m%d-%H%M%S') + '-{:06d}-{}'.format(
+                int(time.time() * 1e6) % 1000000, result.operation))
+            try:
+                os.makedirs(path)
+                summary = dict(result.toDict(), files=[])
+                for name, data, meta in reversed(kept):
+                    with open(os.path.join(path, name), 'wb') as f:
+                        f.write(data)
+                    summary['files'].append(dict(meta, name=name))
+                with open(os.path.join(path, 'result.json'), 'w') as f:
+                    json.dump(summary, f, indent=2)
+            except OSError:
+                logger.exception("Save diagnostics failed")
+                return None
+            self.saved.append(path)
+            current.set(files=len(kept), size=size)
+            logger.info("Diagnostics of " + str(result.operation) + " saved to " + path)
+            return path
+
+    def _evict(self, size):
+        # Remove the oldest saved failures until the new one fits
+        if not os.path.isdir(self.directory):
+            return
+        failures = []
+        total = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not os.path.isdir(path):
+                continue
+            used = sum(os.path.getsize(os.path.join(root, file))
+                       for root, _, names in os.walk(path) for file in names)
+            failures.append((name, path, used))
+            total += used
+        failures.sort()
+        while failures and total + size > self.quota:
+            name, path, used = failures.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= used
+            if path in self.saved:
+                self.saved.remove(path)
+
+    def close(self):
+        """Stop the background thread, called by the session on quit
+        """
+        self._stop.set()
+        if self.mode == 'dom':
+            self._pending.put(None)
+        self._thread.join(5)
+        if self._restarted in self.session.restart_callbacks:
+            self.session.restart_callbacks.remove(self._restarted)
@@ -0,0 +1,116 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import zipfile
+from .cache import cache_path, fetchArtifact, fileLock
+
+logger = logging.getLogger(__name__)
+
+
+def downloadMetamask(url, sha256=None, cache_dir=None):
+    """Download the metamask extension
+
+    The zip is downloaded at most once per machine, see fetchArtifact.
+
+    :param url: Metamask extension download address (.zip), http(s):// or file://
+    :type url: String
+    :param sha256: Expected SHA-256 of the zip, default is None.
+    :type sha256: String
+    :param cache_dir: Cache directory, default is AUTO_METAMASK_CACHE or ~/.cache/auto-metamask.
+    :type cache_dir: String
+    :return: Extension file path
+    :rtype: String
+    """
+    logger.info("Downloading metamask...")
+    return fetchArtifact(url, sha256, cache_dir)
+
+
+def extractMetamask(metamask_path, cache_dir=None):
+    """Extract the metamask extension once into a shared read-only directory
+
+    Chrome loads the directory with --load-extension instead of receiving the base64 encoded
+    zip in the session capabilities and unpacking it again into every profile. An unpacked
+    extension loaded from a fixed directory also keeps the same extension id across launches,
+    which is required to reuse a browser profile.
+
+    :param metamask_path: Extension file path (.zip)
+    :type metamask_path: String
+    :param cache_dir: Cache directory, default is AUTO_METAMASK_CACHE or ~/.cache/auto-metamask.
+    :type cache_dir: String
+    :return: Unpacked extension directory
+    :rtype: String
+    """
+    root = os.path.join(cache_dir or cache_path, 'extensions')
+    name = extensionVersion(metamask_path) + '-' + _zipDigest(metamask_path)[:16]
+    extension_dir = os.path.join(root, name)
+
+    if os.path.exists(os.path.join(extension_dir, 'manifest.json')):
+        logger.info("Metamask " + extension_dir + " found in cache")
+        return extension_dir
+
+    with fileLock(os.path.join(root, 'locks', name + '.lock')):
+        if os.path.exists(os.path.join(extension_dir, 'manifest.json')):
+            return extension_dir
+
+        temp_dir = tempfile.mkdtemp(dir=root, prefix='.tmp-')
+        with zipfile.ZipFile(metamask_path) as z:
+            z.extractall(temp_dir)
+        for parent, dirs, files in os.walk(temp_dir):
+            for file in files:
+                os.chmod(os.path.join(parent, file), 0o444)
+        os.rename(temp_dir, extension_dir)
+        for parent, dirs, files in os.walk(extension_dir, topdown=False):
+            os.chmod(parent, 0o555)
+
+    logger.info("Metamask extracted to " + extension_dir)
+    return extension_dir
+
+
+_digests = {}
+
+
+def _zipDigest(path):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    if key not in _digests:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
+
+
+def extensionId(extension_dir):
+    """Compute the id Chrome assigns to an unpacked extension
+
+    :param extension_dir: Unpacked extension directory
+    :type extension_dir: String
+    :return: Extension id
+    :rtype: String
+    """
+    path = os.path.realpath(extension_dir)
+    if os.name == 'nt':
+        path = path.lower()
+        digest = hashlib.sha256(path.encode('utf-16-le')).hexdigest()
+    else:
+        digest = hashlib.sha256(path.encode('utf-8')).hexdigest()
+    return ''.join(chr(ord('a') + int(c, 16)) for c in digest[:32])
+
+
+def extensionVersion(metamask_path):
+    """Read the extension version from its manifest
+
+    :param metamask_path: Extension file path (.zip) or unpacked extension directory
+    :type metamask_path: String
+    :return: Extension version, e.g. 10.34.0
+    :rtype: String
+    """
+    if os.path.isdir(metamask_path):
+        with open(os.path.join(metamask_path, 'manifest.json'), encoding='utf-8') as f:
+            return json.load(f)['version']
+
+    with zipfile.ZipFile(metamask_path) as z:
+        return json.loads(z.read('manifest.json').decode('utf-8'))['version']
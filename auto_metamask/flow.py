@@ -0,0 +1,288 @@
+import time
+import logging
+from contextlib import contextmanager
+from .catalog import DOM_HELPERS
+from .tracing import span, record
+
+logger = logging.getLogger(__name__)
+
+# Runs every step inside the page. Each step waits for the first of its
+# candidate elements to meet its condition with a MutationObserver (plus a
+# 50 ms timer for layout-only changes), performs its action and reports how
+# long it took. Stops at the first failing step, and at the deadline of the
+# whole flow, so nothing is clicked once the caller has given up on it.
+_FLOW_SCRIPT = DOM_HELPERS + """
+var steps = arguments[0], errors = arguments[1], done = arguments[arguments.length - 1];
+var results = [], flowStart = performance.now(), failure = null;
+var flowDeadline = flowStart + arguments[2] * 1000;
+
+function setValue(el, value) {
+    // React tracks the value itself, go through the native setter so it sees the change
+    var proto = el instanceof HTMLSelectElement ? HTMLSelectElement.prototype
+        : el instanceof HTMLTextAreaElement ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+    Object.getOwnPropertyDescriptor(proto, 'value').set.call(el, value);
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+}
+
+function act(step, el) {
+    if (step.action === 'click') {
+        el.click();
+    } else if (step.action === 'type') {
+        el.focus();
+        setValue(el, (el.value || '') + step.value);
+    } else if (step.action === 'select') {
+        setValue(el, step.value);
+    }
+}
+
+function finish(ok) {
+    done({ok: ok, steps: results, elapsed: performance.now() - flowStart,
+          error: failure && failure.kind, detail: failure && failure.detail});
+}
+
+function run(index) {
+    if (index >= steps.length) return finish(true);
+
+    var step = steps[index], stepStart = performance.now();
+    var deadline = Math.min(stepStart + step.timeout * 1000, flowDeadline);
+    var observer = null, timer = null, settled = false;
+
+    function report(ok, error, candidate, skipped) {
+        results.push({index: index, name: step.name, ok: ok,
+                      skipped: skipped === undefined ? !ok && step.optional : skipped,
+                      candidate: candidate === undefined ? null : candidate,
+                      error: error || null, start: stepStart - flowStart,
+                      elapsed: performance.now() - stepStart});
+    }
+
+    function check() {
+        if (settled) return;
+        var found = performance.now() <= flowDeadline && locate(step.candidates, step.condition);
+
+        if (found) {
+            settled = true;
+            observer.disconnect();
+            clearInterval(timer);
+            try {
+                act(step, found.element);
+            } catch (e) {
+                report(false, String(e));
+                return step.optional ? setTimeout(function () { run(index + 1); }, 0) : finish(false);
+            }
+            report(true, null, found.index);
+            // Let the page handle the action before looking for the next element
+            return setTimeout(function () { run(index + 1); }, 0);
+        }
+
+        // An error MetaMask shows ends the flow, even at an optional step
+        failure = firstError(errors);
+        if (failure) {
+            settled = true;
+            observer.disconnect();
+            clearInterval(timer);
+            report(false, failure.kind);
+            return finish(false);
+        }
+
+        if (performance.now() > deadline) {
+            settled = true;
+            observer.disconnect();
+            clearInterval(timer);
+            // Only the step's own timeout skips an optional step, the flow deadline ends the flow
+            var skip = step.optional && deadline < flowDeadline;
+            report(false, 'timeout', undefined, skip);
+            return skip ? run(index + 1) : finish(false);
+        }
+    }
+
+    observer = new MutationObserver(check);
+    observer.observe(document.documentElement, {subtree: true, childList: true, attributes: true, characterData: true});
+    timer = setInterval(check, 50);
+    check();
+}
+
+run(0);
+"""
+
+
+# Time (seconds) a script may take past its own deadline to report back
+_SCRIPT_MARGIN = 1
+
+
+@contextmanager
+def _scriptTimeout(driver, timeout):
+    # The script timeout of the caller's driver is restored after the script
+    try:
+        previous = driver.timeouts.script
+    except Exception:
+        previous = None
+    driver.set_script_timeout(timeout)
+    try:
+        yield
+    finally:
+        if previous is not None:
+            driver.set_script_timeout(previous)
+
+
+def step(selector, action='click', value=None, condition=None, by='css', timeout=20, optional=False, name=None):
+    """Describe a flow step
+
+    :param selector: CSS selector, or XPath if by is 'xpath'. Can also be a list of candidates from SelectorCatalog.candidates
+    :type selector: String or List
+    :param action: 'click', 'type', 'select' or 'wait' (only wait for the condition), default is 'click'.
+    :type action: String
+    :param value: Text to type or option value to select, default is None.
+    :type value: String
+    :param condition: 'present', 'visible', 'invisible' or 'clickable', default is 'visible' for 'type' and 'clickable' otherwise.
+    :type condition: String
+    :param by: 'css' or 'xpath', default is 'css'.
+    :type by: String
+    :param timeout: Timeout of this step (seconds), default is 20.
+    :type timeout: Number
+    :param optional: Continue with the next step if this one times out, default is False.
+    :type optional: Boolean
+    :param name: Name used in the results, default is the selector.
+    :type name: String
+    :return: Step
+    :rtype: Dict
+    """
+    if condition is None:
+        condition = 'visible' if action == 'type' else 'clickable'
+    if isinstance(selector, str):
+        candidates = [{'by': by, 'selector': selector}]
+    else:
+        candidates = list(selector)
+    return {
+        'candidates': candidates,
+        'action': action,
+        'value': None if value is None else str(value),
+        'condition': condition,
+        'timeout': timeout,
+        'optional': optional,
+        'name': name or candidates[0]['selector'],
+    }
+
+
+def runFlow(driver, steps, catalog=None, errors=None, budget=None):
+    """Run a list of steps inside the current page with a single WebDriver round trip
+
+    :param driver: Selenium WebDriver
+    :type driver: WebDriver
+    :param steps: Steps built with step()
+    :type steps: List
+    :param catalog: Catalog the steps' candidates come from, the winning candidates are remembered in it, default is None.
+    :type catalog: SelectorCatalog
+    :param errors: Error kinds ending the flow as soon as MetaMask shows them, requires the catalog, default is None.
+    :type errors: List
+    :param budget: Timeouts of the session, the steps use their learned deadlines and end by the deadline of the running call, default is None.
+    :type budget: WaitBudget
+    :return: Flow result, {'ok': Boolean, 'steps': [{'index', 'name', 'ok', 'skipped', 'candidate', 'error', 'start', 'elapsed'}], 'elapsed': Number, 'error': error kind or None, 'detail': String}, times in milliseconds
+    :rtype: Dict
+    """
+    timeout = sum(s['timeout'] for s in steps)
+    if budget is not None:
+        steps = [dict(s, timeout=budget.timeout(s['name'], s['timeout'])) for s in steps]
+        # The whole flow ends by the deadline of the running call
+        timeout = budget.limit(sum(s['timeout'] for s in steps))
+    with span('flow', steps=len(steps)) as current:
+        flow_start = time.time()
+        # The script ends by itself at the flow deadline, the margin covers the round trip
+        with _scriptTimeout(driver, timeout + _SCRIPT_MARGIN):
+            result = driver.execute_async_script(
+                _FLOW_SCRIPT, steps, catalog.errorCandidates(errors) if catalog and errors else [], timeout)
+        current.set(ok=result['ok'], error=result.get('error'))
+
+        for s in result['steps']:
+            candidate = steps[s['index']]['candidates'][s['candidate']] if s['candidate'] is not None else None
+            if catalog and candidate and 'index' in candidate:
+                catalog.remember(s['name'], candidate['index'])
+            if s['ok']:
+                outcome = 'ok'
+                if budget is not None:
+                    budget.record(s['name'], s['elapsed'] / 1000)
+                logger.debug("Step %s done in %.0f ms", s['name'], s['elapsed'])
+            elif s['skipped']:
+                outcome = 'skipped'
+                logger.warning("Step %s skipped: %s", s['name'], s['error'])
+            else:
+                outcome = 'timeout' if s['error'] == 'timeout' else 'error'
+                logger.error("Step %s failed: %s", s['name'], s['error'])
+            # Each step was timed inside the page
+            record('step', s['elapsed'] / 1000, start=flow_start + s['start'] / 1000, outcome=outcome,
+                   error=s['error'], element=s['name'], action=steps[s['index']]['action'],
+                   selector=candidate['selector'] if candidate else None)
+    return result
+
+
+def setupMetamaskSteps(catalog, words, password):
+    """Steps of the onboarding flow, see MetaMaskSession.setupMetamask
+
+    :param catalog: Selector catalog of the MetaMask version
+    :type catalog: SelectorCatalog
+    :param words: Recovery phrase words
+    :type words: List
+    :param password: Wallet password
+    :type password: String
+    :return: Steps
+    :rtype: List
+    """
+    def catalogStep(name, action='click', value=None, condition=None, timeout=20, optional=False, **params):
+        return step(catalog.candidates(name, **params), action, value, condition,
+                    timeout=timeout, optional=optional, name=name)
+
+    steps = [
+        catalogStep('loading-overlay', 'wait', condition='invisible', timeout=40),
+        catalogStep('onboarding-terms'),
+        catalogStep('onboarding-import'),
+        catalogStep('metametrics-no-thanks'),
+        catalogStep('srp-dropdown', 'select', len(words)),
+    ]
+    for i, word in enumerate(words):
+        steps.append(catalogStep('srp-word', 'type', word, i=i))
+    steps += [
+        catalogStep('srp-confirm'),
+        catalogStep('password-new', 'type', password),
+        catalogStep('password-confirm', 'type', password),
+        catalogStep('password-terms'),
+        catalogStep('password-import'),
+        catalogStep('onboarding-done'),
+        catalogStep('pin-next'),
+        catalogStep('pin-done'),
+        catalogStep('popover-close', optional=True, timeout=5),
+        # This button is only available when the popup is closed
+        catalogStep('send-button', 'wait'),
+    ]
+    return steps
+
+
+def addNetworkSteps(catalog, network_name, rpc_url, chain_id, currency_symbol):
+    """Steps of the add network form, see MetaMaskSession.addNetwork
+
+    :return: Steps
+    :rtype: List
+    """
+    return [
+        step(catalog.candidates('network-form-input', n=1), 'type', network_name, name='network-form-input'),
+        step(catalog.candidates('network-form-input', n=2), 'type', rpc_url, name='network-form-input'),
+        step(catalog.candidates('network-form-input', n=3), 'type', chain_id, name='network-form-input'),
+        step(catalog.candidates('network-form-input', n=4), 'type', currency_symbol, name='network-form-input'),
+        step(catalog.candidates('network-form-save'), name='network-form-save'),
+        step(catalog.candidates('network-switch-to'), name='network-switch-to'),
+    ]
+
+
+def importPKSteps(catalog, priv_key):
+    """Steps of the import account flow, see MetaMaskSession.importPK
+
+    :return: Steps
+    :rtype: List
+    """
+    return [
+        step(catalog.candidates('account-menu'), name='account-menu'),
+        step(catalog.candidates('account-import'), name='account-import'),
+        step(catalog.candidates('private-key-input'), 'type', priv_key, name='private-key-input'),
+        step(catalog.candidates('import-account-confirm'), name='import-account-confirm'),
+        # This button is only available when the popup is closed
+        step(catalog.candidates('send-button'), 'wait', name='send-button'),
+    ]
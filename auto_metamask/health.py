@@ -0,0 +1,177 @@
+import time
+import logging
+import threading
+from collections import deque
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class HealthPolicy:
+    """When a HealthMonitor recycles its browser
+
+    :param max_operations: Recycle after this many operations, default is None.
+    :type max_operations: Number
+    :param max_memory: Recycle once the browser uses more memory (bytes, PSS where available, else RSS), default is None.
+    :type max_memory: Number
+    :param max_slowdown: Recycle once the recent operations are this many times slower than the first ones, default is 3.
+    :type max_slowdown: Number
+    :param window: Number of operations the latencies are averaged over, default is 20.
+    :type window: Number
+    :param probe_timeout: A browser not answering a script within this time (seconds) is recycled, default is 5.
+    :type probe_timeout: Number
+    :param sample_interval: Memory is measured and the browser probed at most this often (seconds), default is 30.
+    :type sample_interval: Number
+    """
+
+    def __init__(self, max_operations=None, max_memory=None, max_slowdown=3, window=20, probe_timeout=5, sample_interval=30):
+        self.max_operations = max_operations
+        self.max_memory = max_memory
+        self.max_slowdown = max_slowdown
+        self.window = window
+        self.probe_timeout = probe_timeout
+        self.sample_interval = sample_interval
+
+
+class HealthMonitor:
+    """Watch a session between operations and recycle its browser when it degrades or crashes
+
+    The browser is probed when it is due, after an operation failed or was much slower than
+    usual, and whenever chromedriver has exited. Recycling restarts the browser on the same wallet
+    state, see MetaMaskSession.restart. Dapp tabs opened in the old browser are lost.
+
+    :param session: Session to watch
+    :type session: MetaMaskSession
+    :param policy: Thresholds, default is HealthPolicy().
+    :type policy: HealthPolicy
+    """
+
+    def __init__(self, session, policy=None):
+        self.session = session
+        self.policy = policy or HealthPolicy()
+        self.recycles = 0
+        self.last_reason = None
+        self._reset()
+        session.health = self
+
+    def _reset(self):
+        self.operations = 0
+        self._baseline = []
+        self._recent = deque(maxlen=self.policy.window)
+        self._suspect = False
+        self._sampled_at = time.monotonic()
+        self.memory = None
+
+    def probe(self):
+        """Time a trivial script in the extension page
+
+        :return: Round trip (seconds), None if the browser didn't answer in time
+        :rtype: Number
+        """
+        result = {}
+
+        def run():
+            start = time.perf_counter()
+            try:
+                self.session.page.execute_script('return 1;')
+                result['latency'] = time.perf_counter() - start
+            except Exception as e:
+                result['error'] = e
+
+        # A hung renderer blocks the call, it is left behind and ends with the browser
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(self.policy.probe_timeout)
+        return result.get('latency')
+
+    def sample(self):
+        """Current health figures
+
+        :return: {'operations', 'latency', 'baseline', 'memory', 'alive'}
+        :rtype: Dict
+        """
+        process = getattr(self.session.driver.service, 'process', None)
+        usage = self.session.memoryUsage()
+        self.memory = usage and (usage['pss'] or usage['rss'])
+        self._sampled_at = time.monotonic()
+        return {
+            'operations': self.operations,
+            'latency': sum(self._recent) / len(self._recent) if self._recent else None,
+            'baseline': self._baselineLatency(),
+            'memory': self.memory,
+            'alive': process is None or process.poll() is None,
+        }
+
+    def _baselineLatency(self):
+        if len(self._baseline) < self.policy.window:
+            return None
+        return sorted(self._baseline)[len(self._baseline) // 2]
+
+    def check(self):
+        """Reason to recycle the browser now
+
+        :return: Reason, None if the browser is healthy
+        :rtype: String
+        """
+        policy = self.policy
+        process = getattr(self.session.driver.service, 'process', None)
+        if process is not None and process.poll() is not None:
+            return 'chromedriver exited'
+        if policy.max_operations and self.operations >= policy.max_operations:
+            return 'operations'
+
+        if self._suspect or time.monotonic() - self._sampled_at >= policy.sample_interval:
+            self._suspect = False
+            self._sampled_at = time.monotonic()
+            if self.probe() is None:
+                return 'unresponsive'
+            if policy.max_memory:
+                usage = self.session.memoryUsage()
+                self.memory = usage and (usage['pss'] or usage['rss'])
+                if self.memory and self.memory > policy.max_memory:
+                    return 'memory'
+
+        baseline = self._baselineLatency()
+        if baseline and policy.max_slowdown and len(self._recent) == policy.window:
+            if sum(self._recent) / len(self._recent) > baseline * policy.max_slowdown:
+                return 'latency'
+        return None
+
+    def beforeOperation(self):
+        """Called by the session before each operation, recycles the browser when needed
+        """
+        reason = self.check()
+        if reason:
+            self.recycle(reason)
+
+    def afterOperation(self, duration, failed=False):
+        """Called by the session after each operation
+
+        :param duration: Duration of the operation (seconds)
+        :type duration: Number
+        :param failed: The operation raised, default is False.
+        :type failed: Boolean
+        """
+        self.operations += 1
+        if len(self._baseline) < self.policy.window:
+            self._baseline.append(duration)
+        else:
+            self._recent.append(duration)
+        baseline = self._baselineLatency()
+        if failed or (baseline and self.policy.max_slowdown and duration > baseline * self.policy.max_slowdown):
+            # Probe before the next operation
+            self._suspect = True
+
+    def recycle(self, reason='manual'):
+        """Restart the browser on the same wallet state
+
+        :param reason: Why, recorded in the log and the span, default is 'manual'.
+        :type reason: String
+        """
+        logger.warning("Recycling browser: " + reason)
+        with span('recycle', reason=reason, operations=self.operations):
+            # A hung browser doesn't answer chromedriver either
+            self.session.restart(force=reason in ('unresponsive', 'chromedriver exited'))
+        self.recycles += 1
+        self.last_reason = reason
+        self._reset()
@@ -0,0 +1,105 @@
+import binascii
+
+# Keccak-f[1600] round constants and rotation offsets, indexed [x][y]
+_ROUND_CONSTANTS = (
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+)
+_ROTATIONS = (
+    (0, 36, 3, 41, 18),
+    (1, 44, 10, 45, 2),
+    (62, 6, 43, 15, 61),
+    (28, 55, 25, 21, 56),
+    (27, 20, 39, 8, 14),
+)
+_MASK = (1 << 64) - 1
+
+# secp256k1
+_P = 2 ** 256 - 2 ** 32 - 977
+_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+_G = (0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+      0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+
+
+def _rotate(value, shift):
+    return ((value << shift) | (value >> (64 - shift))) & _MASK if shift else value
+
+
+def _permute(lanes):
+    for constant in _ROUND_CONSTANTS:
+        c = [lanes[x][0] ^ lanes[x][1] ^ lanes[x][2] ^ lanes[x][3] ^ lanes[x][4] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ _rotate(c[(x + 1) % 5], 1) for x in range(5)]
+        b = [[0] * 5 for _ in range(5)]
+        for x in range(5):
+            for y in range(5):
+                b[y][(2 * x + 3 * y) % 5] = _rotate(lanes[x][y] ^ d[x], _ROTATIONS[x][y])
+        for x in range(5):
+            for y in range(5):
+                lanes[x][y] = b[x][y] ^ (~b[(x + 1) % 5][y] & b[(x + 2) % 5][y])
+        lanes[0][0] ^= constant
+
+
+def keccak256(data):
+    """Keccak-256 digest, as used by Ethereum (not the padding of SHA3-256)
+
+    :param data: Data
+    :type data: Bytes
+    :return: Digest (32 bytes)
+    :rtype: Bytes
+    """
+    rate = 136
+    padded = bytearray(data) + b'\x01' + b'\x00' * ((rate - len(data) - 1) % rate)
+    padded[-1] |= 0x80
+    lanes = [[0] * 5 for _ in range(5)]
+    for offset in range(0, len(padded), rate):
+        for i in range(rate // 8):
+            lanes[i % 5][i // 5] ^= int.from_bytes(padded[offset + i * 8:offset + i * 8 + 8], 'little')
+        _permute(lanes)
+    return b''.join(lanes[i % 5][i // 5].to_bytes(8, 'little') for i in range(4))
+
+
+def _add(p, q):
+    if p is None:
+        return q
+    if q is None:
+        return p
+    if p[0] == q[0]:
+        if (p[1] + q[1]) % _P == 0:
+            return None
+        slope = 3 * p[0] * p[0] * pow(2 * p[1], -1, _P) % _P
+    else:
+        slope = (q[1] - p[1]) * pow(q[0] - p[0], -1, _P) % _P
+    x = (slope * slope - p[0] - q[0]) % _P
+    return x, (slope * (p[0] - x) - p[1]) % _P
+
+
+def privateKeyAddress(private_key):
+    """Address of the account of a private key
+
+    :param private_key: Private key, hex with or without the 0x prefix
+    :type private_key: String
+    :return: Address, lowercase
+    :rtype: String
+    """
+    key = private_key.strip()
+    if key[:2].lower() == '0x':
+        key = key[2:]
+    try:
+        secret = int(binascii.unhexlify(key).hex(), 16)
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid private key")
+    if not 0 < secret < _N or len(key) != 64:
+        raise ValueError("Invalid private key")
+
+    point, addend = None, _G
+    while secret:
+        if secret & 1:
+            point = _add(point, addend)
+        addend = _add(addend, addend)
+        secret >>= 1
+    public_key = point[0].to_bytes(32, 'big') + point[1].to_bytes(32, 'big')
+    return '0x' + keccak256(public_key)[-20:].hex()
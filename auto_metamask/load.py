@@ -0,0 +1,353 @@
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait
+from .session import MetaMaskSession, MetaMaskPool
+from .results import OperationResult
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Step kinds of a scenario, see Scenario
+STEP_KINDS = ('open', 'click', 'wait', 'wallet', 'think')
+
+
+class Scenario:
+    """Dapp and wallet interactions one synthetic user repeats, e.g. loaded from a file with loadScenario
+
+    Every step is a dict with one of the keys 'open' (URL), 'click' (CSS selector on the dapp),
+    'wait' (CSS selector of a dapp element to wait for), 'wallet' (MetaMaskSession method, with
+    optional 'args' and 'kwargs') or 'think' (seconds, or [min, max] for a random pause). A step
+    may have a 'name' used in the report and 'once': true to run only in the first flow of a
+    user, e.g. to connect the wallet.
+
+    {"dapp": "https://metamask.github.io/test-dapp/", "steps": [
+        {"click": "#connectButton", "once": true}, {"wallet": "connect", "once": true},
+        {"click": "#personalSign"}, {"wallet": "confirm"},
+        {"click": "#sendButton"}, {"wallet": "confirm"}, {"wallet": "waitPending", "args": [20]}]}
+
+    :param steps: Steps of a flow
+    :type steps: List
+    :param dapp: Dapp URL opened in a new tab of every wallet browser, default is None.
+    :type dapp: String
+    :param wallet: MetaMaskPool arguments (metamask_path, recovery_phrase, password, networks and session arguments), default is None.
+    :type wallet: Dict
+    :param name: Scenario name, default is 'scenario'.
+    :type name: String
+    """
+
+    def __init__(self, steps, dapp=None, wallet=None, name='scenario'):
+        self.dapp = dapp
+        self.wallet = dict(wallet or {})
+        self.name = name
+        self.steps = []
+        for index, step in enumerate(steps):
+            kinds = [kind for kind in STEP_KINDS if kind in step]
+            if len(kinds) != 1:
+                raise ValueError("Step " + str(index + 1) + " needs exactly one of " + ', '.join(STEP_KINDS))
+            kind = kinds[0]
+            if kind == 'wallet' and (step['wallet'].startswith('_') or not callable(getattr(MetaMaskSession, step['wallet'], None))):
+                raise ValueError("Step " + str(index + 1) + ": unknown wallet method " + str(step['wallet']))
+            label = step.get('name') or '{:02d} {} {}'.format(index + 1, kind, step[kind])
+            self.steps.append(dict(step, kind=kind, name=label))
+
+    def __repr__(self):
+        return '<Scenario {} steps={}>'.format(self.name, len(self.steps))
+
+
+def loadScenario(path):
+    """Load a scenario from a JSON file, or a YAML file when PyYAML is installed
+
+    :param path: Scenario file path
+    :type path: String
+    :return: Scenario
+    :rtype: Scenario
+    """
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(('.yml', '.yaml')):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("YAML scenarios require PyYAML, pip install pyyaml") from None
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    return Scenario(data['steps'], data.get('dapp'), data.get('wallet'), data.get('name', 'scenario'))
+
+
+def _pause(value):
+    if isinstance(value, (list, tuple)):
+        return random.uniform(*value)
+    return value or 0
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class LoadReport:
+    """Step latencies and flow counts of a load run, safe to add to from every user thread
+    """
+
+    def __init__(self):
+        self.steps = {}
+        self.kinds = {}
+        self.errors = {}
+        self.flows = 0
+        self.failed = 0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def addStep(self, step, duration, error=None):
+        with self._lock:
+            self.steps.setdefault(step['name'], {'durations': [], 'errors': 0})
+            entry = self.steps[step['name']]
+            entry['durations'].append(duration)
+            if step['kind'] != 'think':
+                self.kinds[step['kind']] = self.kinds.get(step['kind'], 0) + duration
+            if error:
+                entry['errors'] += 1
+                key = step['name'] + ': ' + error
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def addFlow(self, ok):
+        with self._lock:
+            self.flows += 1
+            if not ok:
+                self.failed += 1
+
+    def summary(self):
+        """Throughput and per-step latency percentiles
+
+        :return: {'flows', 'failed', 'elapsed', 'flows_per_minute', 'steps': {name: {'count', 'errors', 'p50', 'p95', 'p99', 'max'}}, 'time_share': {kind: ratio}, 'errors': {message: count}}
+        :rtype: Dict
+        """
+        with self._lock:
+            elapsed = (self.finished or time.monotonic()) - self.started if self.started else 0
+            steps = {}
+            for name, entry in self.steps.items():
+                durations = entry['durations']
+                steps[name] = {
+                    'count': len(durations),
+                    'errors': entry['errors'],
+                    'p50': _percentile(durations, 50),
+                    'p95': _percentile(durations, 95),
+                    'p99': _percentile(durations, 99),
+                    'max': max(durations),
+                }
+            busy = sum(self.kinds.values())
+            return {
+                'flows': self.flows,
+                'failed': self.failed,
+                'elapsed': elapsed,
+                'flows_per_minute': (self.flows - self.failed) / elapsed * 60 if elapsed else 0,
+                'steps': steps,
+                # Where the users spend their time, the wallet automation or the dapp
+                'time_share': {kind: total / busy for kind, total in self.kinds.items()} if busy else {},
+                'errors': dict(self.errors),
+            }
+
+    def format(self):
+        """Summary as a text table
+        """
+        summary = self.summary()
+        lines = ['{} flows, {} failed in {:.0f} s, {:.1f} flows/min'.format(
+            summary['flows'], summary['failed'], summary['elapsed'], summary['flows_per_minute'])]
+        lines.append('{:<40}{:>7}{:>8}{:>10}{:>10}{:>10}{:>10}'.format('step', 'count', 'errors', 'p50', 'p95', 'p99', 'max'))
+        for name, s in summary['steps'].items():
+            lines.append('{:<40}{:>7}{:>8}{:>9.3f}s{:>9.3f}s{:>9.3f}s{:>9.3f}s'.format(
+                name[:39], s['count'], s['errors'], s['p50'], s['p95'], s['p99'], s['max']))
+        if summary['time_share']:
+            lines.append('time share: ' + ', '.join('{} {:.0%}'.format(kind, share) for kind, share in sorted(summary['time_share'].items())))
+        for message, count in sorted(summary['errors'].items(), key=lambda e: -e[1])[:10]:
+            lines.append('{:>5}x {}'.format(count, message))
+        return '\n'.join(lines)
+
+
+class LoadRunner:
+    """Run a scenario as concurrent synthetic users, one wallet browser each
+
+    :param scenario: Scenario
+    :type scenario: Scenario
+    :param users: Number of concurrent users (and browsers)
+    :type users: Number
+    :param duration: Time users start new flows for (seconds)
+    :type duration: Number
+    :param ramp_up: Time over which the users are started (seconds), default is 0.
+    :type ramp_up: Number
+    :param think_time: Pause between two flows of a user (seconds), or (min, max) for a random pause, default is 0.
+    :type think_time: Number
+    :param step_timeout: Timeout of the dapp click and wait steps (seconds), default is 20.
+    :type step_timeout: Number
+    :param pool: Pool to take the browsers from, one is created from scenario.wallet if not provided, default is None.
+    :type pool: MetaMaskPool
+    """
+
+    def __init__(self, scenario, users, duration, ramp_up=0, think_time=0, step_timeout=20, pool=None):
+        self.scenario = scenario
+        self.users = users
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.think_time = think_time
+        self.step_timeout = step_timeout
+        self.pool = pool
+        self.report = LoadReport()
+        self._stop = threading.Event()
+
+    def run(self):
+        """Run the users until the duration is over and their last flow ended
+
+        The browsers are launched (or taken from the pool) before the clock starts.
+
+        :return: Report
+        :rtype: LoadReport
+        """
+        pool, own_pool = self.pool, False
+        if pool is None:
+            wallet = dict(self.scenario.wallet)
+            pool = MetaMaskPool(self.users, wallet.pop('metamask_path'), wallet.pop('recovery_phrase'),
+                                wallet.pop('password'), wallet.pop('networks', None), **wallet)
+            own_pool = True
+
+        threads = []
+        try:
+            sessions = []
+            for _ in range(self.users):
+                try:
+                    sessions.append(pool.checkout())
+                except RuntimeError:
+                    logger.exception("Launch browser failed, running with fewer users")
+            if len(sessions) < self.users:
+                logger.warning("Running {} of {} users".format(len(sessions), self.users))
+
+            self.report.started = time.monotonic()
+            deadline = self.report.started + self.duration
+            for index, session in enumerate(sessions):
+                thread = threading.Thread(target=self._user, args=(pool, session, index, deadline), daemon=True)
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            logger.warning("Load run interrupted")
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            self.report.finished = time.monotonic()
+            if own_pool:
+                pool.close()
+        return self.report
+
+    def _user(self, pool, session, index, deadline):
+        broken = False
+        try:
+            # Users start evenly spread over the ramp-up
+            if self.users > 1 and self._stop.wait(self.ramp_up * index / (self.users - 1)):
+                return
+            driver = None
+            while time.monotonic() < deadline and not self._stop.is_set():
+                if session.driver is not driver:
+                    # First flow, or the health monitor restarted the browser: open the dapp
+                    # in the new one and run the steps done once again
+                    driver = session.driver
+                    if self.scenario.dapp:
+                        driver.switch_to.new_window('tab')
+                        driver.get(self.scenario.dapp)
+                    dapp_handle = driver.current_window_handle
+                    first = True
+                with span('flow', user=index):
+                    ok = self._flow(session, first)
+                self.report.addFlow(ok)
+                first = False
+                if not ok and self.scenario.dapp and session.driver is driver:
+                    # Start the next flow from a fresh dapp page
+                    driver.switch_to.window(dapp_handle)
+                    driver.get(self.scenario.dapp)
+                if self._stop.wait(_pause(self.think_time)):
+                    break
+        except Exception:
+            logger.exception("User " + str(index) + " stopped")
+            broken = True
+        finally:
+            pool.checkin(session, discard=broken)
+
+    def _flow(self, session, first):
+        for step in self.scenario.steps:
+            if step.get('once') and not first:
+                continue
+            start = time.perf_counter()
+            error = None
+            try:
+                result = self._step(session, step)
+                if isinstance(result, OperationResult) and not result:
+                    error = result.kind
+                elif result is False:
+                    error = 'failed'
+            except Exception as e:
+                error = getattr(e, 'kind', None) or type(e).__name__
+            self.report.addStep(step, time.perf_counter() - start, error)
+            if error:
+                return False
+        return True
+
+    def _step(self, session, step):
+        kind, driver = step['kind'], session.driver
+        if kind == 'open':
+            driver.get(step['open'])
+        elif kind == 'click':
+            WebDriverWait(driver, self.step_timeout, 0.05).until(
+                EC.element_to_be_clickable((By.CSS_SELECTOR, step['click']))).click()
+        elif kind == 'wait':
+            WebDriverWait(driver, self.step_timeout, 0.05).until(
+                EC.visibility_of_element_located((By.CSS_SELECTOR, step['wait'])))
+        elif kind == 'wallet':
+            return getattr(session, step['wallet'])(*step.get('args', ()), **step.get('kwargs', {}))
+        else:
+            self._stop.wait(_pause(step['think']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a dapp scenario as concurrent synthetic wallet users')
+    parser.add_argument('scenario', help='scenario file (.json, or .yaml with PyYAML)')
+    parser.add_argument('--users', type=int, default=1, help='concurrent users, one browser each')
+    parser.add_argument('--duration', type=float, default=60, help='time users start new flows for (seconds)')
+    parser.add_argument('--ramp-up', type=float, default=0, help='time over which the users are started (seconds)')
+    parser.add_argument('--think-time', default='0', help="pause between flows (seconds), or 'min-max'")
+    parser.add_argument('--step-timeout', type=float, default=20, help='timeout of the dapp steps (seconds)')
+    parser.add_argument('--metamask-path', help='extension, overrides the scenario wallet')
+    parser.add_argument('--recovery-phrase', help='overrides the scenario wallet')
+    parser.add_argument('--password', help='overrides the scenario wallet')
+    parser.add_argument('--profile', help="launch profile, e.g. 'lean-headless'")
+    parser.add_argument('--json', help='write the summary to this file')
+    args = parser.parse_args(argv)
+
+    scenario = loadScenario(args.scenario)
+    for name in ('metamask_path', 'recovery_phrase', 'password', 'profile'):
+        if getattr(args, name):
+            scenario.wallet[name] = getattr(args, name)
+    missing = [name for name in ('metamask_path', 'recovery_phrase', 'password') if not scenario.wallet.get(name)]
+    if missing:
+        parser.error('missing wallet settings: ' + ', '.join(missing))
+    think_time = [float(v) for v in args.think_time.split('-')]
+
+    runner = LoadRunner(scenario, args.users, args.duration, args.ramp_up,
+                        think_time if len(think_time) == 2 else think_time[0], args.step_timeout)
+    report = runner.run()
+    print(report.format())
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report.summary(), f, indent=2)
+    return 1 if report.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+from fnmatch import fnmatch
+
+# Kinds of the requests drainPending hands to a policy
+REQUEST_KINDS = ('connect', 'signature', 'transaction', 'allowance')
+
+
+class Rule:
+    """One rule of an ApprovalPolicy, matching requests by kind, origin and value
+
+    :param action: 'approve' or 'reject'
+    :type action: String
+    :param kind: Request kind or list of kinds ('connect', 'signature', 'transaction', 'allowance'), any kind if not provided, default is None.
+    :type kind: String
+    :param origin: Origin pattern, e.g. 'https://*.example.com', any origin if not provided, default is None.
+    :type origin: String
+    :param max_value: Highest transaction value (wei) the rule matches, default is None.
+    :type max_value: Number
+    :param cap: Spending cap set on approved token allowances, MetaMask's default if not provided, default is None.
+    :type cap: Number
+    """
+
+    def __init__(self, action, kind=None, origin=None, max_value=None, cap=None):
+        if action not in ('approve', 'reject'):
+            raise ValueError("Invalid action " + str(action))
+        self.action = action
+        self.kinds = [kind] if isinstance(kind, str) else kind
+        self.origin = origin
+        self.max_value = max_value
+        self.cap = cap
+
+    def __repr__(self):
+        return '<Rule {} kind={} origin={} max_value={} cap={}>'.format(
+            self.action, self.kinds, self.origin, self.max_value, self.cap)
+
+    def matches(self, request):
+        if self.kinds and request['kind'] not in self.kinds:
+            return False
+        if self.origin and not fnmatch(request.get('origin') or '', self.origin):
+            return False
+        if self.max_value is not None:
+            # A value that couldn't be read doesn't pass a limit
+            if request.get('value') is None or request['value'] > self.max_value:
+                return False
+        return True
+
+
+class ApprovalPolicy:
+    """Decides what drainPending does with each request, the first matching rule wins
+
+    e.g. ApprovalPolicy(Rule('approve', 'connect', origin='http://localhost:*'),
+    Rule('approve', 'transaction', max_value=10 ** 17), Rule('approve', 'allowance', cap=100))
+
+    :param rules: Rules, in order
+    :type rules: Rule
+    :param default: Action for requests no rule matches, default is 'reject'.
+    :type default: String
+    """
+
+    def __init__(self, *rules, default='reject'):
+        self.rules = list(rules)
+        self.default = Rule(default)
+
+    @classmethod
+    def approveAll(cls):
+        """Policy approving every request, with MetaMask's default spending caps
+        """
+        return cls(default='approve')
+
+    def decide(self, request):
+        """Rule applying to a request
+
+        :param request: Request, {'id', 'kind', 'origin', 'value'}
+        :type request: Dict
+        :return: Matching rule, or the default one
+        :rtype: Rule
+        """
+        for rule in self.rules:
+            if rule.matches(request):
+                return rule
+        return self.default
@@ -0,0 +1,212 @@
+import os
+import signal
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LaunchProfile:
+    """Named set of Chrome switches and preferences a session is launched with
+
+    :param name: Profile name, e.g. 'lean-headless'
+    :type name: String
+    :param arguments: Chrome command line switches
+    :type arguments: List
+    :param prefs: Chrome preferences, default is None.
+    :type prefs: Dict
+    :param stealth: Apply the selenium-stealth patches after launch, default is False.
+    :type stealth: Boolean
+    """
+
+    def __init__(self, name, arguments, prefs=None, stealth=False):
+        self.name = name
+        self.arguments = list(arguments)
+        self.prefs = dict(prefs or {})
+        self.stealth = stealth
+
+    def __repr__(self):
+        return '<LaunchProfile {}>'.format(self.name)
+
+    def apply(self, options):
+        """Add the switches and preferences to Chrome options
+
+        :param options: Chrome options
+        :type options: selenium.webdriver.chrome.options.Options
+        """
+        for argument in self.arguments:
+            options.add_argument(argument)
+        if self.prefs:
+            options.add_experimental_option('prefs', self.prefs)
+
+
+_profiles = {}
+_profiles_lock = threading.Lock()
+
+
+def registerProfile(profile):
+    """Make a launch profile available by name, replacing any profile of the same name
+
+    :param profile: Launch profile
+    :type profile: LaunchProfile
+    """
+    with _profiles_lock:
+        _profiles[profile.name] = profile
+
+
+def getProfile(name):
+    """Get a launch profile by name
+
+    :param name: Profile name, 'stealth', 'headed' or 'lean-headless' unless more were registered
+    :type name: String
+    :return: Launch profile
+    :rtype: LaunchProfile
+    """
+    with _profiles_lock:
+        if name not in _profiles:
+            raise ValueError("Unknown launch profile " + str(name) + ", choose from " + ', '.join(sorted(_profiles)))
+        return _profiles[name]
+
+
+# A full browser at desktop size, looking like a regular user's
+registerProfile(LaunchProfile('stealth', [
+    # '--start-maximized',
+    '--window-size=1440,900',
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+], stealth=True))
+
+registerProfile(LaunchProfile('headed', [
+    '--window-size=1440,900',
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+]))
+
+# As little memory as the extension can run with, for many wallets on one box
+registerProfile(LaunchProfile('lean-headless', [
+    # The new headless mode runs extensions
+    '--headless=new',
+    '--window-size=1280,800',
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-software-rasterizer',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-breakpad',
+    '--disable-features=Translate,OptimizationHints,MediaRouter,InterestFeedContentSuggestions',
+    '--blink-settings=imagesEnabled=false',
+    '--renderer-process-limit=2',
+    '--no-first-run',
+    '--mute-audio',
+    '--js-flags=--max-old-space-size=512',
+], prefs={'profile.managed_default_content_settings.images': 2}))
+
+
+def _children():
+    # Parent of every process, from /proc
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/' + entry + '/stat', 'rb') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces, the fields after it don't
+        ppid = int(stat[stat.rindex(b')') + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def _procMemory(pid):
+    rss = pss = None
+    try:
+        with open('/proc/{}/status'.format(pid)) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+                    break
+        # Proportional share of the pages the Chrome processes share with each other
+        with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    pss = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    return rss, pss
+
+
+def processTree(pid):
+    """Ids of a process and all its descendants, on Linux
+
+    :param pid: Root process id
+    :type pid: Number
+    :return: Process ids, the root first
+    :rtype: List
+    """
+    children = _children()
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        stack.extend(children.get(current, []))
+    return pids
+
+
+def killProcessTree(pids):
+    """Kill processes left running, e.g. a hung Chrome whose chromedriver was stopped
+
+    :param pids: Process ids, see processTree
+    :type pids: List
+    """
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (OSError, AttributeError):
+            pass
+
+
+def processTreeMemory(pid):
+    """Memory of a process and all its descendants
+
+    Reads /proc on Linux, uses psutil elsewhere when it is installed.
+
+    :param pid: Root process id, e.g. the chromedriver of a session
+    :type pid: Number
+    :return: {'rss': bytes, 'pss': bytes or None, 'processes': Number}, None if it can't be measured
+    :rtype: Dict
+    """
+    if os.path.isdir('/proc/self'):
+        pids = processTree(pid)
+        rss_total, pss_total, counted = 0, 0, 0
+        for current in pids:
+            rss, pss = _procMemory(current)
+            if rss is None:
+                continue
+            counted += 1
+            rss_total += rss
+            pss_total = None if pss is None or pss_total is None else pss_total + pss
+        return {'rss': rss_total, 'pss': pss_total, 'processes': counted}
+
+    try:
+        import psutil
+    except ImportError:
+        logger.warning("Memory usage needs psutil on this platform")
+        return None
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return None
+    rss_total = 0
+    for process in processes:
+        try:
+            rss_total += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return {'rss': rss_total, 'pss': None, 'processes': len(processes)}
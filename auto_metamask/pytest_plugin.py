@@ -0,0 +1,217 @@
+import os
+import logging
+import pytest
+from .tracing import addSink, removeSink, MemorySink
+
+# The plugin is loaded by every pytest run, the session machinery is only imported by the fixtures
+
+logger = logging.getLogger(__name__)
+
+# name: (help, ini type, default)
+_OPTIONS = {
+    'metamask_extension': ("Metamask extension, a .zip path, an unpacked directory or a download URL", 'string', None),
+    'metamask_extension_sha256': ("Expected SHA-256 of the downloaded extension zip", 'string', None),
+    'metamask_recovery_phrase': ("Recovery phrase of the test wallet", 'string', None),
+    'metamask_password': ("Password of the test wallet", 'string', None),
+    'metamask_networks': ("Custom networks, one 'name, rpc_url, chain_id, currency_symbol' per line", 'linelist', []),
+    'metamask_private_keys': ("Private keys imported into the wallet, one per line", 'linelist', []),
+    'metamask_chrome_path': ("Chrome browser path", 'string', None),
+    'metamask_chromedriver_path': ("Chromedriver path, resolved from the browser if not provided", 'string', None),
+    'metamask_profile': ("Launch profile, e.g. 'lean-headless'", 'string', 'stealth'),
+    'metamask_backend': ("'webdriver' or 'cdp'", 'string', 'webdriver'),
+    'metamask_log_dir': ("Directory of the log files, one per xdist worker", 'string', '.'),
+    'metamask_latency_profile': ("Latency profile the wait timeouts are learned from, a JSON path shared by the workers", 'string', None),
+}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('auto-metamask')
+    for name, (help, type, default) in _OPTIONS.items():
+        parser.addini(name, help, type=type, default=default)
+        if type == 'linelist':
+            group.addoption('--' + name.replace('_', '-'), dest=name, action='append', help=help + ", repeatable")
+        else:
+            group.addoption('--' + name.replace('_', '-'), dest=name, help=help)
+    group.addoption('--metamask-durations', dest='metamask_durations', type=int, default=10,
+                    help="Show the N tests spending the most time in MetaMask (0 for all), default is 10")
+
+
+def workerId():
+    """Id of the pytest-xdist worker running this process
+
+    :return: e.g. 'gw0', 'master' without xdist
+    :rtype: String
+    """
+    return os.environ.get('PYTEST_XDIST_WORKER', 'master')
+
+
+def _option(config, name):
+    # Command line first, then the ini file
+    value = config.getoption(name)
+    if value is None:
+        value = config.getini(name)
+    return value
+
+
+def _useWorkerLog(config):
+    # Workers log to their own file instead of all appending to the same one
+    worker = workerId()
+    log_dir = os.path.join(str(config.rootpath), _option(config, 'metamask_log_dir'))
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, 'auto-metamask.log' if worker == 'master' else 'auto-metamask-' + worker + '.log')
+
+    from . import core
+    handler = logging.FileHandler(log_file, delay=True)
+    handler.setFormatter(logging.Formatter(core.log_format, core.date_format))
+    if core.log_handler in core.logger.handlers:
+        core.logger.removeHandler(core.log_handler)
+        core.log_handler.close()
+    core.logger.addHandler(handler)
+    core.log_handler = handler
+
+
+def _networks(lines):
+    networks = []
+    for line in lines:
+        if line.strip():
+            fields = [field.strip() for field in line.split(',')]
+            if len(fields) != 4:
+                raise pytest.UsageError("Invalid metamask network " + repr(line) + ", expected 'name, rpc_url, chain_id, currency_symbol'")
+            networks.append(tuple(fields))
+    return networks
+
+
+@pytest.fixture(scope='session')
+def metamask_config(pytestconfig):
+    """Plugin options, from the command line or the ini file
+    """
+    config = {name: _option(pytestconfig, name) for name in _OPTIONS}
+    config['metamask_networks'] = _networks(config['metamask_networks'])
+    config['metamask_private_keys'] = [key.strip() for key in config['metamask_private_keys'] if key.strip()]
+    for name in ('metamask_extension', 'metamask_recovery_phrase', 'metamask_password'):
+        if not config[name]:
+            raise pytest.UsageError(name + " is not set, use --" + name.replace('_', '-') + " or the ini file")
+    return config
+
+
+@pytest.fixture(scope='session')
+def metamask_extension(metamask_config):
+    """Unpacked extension directory, downloaded and extracted once for all workers
+    """
+    from .extension import downloadMetamask, extractMetamask
+    path = metamask_config['metamask_extension']
+    if '://' in path:
+        path = downloadMetamask(path, metamask_config['metamask_extension_sha256'])
+    if not os.path.isdir(path):
+        path = extractMetamask(path)
+    return path
+
+
+@pytest.fixture(scope='session')
+def metamask_session(pytestconfig, metamask_config, metamask_extension, tmp_path_factory):
+    """Onboarded session of this worker
+
+    The first worker onboards the wallet and saves the profile snapshot while the others wait
+    for it, then every worker unlocks its own clone in a directory of its own. The session is
+    also the current session of the module level functions.
+    """
+    from . import core
+    from .cache import fileLock
+    from .resolver import resolveChromedriver
+    from .session import MetaMaskSession
+    from .snapshot import snapshot_path, snapshotKey, findSnapshot, restoreSnapshot
+    from .deadlines import LatencyProfile
+
+    _useWorkerLog(pytestconfig)
+    chromedriver_path = metamask_config['metamask_chromedriver_path'] or resolveChromedriver(
+        metamask_config['metamask_chrome_path'])
+    kwargs = {
+        'chrome_path': metamask_config['metamask_chrome_path'],
+        'chromedriver_path': chromedriver_path,
+        'profile': metamask_config['metamask_profile'],
+        'backend': metamask_config['metamask_backend'],
+    }
+    if metamask_config['metamask_latency_profile']:
+        kwargs['latency_profile'] = LatencyProfile(metamask_config['metamask_latency_profile'])
+    recovery_phrase = metamask_config['metamask_recovery_phrase']
+    password = metamask_config['metamask_password']
+    networks = metamask_config['metamask_networks']
+
+    key = snapshotKey(metamask_extension, recovery_phrase, networks, password)
+    session = None
+    if not findSnapshot(key):
+        with fileLock(os.path.join(snapshot_path, 'locks', key + '.lock')):
+            if not findSnapshot(key):
+                session = MetaMaskSession.launch(metamask_extension, recovery_phrase, password, networks, **kwargs)
+    if session is None:
+        # Under the worker's base temp directory, removed with the session
+        user_data_dir = restoreSnapshot(key, str(tmp_path_factory.mktemp('metamask-profile')))
+        session = MetaMaskSession(metamask_extension, user_data_dir=user_data_dir, **kwargs)
+        session.temporary_profile = True
+        session._unlockOrQuit(password)
+
+    try:
+        for private_key in metamask_config['metamask_private_keys']:
+            session.importPK(private_key)
+        core._useSession(session)
+        yield session
+    finally:
+        session.quit()
+
+
+@pytest.fixture
+def metamask(metamask_session):
+    """The session of this worker, on its metamask tab
+    """
+    try:
+        metamask_session.driver.switch_to.window(metamask_session.metamask_handle)
+    except Exception:
+        logger.warning("Switch to the metamask tab failed")
+    return metamask_session
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    if 'metamask_session' not in getattr(item, 'fixturenames', ()):
+        yield
+        return
+    # Time the test spent in MetaMask operations, from the spans recorded while it ran
+    sink = addSink(MemorySink())
+    try:
+        yield
+    finally:
+        removeSink(sink)
+        spans = [data for data in sink.spans if data['parent_id'] is None]
+        item._metamask_timing = (sum(data['duration'] for data in spans), len(spans))
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    if call.when != 'call' or not hasattr(item, '_metamask_timing'):
+        return
+    total, count = item._metamask_timing
+    # Sent to the xdist controller with the report
+    report.user_properties.append(('metamask_time', total))
+    report.user_properties.append(('metamask_operations', count))
+
+
+def pytest_terminal_summary(terminalreporter):
+    limit = terminalreporter.config.getoption('metamask_durations')
+    rows = []
+    for reports in terminalreporter.stats.values():
+        for report in reports:
+            if getattr(report, 'when', None) != 'call':
+                continue
+            properties = dict(getattr(report, 'user_properties', ()))
+            if 'metamask_time' in properties:
+                rows.append((properties['metamask_time'], properties['metamask_operations'], report.duration, report.nodeid))
+    if not rows:
+        return
+
+    rows.sort(reverse=True)
+    terminalreporter.write_sep('=', 'slowest metamask tests' if limit else 'metamask time per test')
+    for metamask_time, operations, duration, nodeid in rows[:limit or None]:
+        terminalreporter.write_line('{:8.2f}s metamask {:4d} ops {:8.2f}s total  {}'.format(
+            metamask_time, operations, duration, nodeid))
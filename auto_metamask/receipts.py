@@ -0,0 +1,237 @@
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from .tracing import span
+from .waits import OperationCancelled
+
+logger = logging.getLogger(__name__)
+
+# Keep-alive sessions shared by every waiter of an RPC URL
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def rpcSession(rpc_url):
+    """Get the pooled keep-alive HTTP session of an RPC URL
+
+    :param rpc_url: RPC URL
+    :type rpc_url: String
+    :return: HTTP session
+    :rtype: requests.Session
+    """
+    with _sessions_lock:
+        session = _sessions.get(rpc_url)
+        if session is None:
+            session = requests.Session()
+            session.mount(rpc_url, HTTPAdapter(pool_connections=1, pool_maxsize=32))
+            session.headers['Content-Type'] = 'application/json'
+            _sessions[rpc_url] = session
+        return session
+
+
+class RpcError(Exception):
+    """JSON-RPC error returned by the node, or a response that isn't JSON-RPC
+    """
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class Receipt:
+    """Transaction receipt, decoded from eth_getTransactionReceipt
+
+    :param data: Receipt as returned by the node
+    :type data: Dict
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.transaction_hash = data.get('transactionHash')
+        # Pre-Byzantium receipts have a root instead of a status
+        self.status = 'success' if data.get('status', '0x1') == '0x1' else 'reverted'
+        self.gas_used = int(data.get('gasUsed') or '0x0', 16)
+        self.effective_gas_price = int(data['effectiveGasPrice'], 16) if data.get('effectiveGasPrice') else None
+        self.block_number = int(data.get('blockNumber') or '0x0', 16)
+        self.block_hash = data.get('blockHash')
+        self.contract_address = data.get('contractAddress')
+
+    @property
+    def ok(self):
+        return self.status == 'success'
+
+    def __repr__(self):
+        return '<Receipt {} {} block {} gas {}>'.format(self.transaction_hash, self.status, self.block_number, self.gas_used)
+
+    def toDict(self):
+        return {
+            'transaction_hash': self.transaction_hash,
+            'status': self.status,
+            'gas_used': self.gas_used,
+            'effective_gas_price': self.effective_gas_price,
+            'block_number': self.block_number,
+            'block_hash': self.block_hash,
+            'contract_address': self.contract_address,
+        }
+
+
+class ReceiptWaiter:
+    """Wait for transactions on chain, polling their receipts with batched JSON-RPC calls
+
+    Every poll sends one batch for all the transactions still pending, over a pooled keep-alive
+    connection. The poll interval starts at poll and grows up to max_poll while nothing gets
+    mined, it goes back to poll as soon as a receipt arrives. Rate limits and connection errors
+    back off the same way.
+
+    :param rpc_url: RPC URL of the chain
+    :type rpc_url: String
+    :param request_timeout: Timeout of one HTTP request (seconds), default is 10.
+    :type request_timeout: Number
+    :param batch_size: Maximum number of calls in one batch, default is 100.
+    :type batch_size: Number
+    """
+
+    def __init__(self, rpc_url, request_timeout=10, batch_size=100):
+        self.rpc_url = rpc_url
+        self.request_timeout = request_timeout
+        self.batch_size = batch_size
+        self.session = rpcSession(rpc_url)
+        # Set to False once the node turns a batch down
+        self.batching = True
+        self._ids = 0
+
+    def _post(self, payload):
+        response = self.session.post(self.rpc_url, json=payload, timeout=self.request_timeout)
+        if response.status_code == 429:
+            raise RpcError("Rate limited", 429)
+        response.raise_for_status()
+        return response.json()
+
+    def _nextId(self):
+        self._ids += 1
+        return self._ids
+
+    def call(self, method, params):
+        """Send one JSON-RPC call
+
+        :param method: Method, e.g. 'eth_blockNumber'
+        :type method: String
+        :param params: Parameters
+        :type params: List
+        :return: Result
+        """
+        reply = self._post({'jsonrpc': '2.0', 'id': self._nextId(), 'method': method, 'params': params})
+        if not isinstance(reply, dict):
+            raise RpcError("Invalid response")
+        if reply.get('error'):
+            raise RpcError(reply['error'].get('message', ''), reply['error'].get('code'))
+        return reply.get('result')
+
+    def batch(self, calls):
+        """Send several JSON-RPC calls, in batches of batch_size
+
+        :param calls: List of (method, params)
+        :type calls: List
+        :return: Result of each call, or the RpcError it failed with, in call order
+        :rtype: List
+        """
+        results = []
+        for start in range(0, len(calls), self.batch_size):
+            chunk = calls[start:start + self.batch_size]
+            if self.batching and len(chunk) > 1:
+                ids = [self._nextId() for _ in chunk]
+                reply = self._post([{'jsonrpc': '2.0', 'id': i, 'method': m, 'params': p} for i, (m, p) in zip(ids, chunk)])
+                if isinstance(reply, list):
+                    # Responses of a batch come in any order
+                    by_id = {r.get('id'): r for r in reply if isinstance(r, dict)}
+                    for i in ids:
+                        r = by_id.get(i)
+                        if r is None:
+                            results.append(RpcError("No response"))
+                        elif r.get('error'):
+                            results.append(RpcError(r['error'].get('message', ''), r['error'].get('code')))
+                        else:
+                            results.append(r.get('result'))
+                    continue
+                logger.info("RPC " + self.rpc_url + " doesn't support batches")
+                self.batching = False
+
+            for method, params in chunk:
+                try:
+                    results.append(self.call(method, params))
+                except RpcError as e:
+                    results.append(e)
+        return results
+
+    def fetch(self, tx_hashes):
+        """Get the receipts of transactions, once
+
+        :param tx_hashes: Transaction hashes
+        :type tx_hashes: List
+        :return: Receipt of each mined transaction, by hash
+        :rtype: Dict
+        """
+        tx_hashes = list(tx_hashes)
+        results = self.batch([('eth_getTransactionReceipt', [h]) for h in tx_hashes])
+        receipts = {}
+        for tx_hash, result in zip(tx_hashes, results):
+            if isinstance(result, RpcError):
+                logger.warning("Get receipt of " + tx_hash + " failed: " + str(result))
+            elif result:
+                receipts[tx_hash] = Receipt(result)
+        return receipts
+
+    def wait(self, tx_hashes, timeout=120, poll=0.25, max_poll=4, cancel=None):
+        """Wait until transactions are mined
+
+        :param tx_hashes: Transaction hashes
+        :type tx_hashes: List
+        :param timeout: Timeout (seconds), default is 120.
+        :type timeout: Number
+        :param poll: First poll interval (seconds), default is 0.25.
+        :type poll: Number
+        :param max_poll: Longest poll interval (seconds), default is 4.
+        :type max_poll: Number
+        :param cancel: Event that cancels the wait with OperationCancelled, default is None.
+        :type cancel: threading.Event
+        :return: Receipt of each transaction by hash, None for the ones still pending at the timeout
+        :rtype: Dict
+        """
+        pending = list(dict.fromkeys(tx_hashes))
+        receipts = dict.fromkeys(pending)
+        end_time = time.monotonic() + timeout
+        interval = poll
+        polls = 0
+
+        with span('receipts', count=len(pending)) as current:
+            while pending:
+                polls += 1
+                try:
+                    found = self.fetch(pending)
+                except (requests.RequestException, RpcError, ValueError) as e:
+                    logger.warning("Poll receipts failed: " + str(e))
+                    found = None
+
+                if found:
+                    receipts.update(found)
+                    pending = [h for h in pending if h not in found]
+                    interval = poll
+                else:
+                    interval = min(interval * (2 if found is None else 1.5), max_poll)
+
+                remaining = end_time - time.monotonic()
+                if not pending or remaining <= 0:
+                    break
+                if cancel is None:
+                    time.sleep(min(interval, remaining))
+                elif cancel.wait(min(interval, remaining)):
+                    raise OperationCancelled()
+
+            current.set(polls=polls, pending=len(pending),
+                        reverted=sum(1 for r in receipts.values() if r and not r.ok))
+
+        if pending:
+            logger.error("Transactions still pending: " + ', '.join(pending))
+        return receipts
@@ -0,0 +1,249 @@
+import os
+import re
+import json
+import shutil
+import logging
+import threading
+import subprocess
+from .cache import cache_path, fileLock, _atomicWrite
+
+logger = logging.getLogger(__name__)
+
+# Checked in order when no chrome_path is given
+_CHROME_NAMES = ['google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome']
+_CHROME_PATHS = [
+    '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+    '/Applications/Chromium.app/Contents/MacOS/Chromium',
+    os.path.expandvars(r'%ProgramFiles%\Google\Chrome\Application\chrome.exe'),
+    os.path.expandvars(r'%ProgramFiles(x86)%\Google\Chrome\Application\chrome.exe'),
+    os.path.expandvars(r'%LocalAppData%\Google\Chrome\Application\chrome.exe'),
+]
+
+_VERSION_PATTERN = re.compile(r'(\d+)\.(\d+)\.(\d+)\.(\d+)')
+
+# Resolved drivers of this process, (chrome_path, version) -> chromedriver path
+_resolved = {}
+_resolved_lock = threading.Lock()
+
+
+def _indexFile(cache_dir):
+    return os.path.join(cache_dir or cache_path, 'drivers', 'index.json')
+
+
+def _readIndex(index_file):
+    try:
+        with open(index_file, encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    index.setdefault('browsers', {})
+    index.setdefault('drivers', {})
+    return index
+
+
+def _major(version):
+    return version.split('.')[0]
+
+
+def _binaryVersion(path):
+    try:
+        output = subprocess.run([path, '--version'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                timeout=30).stdout.decode('utf-8', 'replace')
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = _VERSION_PATTERN.search(output)
+    return match.group(0) if match else None
+
+
+def findChrome():
+    """Find the installed Chrome or Chromium
+
+    :return: Browser executable path, None if not found
+    :rtype: String
+    """
+    for name in _CHROME_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    for path in _CHROME_PATHS:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def chromeVersion(chrome_path=None):
+    """Detect the version of Chrome or Chromium
+
+    :param chrome_path: Browser executable path, default is the installed Chrome.
+    :type chrome_path: String
+    :return: Version, e.g. '114.0.5735.90', None if not found
+    :rtype: String
+    """
+    if os.name == 'nt':
+        # chrome.exe --version doesn't print anything
+        if chrome_path:
+            return _fileVersion(chrome_path)
+        try:
+            import winreg
+            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r'Software\Google\Chrome\BLBeacon') as key:
+                return winreg.QueryValueEx(key, 'version')[0]
+        except OSError:
+            chrome_path = findChrome()
+            return _fileVersion(chrome_path) if chrome_path else None
+    chrome_path = chrome_path or findChrome()
+    if not chrome_path:
+        return None
+    return _binaryVersion(chrome_path)
+
+
+def _fileVersion(path):
+    # Chrome keeps its resources in a directory named after its version, next to chrome.exe
+    try:
+        versions = [name for name in os.listdir(os.path.dirname(os.path.abspath(path)))
+                    if _VERSION_PATTERN.fullmatch(name)]
+    except OSError:
+        versions = []
+    if versions:
+        return max(versions, key=lambda v: tuple(int(part) for part in v.split('.')))
+    # Else the version resource of the executable
+    try:
+        output = subprocess.run(
+            ['powershell', '-NoProfile', '-Command', '(Get-Item -LiteralPath $env:AUTO_METAMASK_CHROME).VersionInfo.ProductVersion'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=30,
+            env=dict(os.environ, AUTO_METAMASK_CHROME=path)).stdout.decode('utf-8', 'replace')
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = _VERSION_PATTERN.search(output)
+    return match.group(0) if match else None
+
+
+def registerChromedriver(chromedriver_path, cache_dir=None):
+    """Add a chromedriver binary to the index, e.g. one copied to an offline build agent
+
+    :param chromedriver_path: Chromedriver executable path
+    :type chromedriver_path: String
+    :param cache_dir: Cache directory, default is AUTO_METAMASK_CACHE or ~/.cache/auto-metamask.
+    :type cache_dir: String
+    :return: Chromedriver version
+    :rtype: String
+    """
+    version = _binaryVersion(chromedriver_path)
+    if not version:
+        raise ValueError("Not a chromedriver: " + chromedriver_path)
+
+    index_file = _indexFile(cache_dir)
+    with fileLock(index_file + '.lock'):
+        index = _readIndex(index_file)
+        index['drivers'][_major(version)] = {'path': os.path.abspath(chromedriver_path), 'version': version}
+        _atomicWrite(index_file, index)
+    logger.info("Chromedriver " + version + " registered")
+    return version
+
+
+def resolveChromedriver(chrome_path=None, version=None, cache_dir=None):
+    """Get the chromedriver matching a browser, from the on-disk index when possible
+
+    The browser version is detected once per binary and mapped to a chromedriver by major
+    version. Both are kept in an index shared by every process on the machine, so later
+    launches need neither the network nor a subprocess. On a miss, a chromedriver on PATH
+    with the right major version is used, then webdriver_manager's download.
+
+    :param chrome_path: Browser executable path, default is the installed Chrome.
+    :type chrome_path: String
+    :param version: Chromedriver version, detected from the browser if not provided, default is None.
+    :type version: String
+    :param cache_dir: Cache directory, default is AUTO_METAMASK_CACHE or ~/.cache/auto-metamask.
+    :type cache_dir: String
+    :return: Chromedriver executable path
+    :rtype: String
+    """
+    key = (chrome_path, version, cache_dir)
+    path = _resolved.get(key)
+    if path and os.path.exists(path):
+        return path
+
+    index_file = _indexFile(cache_dir)
+    path = _lookup(_readIndex(index_file), chrome_path, version)
+    if not path:
+        with fileLock(index_file + '.lock'):
+            # Another process may have resolved it while we waited
+            index = _readIndex(index_file)
+            path = _lookup(index, chrome_path, version)
+            if not path:
+                path = _resolve(index, chrome_path, version)
+                _atomicWrite(index_file, index)
+
+    with _resolved_lock:
+        _resolved[key] = path
+    return path
+
+
+def _browserKey(chrome_path):
+    chrome_path = chrome_path or findChrome()
+    if not chrome_path:
+        return None, None
+    chrome_path = os.path.realpath(chrome_path)
+    try:
+        stat = os.stat(chrome_path)
+    except OSError:
+        return chrome_path, None
+    return chrome_path, {'mtime': stat.st_mtime, 'size': stat.st_size}
+
+
+def _lookup(index, chrome_path, version):
+    if not version:
+        chrome_path, stat = _browserKey(chrome_path)
+        entry = index['browsers'].get(chrome_path)
+        if not stat or not entry or entry['mtime'] != stat['mtime'] or entry['size'] != stat['size']:
+            return None
+        version = entry['version']
+
+    driver = index['drivers'].get(_major(version))
+    if driver and os.path.exists(driver['path']):
+        return driver['path']
+    return None
+
+
+def _resolve(index, chrome_path, version):
+    if not version:
+        chrome_path, stat = _browserKey(chrome_path)
+        version = chromeVersion(chrome_path)
+        if not version:
+            raise RuntimeError("Chrome version not detected, provide version or chromedriver_path")
+        if stat:
+            index['browsers'][chrome_path] = dict(stat, version=version)
+        logger.info("Chrome " + str(chrome_path) + " version is " + version)
+
+    major = _major(version)
+    driver = index['drivers'].get(major)
+    if driver and os.path.exists(driver['path']):
+        return driver['path']
+
+    path = shutil.which('chromedriver')
+    driver_version = _binaryVersion(path) if path else None
+    if not driver_version or _major(driver_version) != major:
+        try:
+            # The version of this browser, webdriver_manager would detect the default one
+            path = _downloadChromedriver(version)
+        except Exception as e:
+            raise RuntimeError("No chromedriver found for Chrome " + major
+                               + ", add one with registerChromedriver") from e
+        driver_version = _binaryVersion(path)
+        # Never index a driver for another browser, every later process would use it
+        if not driver_version or _major(driver_version) != major:
+            raise RuntimeError("Downloaded chromedriver " + str(driver_version) + " doesn't match Chrome " + version
+                               + ", add one with registerChromedriver")
+
+    index['drivers'][major] = {'path': os.path.abspath(path), 'version': driver_version}
+    logger.info("Chromedriver " + driver_version + " resolved for Chrome " + major)
+    return path
+
+
+def _downloadChromedriver(version):
+    from webdriver_manager.chrome import ChromeDriverManager
+    try:
+        manager = ChromeDriverManager(driver_version=version)
+    except TypeError:
+        # Older releases name it version
+        manager = ChromeDriverManager(version=version)
+    return manager.install()
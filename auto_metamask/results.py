@@ -0,0 +1,85 @@
+from selenium.common.exceptions import TimeoutException
+from .waits import OperationCancelled
+
+# Kinds of failure an OperationResult reports. The MetaMask ones are recognized
+# from the error the page shows, see SelectorCatalog.errorCandidates.
+ERROR_KINDS = ('wrong-password', 'insufficient-funds', 'transaction-error', 'transaction-failed',
+               'invalid-key', 'invalid-network', 'invalid-argument', 'timeout', 'cancelled', 'failed')
+
+
+class MetaMaskError(Exception):
+    """MetaMask showed an error, or an operation failed with raise_errors set on the session
+
+    :param kind: Error kind, see ERROR_KINDS
+    :type kind: String
+    :param step: Element waited for when the error appeared, default is None.
+    :type step: String
+    :param detail: Text of the error shown by MetaMask, default is None.
+    :type detail: String
+    :param result: Result of the failed operation, default is None.
+    :type result: OperationResult
+    """
+
+    def __init__(self, kind, step=None, detail=None, result=None):
+        super().__init__(kind + (' at ' + step if step else '') + (': ' + detail if detail else ''))
+        self.kind = kind
+        self.step = step
+        self.detail = detail
+        self.result = result
+
+
+class OperationResult:
+    """Outcome of a session operation, true if it succeeded
+
+    :param ok: The operation succeeded
+    :type ok: Boolean
+    :param kind: Error kind, see ERROR_KINDS, default is None.
+    :type kind: String
+    :param step: Element (or flow step) the operation failed at, default is None.
+    :type step: String
+    :param detail: Error shown by MetaMask or the exception message, default is None.
+    :type detail: String
+    :param value: What the operation produced, e.g. the addresses imported by importAccounts, default is None.
+    :type value: Object
+    """
+
+    __slots__ = ('ok', 'kind', 'step', 'detail', 'value', 'operation', 'elapsed', 'diagnostics')
+
+    def __init__(self, ok, kind=None, step=None, detail=None, value=None):
+        self.ok = ok
+        self.kind = kind
+        self.step = step
+        self.detail = detail
+        self.value = value
+        # Set by switchPage
+        self.operation = None
+        self.elapsed = None
+        # Directory a DiagnosticsRecorder saved the failure in
+        self.diagnostics = None
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        if self.ok:
+            return '<OperationResult {} ok {:.2f}s>'.format(self.operation, self.elapsed or 0)
+        return '<OperationResult {} {} at {} {:.2f}s>'.format(self.operation, self.kind, self.step, self.elapsed or 0)
+
+    @classmethod
+    def fromException(cls, e):
+        """Failed result of an exception raised by a wait, e.g. MetaMaskError or TimeoutException
+        """
+        if isinstance(e, MetaMaskError):
+            return cls(False, e.kind, e.step, e.detail)
+        if isinstance(e, TimeoutException):
+            kind = 'timeout'
+        elif isinstance(e, OperationCancelled):
+            kind = 'cancelled'
+        else:
+            kind = 'failed'
+        return cls(False, kind, getattr(e, 'step', None), (type(e).__name__ + ': ' + str(e).strip())[:500])
+
+    def toDict(self):
+        return {'ok': self.ok, 'operation': self.operation, 'kind': self.kind, 'step': self.step,
+                'detail': self.detail, 'value': self.value, 'elapsed': self.elapsed,
+                'diagnostics': self.diagnostics}
@@ -0,0 +1,1467 @@
+import os
+import re
+import json
+import time
+import queue
+import shutil
+import logging
+import tempfile
+import threading
+from functools import wraps
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support.select import Select
+from selenium.webdriver.support import expected_conditions as EC
+from selenium_stealth import stealth
+from .waits import createWait
+from .cdp import CdpPage
+from .tracing import span, record
+from .watcher import NotificationWatcher
+from .flow import runFlow, setupMetamaskSteps, addNetworkSteps, importPKSteps
+from .catalog import getCatalog
+from .receipts import ReceiptWaiter
+from .keys import privateKeyAddress
+from .background import backgroundApi, callBackground, chainIdNumber, networkConfiguration, pendingRequests, accountAddresses
+from .policy import ApprovalPolicy, Rule
+from .results import OperationResult, MetaMaskError
+from .health import HealthMonitor
+from .diagnostics import DiagnosticsRecorder
+from .deadlines import WaitBudget, Deadline
+from .resolver import resolveChromedriver
+from .profiles import getProfile, processTree, processTreeMemory, killProcessTree
+from .extension import extractMetamask, extensionId, extensionVersion
+from .snapshot import snapshotKey, findSnapshot, saveSnapshot, restoreSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+# Routes MetaMask shows a pending request on
+_APPROVAL_ROUTES = ('#confirm', '#connect', '#signature-request', '#token-allowance')
+# Request kind and id in the route of a pending request, most specific first
+_REQUEST_ROUTE = re.compile(r'#(connect|signature-request|token-allowance|confirm-transaction)/([^/?]+)(?:/([^/?]+))?')
+_ROUTE_KINDS = {'connect': 'connect', 'signature-request': 'signature', 'token-allowance': 'allowance',
+                'token-method-approve': 'allowance', 'signature-request-original': 'signature'}
+
+
+def switchPage(func=None, page='home'):
+    """Run a session method on the metamask tab, then switch back to the previous tab
+
+    Methods returning nothing return an OperationResult, failed when they timed out or MetaMask
+    showed an error, see raise_errors.
+
+    With the 'reload' navigation the extension page is reloaded and popovers are probed for before
+    and after every call. With the 'fast' navigation the reload is skipped when the tab already
+    shows the page the method needs, and popovers are only closed when one is actually open.
+    Approval methods act directly on the notification window MetaMask opened for the request
+    when the session watches notifications.
+
+    Every method also takes a deadline keyword argument (seconds) the whole call must end by,
+    its waits are shortened to the time left.
+
+    :param page: Page the method starts on, 'home' for the wallet home, 'approval' for a pending
+        request and 'any' for methods that navigate themselves, default is 'home'.
+    :type page: String
+    """
+    if func is None:
+        return lambda f: switchPage(f, page)
+
+    @wraps(func)
+    def switch(self, *args, deadline=None, **kwargs):
+        with self.lock, span(func.__name__, page=page, navigation=self.navigation) as current:
+            # Methods calling other methods count as one operation
+            outermost = not self._depth
+            if outermost and self.health:
+                self.health.beforeOperation()
+
+            self._depth += 1
+            previous_deadline = self.budget.deadline
+            if deadline is not None and (previous_deadline is None or deadline < previous_deadline.remaining()):
+                self.budget.deadline = Deadline(deadline)
+            start = time.perf_counter()
+            failed = True
+            try:
+                try:
+                    result = _onPage(self, func, page, args, kwargs, start)
+                except (TimeoutException, MetaMaskError) as e:
+                    # Before the tab switch, e.g. waiting for the notification window
+                    result = OperationResult.fromException(e)
+                    logger.error(func.__name__ + " failed: " + str(e).strip())
+                if result is None:
+                    result = OperationResult(True)
+                if isinstance(result, OperationResult):
+                    result.operation = func.__name__
+                    result.elapsed = time.perf_counter() - start
+                    failed = not result.ok
+                else:
+                    failed = False
+                if failed:
+                    # Failures are returned, not raised, the span doesn't see them otherwise
+                    current.set(kind=result.kind, step=result.step)
+                    current.fail('timeout' if result.kind == 'timeout' else 'error',
+                                 str(result.kind) + (': ' + str(result.detail) if result.detail else ''))
+            finally:
+                self._depth -= 1
+                self.budget.deadline = previous_deadline
+                if outermost and self.health:
+                    self.health.afterOperation(time.perf_counter() - start, failed)
+
+            if outermost and failed and self.raise_errors:
+                raise MetaMaskError(result.kind, result.step, result.detail, result)
+            if outermost and not failed and func.__name__ in _JOURNALED:
+                self._remember(func.__name__, args, kwargs)
+            return result
+    return switch
+
+
+def _onPage(self, func, page, args, kwargs, start):
+    # Run func on the page it needs, and switch back to the previous tab
+    current_handle = self.page.current_window_handle
+
+    # Act on the notification window MetaMask opened for the request, if any
+    self.notification_handle = None
+    if page == 'approval' and self.watcher:
+        with span('notification') as current:
+            start = time.perf_counter()
+            self.notification_handle = self.watcher.next(self.budget.timeout('notification', self.notification_timeout))
+            if self.notification_handle:
+                self.budget.record('notification', time.perf_counter() - start)
+            current.set(found=bool(self.notification_handle))
+    target_handle = self.notification_handle or self.metamask_handle
+
+    if current_handle != target_handle:
+        self.page.switch_to.window(target_handle)
+
+    # Outermost operations are recorded on the window they run in, before switching back
+    recorder = self.diagnostics if self._depth == 1 else None
+    try:
+        if recorder:
+            recorder.capture(func.__name__)
+        try:
+            result = _runOnPage(self, func, page, args, kwargs)
+        except (TimeoutException, MetaMaskError) as e:
+            # A wait timed out or raced into an error MetaMask showed
+            result = OperationResult.fromException(e)
+            logger.error(func.__name__ + " failed: " + str(e).strip())
+        if recorder and isinstance(result, OperationResult) and not result.ok:
+            result.operation = func.__name__
+            result.elapsed = time.perf_counter() - start
+            result.diagnostics = recorder.flush(result)
+        return result
+    finally:
+        if current_handle != target_handle:
+            self.page.switch_to.window(current_handle)
+        self.notification_handle = None
+
+
+def _runOnPage(self, func, page, args, kwargs):
+    if self.notification_handle:
+        self._closePopover()
+    elif self.navigation == 'reload':
+        with span('navigate', mode='reload'):
+            self.page.get(self.metamask_url)
+
+        try:
+            self.wait_fast.until(self.catalog.clickable('popover-close')).click()
+        except Exception:
+            logger.warning("No popover")
+    else:
+        self._navigate(page)
+        self._closePopover()
+
+    result = func(self, *args, **kwargs)
+
+    if self.notification_handle:
+        pass
+    elif self.navigation == 'reload':
+        try:
+            self.wait_fast.until(self.catalog.clickable('popover-close')).click()
+        except Exception:
+            logger.warning("No popover")
+    else:
+        self._closePopover()
+    return result
+
+
+# Errors raced against the last click of a confirmation, the button stays disabled while they show
+_CONFIRM_ERRORS = ('insufficient-funds', 'transaction-error')
+
+# Operations replayed, in order, to bring a restarted browser on a fresh profile back to the same wallet
+_JOURNALED = ('setupMetamask', 'unlockMetamask', 'addNetwork', 'addNetworks', 'changeNetwork', 'importPK', 'importAccounts', 'switchAccount')
+# Only the last call matters
+_JOURNALED_LAST = ('unlockMetamask', 'changeNetwork', 'switchAccount')
+
+
+def _isOnboarded(user_data_dir):
+    return bool(user_data_dir) and os.path.isdir(
+        os.path.join(user_data_dir, 'Default', 'Local Extension Settings'))
+
+
+class MetaMaskSession:
+    """A chrome browser with the metamask extension, driven independently of other sessions
+
+    :param metamask_path: Extension file path (.zip) or unpacked extension directory
+    :type metamask_path: String
+    :param chrome_path: Chrome browser path, default is None.
+    :type chrome_path: String
+    :param version: Chrome browser version, make sure it matches the chromedriver version, if not provided, it is detected from the installed browser, default is None. if chromedriver_path is provided, this parameter will be ignored.
+    :type version: String
+    :param chromedriver_path: Chromedriver file path, default is None.
+    :type chromedriver_path: String
+    :param user_data_dir: Chrome user data directory, a temporary profile is used if not provided, default is None.
+    :type user_data_dir: String
+    :param wait_engine: 'event' to re-check waits on DOM mutations, 'poll' to poll once per second, default is 'event'.
+    :type wait_engine: String
+    :param navigation: 'fast' to reuse the metamask tab when it already shows the right page, 'reload' to reload it on every call, default is 'fast'.
+    :type navigation: String
+    :param approvals: 'notification' to handle requests in the notification window MetaMask opens for them, 'home' to handle them in the metamask tab, default is 'notification'.
+    :type approvals: String
+    :param compile_flows: Run the multi-step flows (setupMetamask, addNetwork, importPK) inside the page with a single round trip, default is True.
+    :type compile_flows: Boolean
+    :param extension_mode: 'unpacked' to extract the zip once and load the directory, 'packed' to send the zip with every launch, default is 'unpacked'.
+    :type extension_mode: String
+    :param backend: 'webdriver' to drive the extension through chromedriver, 'cdp' to drive it over a DevTools websocket kept open to its pages, selenium then only launches the browser (requires websocket-client), default is 'webdriver'.
+    :type backend: String
+    :param profile: Launch profile, 'stealth' for a full browser with the stealth patches, 'headed' without them, 'lean-headless' for the least memory, or a name given to registerProfile, default is 'stealth'.
+    :type profile: String
+    :param raise_errors: Raise MetaMaskError when an operation fails instead of returning a failed OperationResult, default is False.
+    :type raise_errors: Boolean
+    :param latency_profile: Derive the timeout of every wait from the durations observed for its element instead of the fixed 3, 20 and 40 seconds, saved on quit, default is None.
+    :type latency_profile: LatencyProfile
+    """
+
+    def __init__(self, metamask_path, chrome_path=None, version=None, chromedriver_path=None, user_data_dir=None, wait_engine='event', navigation='fast', approvals='notification', compile_flows=True, extension_mode='unpacked', backend='webdriver', profile='stealth', raise_errors=False, latency_profile=None):
+        launch_start = time.perf_counter()
+        if extension_mode == 'unpacked' and not os.path.isdir(metamask_path):
+            metamask_path = extractMetamask(metamask_path)
+        self.metamask_path = metamask_path
+        self.chrome_path = chrome_path
+        self.version = version
+        self.chromedriver_path = chromedriver_path
+        self.user_data_dir = user_data_dir
+        self.wait_engine = wait_engine
+        self.navigation = navigation
+        self.compile_flows = compile_flows
+        self.backend = backend
+        self.approvals = approvals
+        self.extension_mode = extension_mode
+        self.raise_errors = raise_errors
+        # Timeouts of the waits, learned per element and shortened to the deadline of the running call
+        self.budget = WaitBudget(latency_profile)
+        self.catalog = getCatalog(extensionVersion(metamask_path))
+        self.watcher = None
+        self.notification_handle = None
+        # How long approval methods wait for MetaMask to open its notification window
+        self.notification_timeout = 3
+        # RPC URL of every network added by the session, and the network selected, for waitReceipts
+        self.rpc_urls = {}
+        self.network = None
+        # Position in the account list of every known address (lowercase), and the selected account, for switchAccount
+        self.accounts = {}
+        self.account = None
+        # Remove the profile on quit, set for throwaway snapshot clones
+        self.temporary_profile = False
+        # Serializes operations, a browser can only do one thing at a time
+        self.lock = threading.RLock()
+        # Set to make the waits of the running operation raise OperationCancelled
+        self.cancel_event = threading.Event()
+        # Set by a HealthMonitor watching the session
+        self.health = None
+        # Set by a DiagnosticsRecorder recording the session
+        self.diagnostics = None
+        # Wallet operations, replayed by restart
+        self.journal = []
+        # Operations running, the outermost one is timed and journaled
+        self._depth = 0
+        # Called with the session after every restart
+        self.restart_callbacks = []
+
+        self.profile = getProfile(profile)
+        self._start(launch_start)
+
+    def _start(self, launch_start):
+        options = Options()
+        self.profile.apply(options)
+
+        # Chrome is controlled by automated test software
+        # options.binary_location = "/Applications/Google Chrome Dev.app/Contents/MacOS/Google Chrome Dev"
+        options.add_experimental_option('excludeSwitches', ['enable-automation'])
+        options.add_experimental_option('useAutomationExtension', False)
+        if os.path.isdir(self.metamask_path):
+            options.add_argument('--load-extension=' + os.path.realpath(self.metamask_path))
+        else:
+            options.add_extension(self.metamask_path)
+        if self.user_data_dir:
+            options.add_argument('--user-data-dir=' + self.user_data_dir)
+        if self.chrome_path:
+            # The chromedriver is resolved for this browser, its version detected if not provided
+            if os.path.exists(self.chrome_path):
+                options.binary_location = self.chrome_path
+                logger.info("Chrome path is " + self.chrome_path + (", version is " + self.version if self.version else ""))
+            else:
+                logger.warning("Chrome path not found")
+        else:
+            logger.warning("Chrome path not provided, using default")
+
+        if self.chromedriver_path:
+            s = Service(self.chromedriver_path)
+        else:
+            s = Service(resolveChromedriver(options.binary_location or None, self.version))
+        # Size of the new session request, a packed extension is sent base64 encoded in it
+        self.capabilities_size = len(json.dumps(options.to_capabilities()))
+        self.driver = webdriver.Chrome(service=s, options=options)
+
+        # Selenium Stealth settings
+        if self.profile.stealth:
+            stealth(self.driver,
+                    languages=['en-US', 'en'],
+                    vendor='Google Inc.',
+                    platform='Win32',
+                    webgl_vendor='Intel Inc.',
+                    renderer='Intel Iris OpenGL Engine',
+                    fix_hairline=True,
+                    )
+
+        # What the session methods drive the extension pages through, see _attach
+        self.page = self.driver
+        self._createWaits()
+
+        if _isOnboarded(self.user_data_dir) and os.path.isdir(self.metamask_path):
+            # MetaMask only opens its tab on install, open it ourselves
+            self.driver.get('chrome-extension://' + extensionId(self.metamask_path) + '/home.html')
+            self.metamask_handle = self.driver.current_window_handle
+        else:
+            self.wait.until(EC.number_of_windows_to_be(2))
+            self.metamask_handle = self.driver.window_handles[1]
+
+        self.driver.switch_to.window(self.metamask_handle)
+        self.wait.until(EC.url_contains('home'))
+        # The extension is ready once its UI is rendered
+        self.wait_slow.until(lambda d: d.execute_script(
+            "var app = document.getElementById('app-content'); return !!(app && app.childElementCount);"))
+
+        self.metamask_url = self.driver.current_url.split('#')[0]
+        if self.backend == 'cdp':
+            self._attach()
+        self.launch_time = time.perf_counter() - launch_start
+        record('launch', self.launch_time, extension_mode=self.extension_mode, backend=self.backend, profile=self.profile.name, capabilities_size=self.capabilities_size)
+        logger.info("Browser ready in %.2f s, session request %d bytes", self.launch_time, self.capabilities_size)
+
+        if self.approvals == 'notification':
+            self.watcher = NotificationWatcher(
+                self.driver, self.metamask_url.rsplit('/', 1)[0] + '/notification.html')
+            self.watcher.start()
+
+    @classmethod
+    def launch(cls, metamask_path, recovery_phrase, password, networks=None, **kwargs):
+        """Start a session with an onboarded wallet, reusing a profile snapshot when possible
+
+        The first launch runs the full onboarding, adds the networks and saves the profile as a snapshot.
+        Later launches clone the snapshot into a throwaway profile and only unlock the wallet. When the
+        onboarding or the unlock fails, the browser is closed, no snapshot is saved and MetaMaskError is raised.
+
+        :param metamask_path: Extension file path (.zip) or unpacked extension directory
+        :type metamask_path: String
+        :param recovery_phrase: Recovery phrase (12 words)
+        :type recovery_phrase: String
+        :param password: Wallet password (minimum 8 characters)
+        :type password: String
+        :param networks: Custom networks, a list of (network_name, rpc_url, chain_id, currency_symbol), default is None.
+        :type networks: List
+        :param kwargs: MetaMaskSession arguments (chrome_path, version, chromedriver_path, wait_engine, navigation, approvals, compile_flows, extension_mode, backend, profile, raise_errors, latency_profile)
+        :type kwargs: Dict
+        :return: Onboarded session
+        :rtype: MetaMaskSession
+        """
+        if not os.path.isdir(metamask_path):
+            metamask_path = extractMetamask(metamask_path)
+
+        key = snapshotKey(metamask_path, recovery_phrase, networks, password)
+
+        if findSnapshot(key):
+            user_data_dir = restoreSnapshot(key)
+            session = cls(metamask_path, user_data_dir=user_data_dir, **kwargs)
+            session.temporary_profile = True
+            session._unlockOrQuit(password)
+            return session
+
+        logger.info("Snapshot " + key + " not found, onboarding")
+        user_data_dir = tempfile.mkdtemp(prefix='auto-metamask-')
+        session = cls(metamask_path, user_data_dir=user_data_dir, **kwargs)
+        try:
+            result = session.setupMetamask(recovery_phrase, password)
+            if result and networks:
+                # Checked against the networks of the wallet state
+                result = session.addNetworks(networks)
+            if not result:
+                raise MetaMaskError(result.kind, result.step, result.detail, result)
+        except BaseException:
+            # A half onboarded profile must not become the snapshot of the key
+            logger.error("Onboarding failed, snapshot " + key + " not saved")
+            session.temporary_profile = True
+            session.quit()
+            raise
+
+        # The profile is only consistent on disk once Chrome has exited. Not a throwaway
+        # profile, quit stops the watcher and the websockets and keeps it.
+        session.quit()
+        saveSnapshot(user_data_dir, key)
+
+        session = cls(metamask_path, user_data_dir=user_data_dir, **kwargs)
+        session.temporary_profile = True
+        session._unlockOrQuit(password)
+        return session
+
+    def _unlockOrQuit(self, password):
+        # A profile that doesn't unlock is of no use, close it and remove it if it is a clone
+        try:
+            result = self.unlockMetamask(password)
+            if not result:
+                raise MetaMaskError(result.kind, result.step, result.detail, result)
+        except BaseException:
+            self.quit()
+            raise
+
+    def _createWaits(self):
+        # Fixed timeouts, replaced by the deadlines learned for each element with a latency profile
+        self.wait = createWait(self.page, 20, self.wait_engine, self.cancel_event, self.budget)
+        self.wait_fast = createWait(self.page, 3, self.wait_engine, self.cancel_event, self.budget)
+        self.wait_slow = createWait(self.page, 40, self.wait_engine, self.cancel_event, self.budget)
+
+    def _attach(self):
+        # Selenium launched the browser, the extension pages are driven over DevTools from now on
+        self.page = CdpPage(self.driver, self.metamask_handle)
+        self._createWaits()
+
+    def _navigate(self, page):
+        with span('navigate', mode='fast') as current:
+            url = self.page.current_url
+            if not url.startswith(self.metamask_url):
+                current.set(loaded='page')
+                self.page.get(self.metamask_url)
+                return
+
+            route = url[len(self.metamask_url):]
+            if page == 'any':
+                return
+
+            if page == 'approval':
+                if route.startswith(_APPROVAL_ROUTES) or self.catalog.find(self.page, 'footer-next', 'present'):
+                    return
+                # Only a fresh home page redirects to the pending request
+                current.set(loaded='page')
+                self.page.get(self.metamask_url)
+                return
+
+            if route not in ('', '#', '#/'):
+                # Same document navigation, the extension is not reloaded
+                current.set(loaded='route')
+                self.page.get(self.metamask_url + '#')
+
+    def _fail(self, kind, step=None, detail=None):
+        return OperationResult(False, kind, step, detail)
+
+    def _flowFailed(self, result):
+        # The failing step of a compiled flow, and the error MetaMask showed if any
+        failed = [s for s in result['steps'] if not s['ok'] and not s['skipped']]
+        step = failed[-1]['name'] if failed else None
+        kind = result.get('error') or ('timeout' if failed and failed[-1]['error'] == 'timeout' else 'failed')
+        return OperationResult(False, kind, step, result.get('detail') or (failed[-1]['error'] if failed else None))
+
+    def _shownRequest(self):
+        # Id of the request the notification window shows, read before acting on it
+        if not self.notification_handle:
+            return None
+        match = _REQUEST_ROUTE.search(self.page.current_url)
+        return match.group(2) if match else None
+
+    def _waitApprovalDone(self, request_id=None):
+        if self.notification_handle:
+            # MetaMask closes the notification window once its last request is handled, and
+            # shows the next pending one in it otherwise
+            handle = self.notification_handle
+            if request_id:
+                check = self._queueChanged(request_id)
+            else:
+                check = lambda d: not self.watcher.isOpen(handle)
+            try:
+                self.wait.until(check)
+            except TimeoutException:
+                raise TimeoutException("Notification window still shows the request, it was not resolved")
+            return True
+
+        # This button is only available when the popup is closed
+        return self.wait.until(self.catalog.clickable('send-button'))
+
+    def _closePopover(self):
+        with span('popover') as current:
+            try:
+                button = self.catalog.find(self.page, 'popover-close')
+                current.set(found=bool(button))
+                if button:
+                    button.click()
+            except Exception:
+                logger.warning("Close popover failed")
+
+    def memoryUsage(self):
+        """Memory of the whole browser: chromedriver, Chrome and all its processes
+
+        :return: {'rss': bytes, 'pss': bytes or None, 'processes': Number}, pss counts shared pages once, None if it can't be measured
+        :rtype: Dict
+        """
+        try:
+            return processTreeMemory(self.driver.service.process.pid)
+        except Exception:
+            logger.warning("Measure memory failed")
+            return None
+
+    def _remember(self, name, args, kwargs):
+        if name in _JOURNALED_LAST:
+            self.journal = [entry for entry in self.journal if entry[0] != name]
+        self.journal.append((name, args, kwargs))
+
+    def _stopBrowser(self, force=False):
+        # Chrome ids first, a hung browser may outlive its chromedriver
+        pids = []
+        process = getattr(self.driver.service, 'process', None)
+        if process is not None and os.path.isdir('/proc/self'):
+            pids = processTree(process.pid)
+        if force:
+            killProcessTree(pids)
+
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+        if self.page is not self.driver:
+            self.page.close()
+        try:
+            self.driver.quit()
+        except Exception:
+            logger.warning("Quit browser failed")
+            killProcessTree(pids)
+        if force and self.user_data_dir:
+            # Left by the killed browser, it would keep the next one off the profile
+            for name in ('SingletonLock', 'SingletonSocket', 'SingletonCookie'):
+                try:
+                    os.remove(os.path.join(self.user_data_dir, name))
+                except OSError:
+                    pass
+
+    def restart(self, force=False):
+        """Start a new browser on the same wallet state, e.g. after a crash
+
+        A persistent profile is reopened and unlocked. Otherwise, when a profile snapshot of the
+        journaled onboarding exists (see launch, saved without networks), a clone of it is unlocked
+        and the other wallet operations of the session are replayed on it. Without one every wallet
+        operation (setupMetamask, importPK, importAccounts, addNetwork(s), changeNetwork,
+        switchAccount, unlockMetamask) is replayed, the full onboarding included, which is slow.
+        Dapp tabs opened in the old browser are lost.
+
+        :param force: Kill the browser processes instead of asking chromedriver to close them, default is False.
+        :type force: Boolean
+        :raises MetaMaskError: An operation failed while restoring the wallet, the session is not usable
+        """
+        with self.lock:
+            start = time.perf_counter()
+            self._stopBrowser(force)
+            if _isOnboarded(self.user_data_dir):
+                mode = 'unlock'
+            else:
+                mode = 'snapshot' if self._restoreSnapshot() else 'replay'
+            self._start(start)
+            # The operations below are part of the restart, not journaled or timed again
+            self._depth += 1
+            try:
+                self._restore(mode)
+            finally:
+                self._depth -= 1
+
+            for callback in self.restart_callbacks:
+                callback(self)
+            record('restart', time.perf_counter() - start, force=force, replayed=len(self.journal), mode=mode)
+
+    def _journalArgs(self, name, names):
+        # Arguments of the last journaled call of an operation, by name
+        params = None
+        for entry, args, kwargs in self.journal:
+            if entry == name:
+                params = dict(zip(names, args), **kwargs)
+        return params
+
+    def _restoreSnapshot(self):
+        # Clone the snapshot of the journaled onboarding into a throwaway profile, never over a profile of the caller
+        setup = self._journalArgs('setupMetamask', ('recovery_phrase', 'password'))
+        if not setup or (self.user_data_dir and not self.temporary_profile) or not os.path.isdir(self.metamask_path):
+            return False
+        key = snapshotKey(self.metamask_path, setup['recovery_phrase'], None, setup['password'])
+        if not findSnapshot(key):
+            return False
+        if self.user_data_dir:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+        self.user_data_dir = restoreSnapshot(key)
+        self.temporary_profile = True
+        return True
+
+    def _restore(self, mode):
+        if mode == 'replay':
+            entries = list(self.journal)
+        else:
+            unlock = self._journalArgs('unlockMetamask', ('password',)) or self._journalArgs('setupMetamask', ('recovery_phrase', 'password'))
+            entries = [('unlockMetamask', (unlock['password'],), {})] if unlock else []
+            if mode == 'snapshot':
+                entries += [entry for entry in self.journal if entry[0] not in ('setupMetamask', 'unlockMetamask')]
+        for name, args, kwargs in entries:
+            result = getattr(self, name)(*args, **kwargs)
+            if isinstance(result, OperationResult) and not result.ok:
+                # A locked or partly restored wallet must not pass for the old one
+                logger.error("Restore failed at " + name)
+                raise MetaMaskError(result.kind, result.step, result.detail, result)
+
+    def quit(self):
+        """Close the browser, and remove its profile if it is a throwaway snapshot clone
+        """
+        with self.lock:
+            if self.diagnostics:
+                self.diagnostics.close()
+            if self.budget.profile:
+                try:
+                    self.budget.profile.save()
+                except Exception:
+                    logger.exception("Save latency profile failed")
+            self._stopBrowser()
+
+            if self.temporary_profile and self.user_data_dir:
+                shutil.rmtree(self.user_data_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.quit()
+
+    @switchPage(page='any')
+    def setupMetamask(self, recovery_phrase, password):
+        """Setup metamask wallet
+
+        :param recovery_phrase: Recovery phrase (12 words)
+        :type recovery_phrase: String
+        :param password: Wallet password (minimum 8 characters)
+        :type password: String
+        """
+
+        if self.compile_flows:
+            words = recovery_phrase.split(' ')
+            if len(words) not in [12, 15, 18, 21, 24]:
+                logger.error(
+                    "Invalid recovery phrase. The phrase should be 12, 15, 18, 21, or 24 words long.")
+                return self._fail('invalid-argument', detail="Invalid recovery phrase length")
+            result = runFlow(self.page, setupMetamaskSteps(self.catalog, words, password), self.catalog, budget=self.budget)
+            if not result['ok']:
+                logger.error("Setup failed")
+                return self._flowFailed(result)
+            logger.info('Setup success')
+            return
+
+        self.wait_slow.until(self.catalog.invisible('loading-overlay'))
+        self.wait.until(self.catalog.clickable('onboarding-terms')).click()
+        self.wait.until(self.catalog.clickable('onboarding-import')).click()
+        self.wait.until(self.catalog.clickable('metametrics-no-thanks')).click()
+
+        # Split the recovery phrase into individual words
+        words = recovery_phrase.split(' ')
+        word_count = len(words)
+
+        # Check if the length of the words is valid
+        if word_count not in [12, 15, 18, 21, 24]:
+            logger.error(
+                "Invalid recovery phrase. The phrase should be 12, 15, 18, 21, or 24 words long.")
+            return self._fail('invalid-argument', detail="Invalid recovery phrase length")
+        else:
+            # Select the dropdown
+            # //*[@id="app-content"]/div/div[2]/div/div/div/div[4]/div/div/div[2]/select
+            # //*[contains(@class, 'dropdown__select')]
+            # //div[@class='import-srp__container']//select[@class='dropdown__select']
+            select = Select(self.wait.until(self.catalog.clickable('srp-dropdown')))
+
+            # Select option by value (number of words)
+            select.select_by_value(str(word_count))
+            # For each input field
+            for i in range(word_count):
+                # Get the corresponding word
+                word = words[i]
+
+                # Input the word into the field
+                self.wait.until(self.catalog.visible('srp-word', i=i)).send_keys(word)
+
+        # Click the confirm button
+        self.wait.until(self.catalog.clickable('srp-confirm')).click()
+
+        # find the password input and type the password
+        new_password = self.wait.until(
+            self.catalog.visible('password-new'))
+        new_password.send_keys(password)
+
+        # find the confirm password input and type the password
+        confirm_password = self.wait.until(
+            self.catalog.visible('password-confirm'))
+        confirm_password.send_keys(password)
+
+        # find the terms checkbox and click
+        terms_checkbox = self.catalog.find(self.page, 'password-terms', 'present')
+        terms_checkbox.click()
+
+        # find the submit button and click
+        submit_button = self.catalog.find(self.page, 'password-import', 'present')
+        submit_button.click()
+
+        # find the all done button and click
+        self.wait.until(self.catalog.clickable('onboarding-done')).click()
+
+        self.wait.until(self.catalog.clickable('pin-next')).click()
+
+        self.wait.until(self.catalog.clickable('pin-done')).click()
+
+        try:
+            self.wait.until(self.catalog.clickable('popover-close')).click()
+        except Exception:
+            logger.warning("No welcome popover")
+            return
+
+        try:
+            # This button is only available when the popup is closed
+            self.wait.until(self.catalog.clickable('send-button'))
+        except Exception as e:
+            logger.error("Setup failed")
+            return OperationResult.fromException(e)
+
+        logger.info('Setup success')
+
+    @switchPage(page='any')
+    def unlockMetamask(self, password):
+        """Unlock metamask wallet
+
+        :param password: Wallet password
+        :type password: String
+        """
+
+        self.wait.until(self.catalog.visible('unlock-password')).send_keys(password)
+        self.wait.until(self.catalog.clickable('unlock-submit')).click()
+
+        try:
+            # This button is only available when the popup is closed
+            self.wait.until(self.catalog.clickable('send-button', errors=('wrong-password',)))
+        except Exception as e:
+            logger.error("Unlock failed")
+            return OperationResult.fromException(e)
+
+        logger.info('Unlock success')
+
+    @switchPage(page='any')
+    def addNetwork(self, network_name, rpc_url, chain_id, currency_symbol):
+        """Add a custom network
+
+        :param network_name: Network name
+        :type network_name: String
+        :param rpc_url: RPC URL
+        :type rpc_url: String
+        :param chain_id: Chain ID
+        :type chain_id: String
+        :param currency_symbol: Currency symbol
+        :type currency_symbol: String
+        """
+
+        # Switch to the settings page
+        self.page.get(self.metamask_url + '#settings/networks/add-network')
+
+        if self.compile_flows:
+            result = runFlow(self.page, addNetworkSteps(self.catalog, network_name, rpc_url, chain_id, currency_symbol),
+                             self.catalog, errors=('invalid-network',), budget=self.budget)
+            if not result['ok']:
+                logger.error("Add network failed")
+                return self._flowFailed(result)
+            self.rpc_urls[network_name] = rpc_url
+            self.network = network_name
+            logger.info('Add network success')
+            return
+
+        # network-display
+        # self.wait.until(EC.element_to_be_clickable(
+        #     (By.CSS_SELECTOR, "button[data-testid='network-display']"))).click()
+
+        # //div[contains(@class, 'multichain-network-list-menu-content-wrapper')]//button[contains(@class, 'mm-button-secondary')]
+        # self.wait.until(EC.element_to_be_clickable(
+        #     (By.XPATH, "//div[contains(@class, 'multichain-network-list-menu-content-wrapper')]//button[contains(@class, 'mm-button-secondary')]"))).click()
+
+        self.wait.until(self.catalog.visible('network-form-input', n=1)).send_keys(network_name)
+        self.wait.until(self.catalog.visible('network-form-input', n=2)).send_keys(rpc_url)
+        self.wait.until(self.catalog.visible('network-form-input', n=3)).send_keys(chain_id)
+        self.wait.until(self.catalog.visible('network-form-input', n=4)).send_keys(currency_symbol)
+
+        self.wait.until(self.catalog.clickable('network-form-save', errors=('invalid-network',))).click()
+
+        try:
+            self.wait.until(self.catalog.clickable('network-switch-to')).click()
+        except Exception as e:
+            logger.error("Add network failed")
+            return OperationResult.fromException(e)
+
+        self.rpc_urls[network_name] = rpc_url
+        self.network = network_name
+        logger.info('Add network success')
+
+    @switchPage(page='any')
+    def addNetworks(self, networks, select=None):
+        """Add several custom networks at once
+
+        The configurations are written through the MetaMask background API in one round trip and
+        checked with a single state read. Versions without a supported API, and networks the check
+        doesn't find, go through the settings form like addNetwork.
+
+        :param networks: Custom networks, a list of (network_name, rpc_url, chain_id, currency_symbol)
+        :type networks: List
+        :param select: Name of the network to switch to, the current network is kept if not provided, default is None.
+        :type select: String
+        :return: Result, its value is the names of the networks added
+        :rtype: OperationResult
+        """
+
+        networks = [tuple(network) for network in networks]
+        missing = networks
+        api = backgroundApi(self.catalog.version)
+        if api is None:
+            logger.info("MetaMask " + self.catalog.version + " doesn't support state injection, using the form")
+        else:
+            with span('inject', count=len(networks)) as current:
+                # The selected network last, it becomes the active one
+                ordered = sorted(networks, key=lambda n: n[0] == select)
+                writes = [(api['upsert-network'], [networkConfiguration(*n), {
+                    'setActive': n[0] == select, 'referrer': 'metamask', 'source': 'custom_network_form'}])
+                    for n in ordered]
+                results = callBackground(self.page, api, [writes, [(api['state'], [])]], self.budget.limit(20))
+
+                state = {}
+                if len(results) == 2:
+                    state = results[1][0].get('result') or {}
+                configured = {(c.get('rpcUrl'), chainIdNumber(c.get('chainId', 0)))
+                              for c in (state.get('networkConfigurations') or {}).values()}
+                missing = [n for n in networks if (n[1], chainIdNumber(n[2])) not in configured]
+                current.set(missing=len(missing))
+
+        if missing and api is not None:
+            logger.warning("Networks not found after injection, using the form: " + ', '.join(n[0] for n in missing))
+        failed = None
+        for network in missing:
+            result = self.addNetwork(*network)
+            if not result:
+                logger.error("Add network " + network[0] + " failed")
+                if failed is None:
+                    failed = OperationResult(False, result.kind, result.step, network[0] + ': ' + str(result.detail))
+        added = [n for n in networks if n not in missing or self.rpc_urls.get(n[0]) == n[1]]
+        self.rpc_urls.update((n[0], n[1]) for n in added)
+        if failed is not None:
+            return failed
+
+        if select and select in [n[0] for n in missing]:
+            result = self.changeNetwork(select)
+            if not result:
+                return result
+        if select:
+            self.network = select
+        logger.info('Add networks success')
+        return OperationResult(True, value=[n[0] for n in networks])
+
+    @switchPage
+    def changeNetwork(self, network_name):
+        """Switch to a network
+
+        :param network_name: Network name
+        :type network_name: String
+        """
+
+        logger.info('Change network')
+
+        # display the network list
+        self.wait.until(self.catalog.clickable('network-display')).click()
+
+
+
+        try:
+            self.wait.until(self.catalog.clickable('network-test-toggle')).click()
+
+        except Exception:
+            logger.error("no need to show test networks")
+
+        # click the network name
+        self.wait.until(self.catalog.present('network-item', name=network_name)).click()
+
+        try:
+            # check if the network is changed
+            self.wait.until(self.catalog.clickable('network-current', name=network_name))
+        except Exception as e:
+            logger.error("Change network failed")
+            return OperationResult.fromException(e)
+
+        self.network = network_name
+        logger.info('Change network success')
+
+    @switchPage
+    def importPK(self, priv_key):
+        """Import private key
+
+        :param priv_key: Private key
+        :type priv_key: String
+        """
+
+        if self.compile_flows:
+            result = runFlow(self.page, importPKSteps(self.catalog, priv_key), self.catalog, errors=('invalid-key',), budget=self.budget)
+            if not result['ok']:
+                logger.error("Import PK failed")
+                return self._flowFailed(result)
+            logger.info('Import PK success')
+            return
+
+        # Click the account menu
+        self.wait.until(self.catalog.clickable('account-menu')).click()
+        # Click the import account button
+        self.wait.until(self.catalog.clickable('account-import')).click()
+
+        key_input = self.wait.until(self.catalog.visible('private-key-input'))
+
+        key_input.send_keys(priv_key)
+
+        # Click the import button
+        self.wait.until(self.catalog.clickable('import-account-confirm')).click()
+
+        try:
+            # This button is only available when the popup is closed
+            self.wait.until(self.catalog.clickable('send-button', errors=('invalid-key',)))
+        except Exception as e:
+            logger.error("Import PK failed")
+            return OperationResult.fromException(e)
+
+        logger.info('Import PK success')
+
+    @switchPage
+    def importAccounts(self, private_keys):
+        """Import several private keys at once
+
+        The keys are imported through the MetaMask background API in one round trip, and the
+        account index used by switchAccount is rebuilt from a single state read. Versions without
+        a supported API go through the import form for every key, without reloading the page.
+
+        :param private_keys: Private keys
+        :type private_keys: List
+        :return: Result, its value is the addresses (lowercase) of the new accounts
+        :rtype: OperationResult
+        """
+
+        private_keys = list(private_keys)
+        api = backgroundApi(self.catalog.version)
+        if api is None:
+            logger.info("MetaMask " + self.catalog.version + " doesn't support state injection, using the form")
+            try:
+                # The form doesn't show the addresses, they are derived from the keys
+                addresses = [privateKeyAddress(key) for key in private_keys]
+            except ValueError as e:
+                logger.error("Import accounts failed")
+                return self._fail('invalid-key', detail=str(e))
+            if self.compile_flows:
+                steps = [s for key in private_keys for s in importPKSteps(self.catalog, key)]
+                result = runFlow(self.page, steps, self.catalog, errors=('invalid-key',), budget=self.budget)
+                if not result['ok']:
+                    logger.error("Import accounts failed")
+                    return self._flowFailed(result)
+            else:
+                for key in private_keys:
+                    result = MetaMaskSession.importPK.__wrapped__(self, key)
+                    if result is not None and not result:
+                        logger.error("Import accounts failed")
+                        return result
+            if addresses:
+                # MetaMask selects the last account imported
+                self.account = addresses[-1]
+            logger.info('Import accounts success')
+            return OperationResult(True, value=addresses)
+
+        with span('inject', count=len(private_keys)) as current:
+            # One key per batch, the keyring is saved after every import
+            batches = [[(api['state'], [])]]
+            batches += [[(api['import-account'], ['privateKey', [key]])] for key in private_keys]
+            batches.append([(api['state'], [])])
+            results = callBackground(self.page, api, batches, timeout=self.budget.limit(20 + len(private_keys)))
+
+            if len(results) != len(batches):
+                logger.error("Import accounts failed")
+                errors = [r.get('error') for batch in results for r in batch if r.get('error')]
+                return self._fail('failed', 'import-account', errors[0] if errors else None)
+            before = set(a.lower() for a in accountAddresses(results[0][0].get('result') or {}))
+            state = results[-1][0].get('result') or {}
+            added = [a for a in self._indexAccounts(state) if a.lower() not in before]
+            current.set(added=len(added))
+
+        if len(added) < len(private_keys):
+            # Keys already in the wallet are not added again
+            logger.warning("Imported {} of {} accounts".format(len(added), len(private_keys)))
+        logger.info('Import accounts success')
+        return OperationResult(True, value=[a.lower() for a in added])
+
+    def _indexAccounts(self, state):
+        addresses = accountAddresses(state)
+        self.accounts = {address.lower(): position for position, address in enumerate(addresses)}
+        if state.get('selectedAddress'):
+            self.account = state['selectedAddress'].lower()
+        return addresses
+
+    @switchPage
+    def switchAccount(self, address):
+        """Select the active account
+
+        The account is looked up in the index kept by importAccounts, the account list is only
+        read again for an address the index doesn't know.
+
+        :param address: Account address
+        :type address: String
+        """
+
+        key = address.lower()
+        api = backgroundApi(self.catalog.version)
+        if api is None:
+            # Click the account in the account list
+            self.wait.until(self.catalog.clickable('account-menu')).click()
+            try:
+                self.wait.until(self.catalog.clickable(
+                    'account-item', short=key[:7] + '...' + key[-5:], address=key)).click()
+            except Exception as e:
+                logger.error("Switch account failed, " + address + " not found")
+                return OperationResult.fromException(e)
+            self.account = key
+            logger.info('Switch account success')
+            return
+
+        batches = []
+        if key not in self.accounts:
+            batches.append([(api['state'], [])])
+        batches.append([(api['select-account'], [key])])
+        results = callBackground(self.page, api, batches, self.budget.limit(20))
+        if len(batches) == 2 and results:
+            self._indexAccounts(results[0][0].get('result') or {})
+        if key not in self.accounts or len(results) != len(batches) or 'error' in results[-1][0]:
+            logger.error("Switch account failed, " + address + " not found")
+            return self._fail('failed', 'select-account', address + " not found")
+
+        self.account = key
+        logger.info('Switch account success')
+
+    @switchPage(page='approval')
+    def connect(self):
+        """Connect wallet
+        """
+
+        request_id = self._shownRequest()
+
+        # Next
+        self.wait.until(self.catalog.clickable('footer-next')).click()
+
+        # Confirm
+        self.wait.until(self.catalog.clickable('footer-next')).click()
+
+        try:
+            self._waitApprovalDone(request_id)
+        except Exception as e:
+            logger.error("Connect wallet failed")
+            return OperationResult.fromException(e)
+
+        logger.info('Connect wallet successfully')
+
+    @switchPage(page='approval')
+    def approve(self):
+        """Approve wallet
+        """
+
+        request_id = self._shownRequest()
+
+        self.wait.until(self.catalog.clickable('approve-button')).click()
+
+        self.wait.until(self.catalog.clickable('approve-button', errors=_CONFIRM_ERRORS)).click()
+
+        try:
+            self._waitApprovalDone(request_id)
+        except Exception as e:
+            logger.error("Approve failed")
+            return OperationResult.fromException(e)
+
+        logger.info('Approve successfully')
+
+    @switchPage(page='approval')
+    def approveTokens(self, cap=None):
+        """Approve tokens
+
+        :param cap: Spending limit, must be greater than 0, default is None.
+        :type cap: Number
+        """
+
+        try:
+            self.wait_fast.until(self.catalog.clickable('use-default'))
+        except Exception:
+            logger.warning('Refresh page')
+            self.page.refresh()
+
+        request_id = self._shownRequest()
+
+        if cap:
+            if isinstance(cap, int) and cap > 0:
+                self.wait.until(self.catalog.visible('spending-cap')).send_keys(str(cap))
+            else:
+                logger.error("Invalid cap")
+                return self._fail('invalid-argument', detail="Invalid cap " + str(cap))
+        else:
+            self.wait.until(self.catalog.clickable('use-default')).click()
+
+        self.wait.until(self.catalog.clickable('footer-next')).click()
+
+        self.wait.until(self.catalog.clickable('footer-next', errors=_CONFIRM_ERRORS)).click()
+
+        try:
+            self._waitApprovalDone(request_id)
+        except Exception as e:
+            logger.error("Approve failed")
+            return OperationResult.fromException(e)
+
+        logger.info('Approve successfully')
+
+    @switchPage(page='approval')
+    def confirm(self):
+        """Confirm wallet
+
+        Use for Transaction, Sign, Deploy Contract, Create Token, Add Token, Sign In, etc.
+        """
+
+        try:
+            self.wait_fast.until(self.catalog.clickable('footer-next', errors=_CONFIRM_ERRORS))
+        except MetaMaskError as e:
+            # Insufficient funds or a failing transaction, the button stays disabled
+            logger.error("Confirm failed: " + str(e))
+            return OperationResult.fromException(e)
+        except Exception:
+            logger.warning('Refresh page')
+            self.page.refresh()
+
+        request_id = self._shownRequest()
+
+        self.wait.until(self.catalog.clickable('footer-next', errors=_CONFIRM_ERRORS)).click()
+
+        try:
+            self._waitApprovalDone(request_id)
+        except Exception as e:
+            logger.error("Connect wallet failed")
+            return OperationResult.fromException(e)
+
+        logger.info('Sign successfully')
+
+    def _currentRequest(self, known, api):
+        # Route of the request shown, e.g. #confirm-transaction/<id>/token-method-approve
+        match = _REQUEST_ROUTE.search(self.page.current_url)
+        if not match:
+            return None
+        prefix, request_id, suffix = match.groups()
+        if request_id not in known and api:
+            state = callBackground(self.page, api, [[(api['state'], [])]], self.budget.limit(20))
+            known.update(pendingRequests(state[0][0].get('result') or {}) if state else {})
+        if request_id in known:
+            return dict(known[request_id])
+
+        # Not in the background state, read it from the page
+        kind = _ROUTE_KINDS.get(suffix) or _ROUTE_KINDS.get(prefix, 'transaction')
+        if kind == 'transaction' and self.catalog.find(self.page, 'use-default', 'present'):
+            kind = 'allowance'
+        origin = self.catalog.find(self.page, 'request-origin', 'present')
+        return {'id': request_id, 'kind': kind, 'origin': origin.text.strip() if origin else None, 'value': None}
+
+    def _queueChanged(self, request_id):
+        # Next request id, or None once the queue is empty
+        def check(driver):
+            if self.notification_handle and not self.watcher.isOpen(self.notification_handle):
+                return 'empty'
+            try:
+                match = _REQUEST_ROUTE.search(driver.current_url)
+            except WebDriverException:
+                return 'empty'
+            if match:
+                return match.group(2) != request_id and match.group(2)
+            return not self.notification_handle and self.catalog.find(driver, 'send-button') and 'empty'
+        return check
+
+    def _actOnRequest(self, request, rule):
+        if rule.action == 'reject':
+            self.wait.until(self.catalog.clickable('footer-cancel')).click()
+            return
+        if request['kind'] == 'allowance':
+            if rule.cap:
+                self.wait.until(self.catalog.visible('spending-cap')).send_keys(str(rule.cap))
+            else:
+                self.wait.until(self.catalog.clickable('use-default')).click()
+        # Connections and allowances have a second step
+        steps = 2 if request['kind'] in ('connect', 'allowance') else 1
+        for _ in range(steps):
+            self.wait.until(self.catalog.clickable('footer-next')).click()
+
+    @switchPage(page='approval')
+    def drainPending(self, policy=None):
+        """Handle every pending request in one visit, in the order MetaMask shows them
+
+        Each request (connect, signature, transaction or token allowance) is handed to the policy with
+        its origin and value, read from the MetaMask background when the version supports it.
+
+        :param policy: ApprovalPolicy, or a function taking the request and returning a Rule or 'approve'/'reject', approves everything if not provided, default is None.
+        :type policy: ApprovalPolicy
+        :return: Outcome of each request, {'id', 'kind', 'origin', 'value', 'action', 'ok', 'error', 'elapsed'}
+        :rtype: List
+        """
+
+        policy = policy or ApprovalPolicy.approveAll()
+        decide = policy.decide if hasattr(policy, 'decide') else policy
+        api = backgroundApi(self.catalog.version)
+        known = {}
+        outcomes = []
+
+        try:
+            state = self.wait_fast.until(self._queueChanged(None))
+        except TimeoutException:
+            state = 'empty'
+        while state != 'empty':
+            start = time.perf_counter()
+            request = self._currentRequest(known, api)
+            if request is None:
+                break
+            rule = decide(request)
+            if isinstance(rule, str):
+                rule = Rule(rule)
+            outcome = dict(request, action=rule.action, ok=True, error=None)
+            with span('request', kind=request['kind'], action=rule.action) as current:
+                try:
+                    self._actOnRequest(request, rule)
+                    state = self.wait.until(self._queueChanged(request['id']))
+                except Exception as e:
+                    outcome.update(ok=False, error=repr(e))
+                    current.set(outcome='error')
+                    state = 'empty'
+            outcome['elapsed'] = time.perf_counter() - start
+            outcomes.append(outcome)
+            logger.info("Request " + str(request['id']) + " (" + request['kind'] + ") " + rule.action +
+                         (" done" if outcome['ok'] else " failed"))
+
+        logger.info('Drained ' + str(len(outcomes)) + ' requests')
+        return outcomes
+
+    @switchPage
+    def waitPending(self, timeout=None):
+        """Wait pending
+
+        :param timeout: Timeout (seconds), default is the deadline learned with a latency profile, else 40.
+        :type timeout: Number
+        """
+
+        self.wait.until(self.catalog.clickable('activity-tab')).click()
+
+        try:
+            if timeout and isinstance(timeout, (int, float)):
+                wait_temp = createWait(self.page, timeout, self.wait_engine, self.cancel_event, self.budget, adaptive=False)
+            else:
+                wait_temp = createWait(self.page, 40, self.wait_engine, self.cancel_event, self.budget)
+
+            # Nothing pending, a failed transaction already in the list is not reported
+            if not self.catalog.visible('pending-label')(self.page):
+                logger.info('No pending transaction')
+                return
+            # The pending transaction failing or being dropped ends the wait at once, it is
+            # the latest item of the list once it leaves the pending ones
+            wait_temp.until_not(self.catalog.visible('pending-label', errors=('transaction-failed',)))
+        except Exception as e:
+            logger.error("Wait pending failed or timeout")
+            return OperationResult.fromException(e)
+
+        logger.info('Wait pending successfully')
+
+    def waitReceipts(self, tx_hashes, timeout=120, rpc_url=None):
+        """Wait until transactions are mined, asking the chain instead of the wallet UI
+
+        Receipts are polled with batched JSON-RPC calls on the RPC URL of the selected network
+        (given to addNetwork, addNetworks or changeNetwork).
+
+        :param tx_hashes: Transaction hashes
+        :type tx_hashes: List
+        :param timeout: Timeout (seconds), default is 120.
+        :type timeout: Number
+        :param rpc_url: RPC URL, default is the one of the selected network.
+        :type rpc_url: String
+        :return: Receipt of each transaction by hash, None for the ones still pending at the timeout
+        :rtype: Dict
+        """
+
+        rpc_url = rpc_url or self.rpc_urls.get(self.network)
+        if not rpc_url:
+            raise ValueError("No RPC URL known for network " + str(self.network) + ", pass rpc_url")
+        return ReceiptWaiter(rpc_url).wait(tx_hashes, timeout, cancel=self.cancel_event)
+
+    @switchPage
+    def disconnect(self):
+        """
+        Disconnect wallet from given sites after transaction done.
+        :return:
+        """
+        try:
+            self.wait.until(self.catalog.clickable('account-options')).click()
+            self.wait.until(self.catalog.clickable('connected-sites')).click()
+            self.wait.until(self.catalog.clickable('connected-site-disconnect')).click()
+            self.wait.until(self.catalog.clickable('disconnect-button')).click()
+            logger.info('Disconnect successfully')
+        except Exception as e:
+            logger.warning('Disconnect failed')
+            return OperationResult.fromException(e)
+
+
+class MetaMaskPool:
+    """A pool of onboarded sessions, launched in background threads
+
+    The first session onboards the wallet and saves the profile snapshot, the others are
+    restored from it in parallel.
+
+    :param size: Number of sessions kept ready
+    :type size: Number
+    :param metamask_path: Extension file path (.zip) or unpacked extension directory
+    :type metamask_path: String
+    :param recovery_phrase: Recovery phrase (12 words)
+    :type recovery_phrase: String
+    :param password: Wallet password (minimum 8 characters)
+    :type password: String
+    :param networks: Custom networks, a list of (network_name, rpc_url, chain_id, currency_symbol), default is None.
+    :type networks: List
+    :param health: Watch every session with a HealthMonitor using this policy, default is None.
+    :type health: HealthPolicy
+    :param diagnostics: Record every session with a DiagnosticsRecorder created with these arguments (directory, capacity, mode, quota, every_nth_frame), default is None.
+    :type diagnostics: Dict
+    :param kwargs: MetaMaskSession arguments (chrome_path, version, chromedriver_path, wait_engine, navigation, approvals, compile_flows, extension_mode, backend, profile, raise_errors, latency_profile)
+    :type kwargs: Dict
+    """
+
+    def __init__(self, size, metamask_path, recovery_phrase, password, networks=None, health=None, diagnostics=None, **kwargs):
+        self.size = size
+        self.health = health
+        self.diagnostics = diagnostics
+        self._launch_args = (metamask_path, recovery_phrase, password, networks)
+        self._launch_kwargs = kwargs
+        self._ready = queue.Queue()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+        self._closed = False
+
+        if not os.path.isdir(metamask_path):
+            self._launch_args = (extractMetamask(metamask_path),) + self._launch_args[1:]
+
+        threading.Thread(target=self._warm, daemon=True).start()
+
+    def _warm(self):
+        metamask_path, recovery_phrase, password, networks = self._launch_args
+        key = snapshotKey(metamask_path, recovery_phrase, networks, password)
+        count = self.size
+        if not findSnapshot(key) and count:
+            # Launch one session first so the others can restore its snapshot
+            self._launch()
+            count -= 1
+        for _ in range(count):
+            threading.Thread(target=self._launch, daemon=True).start()
+
+    def _launch(self):
+        try:
+            session = MetaMaskSession.launch(*self._launch_args, **self._launch_kwargs)
+        except Exception:
+            logger.exception("Launch session failed")
+            self._ready.put(None)
+            return
+        if self.health:
+            HealthMonitor(session, self.health)
+        if self.diagnostics is not None:
+            DiagnosticsRecorder(session, **self.diagnostics)
+
+        with self._sessions_lock:
+            if self._closed:
+                session.quit()
+                return
+            self._sessions.append(session)
+        self._ready.put(session)
+
+    def checkout(self, timeout=None):
+        """Take a ready session out of the pool, waiting for one if necessary
+
+        :param timeout: Timeout (seconds), wait forever if not provided, default is None.
+        :type timeout: Number
+        :return: Onboarded session
+        :rtype: MetaMaskSession
+        """
+        session = self._ready.get(timeout=timeout)
+        if session is None:
+            raise RuntimeError("Launch session failed, see auto-metamask.log")
+        return session
+
+    def checkin(self, session, discard=False):
+        """Return a session to the pool
+
+        :param session: Session taken with checkout
+        :type session: MetaMaskSession
+        :param discard: Close the session and launch a fresh one in the background, default is False.
+        :type discard: Boolean
+        """
+        if discard or self._closed:
+            with self._sessions_lock:
+                if session in self._sessions:
+                    self._sessions.remove(session)
+            session.quit()
+            if not self._closed:
+                threading.Thread(target=self._launch, daemon=True).start()
+            return
+
+        try:
+            # Leave the session on its metamask tab, ready for the next user
+            session.driver.switch_to.window(session.metamask_handle)
+        except Exception:
+            logger.warning("Session is broken, replacing it")
+            self.checkin(session, discard=True)
+            return
+
+        self._ready.put(session)
+
+    def memoryUsage(self):
+        """Memory of every browser of the pool, checked out or not
+
+        :return: {'rss': bytes, 'pss': bytes or None, 'processes': Number, 'sessions': Number}
+        :rtype: Dict
+        """
+        with self._sessions_lock:
+            sessions = list(self._sessions)
+        total = {'rss': 0, 'pss': 0, 'processes': 0, 'sessions': 0}
+        for session in sessions:
+            usage = session.memoryUsage()
+            if not usage:
+                continue
+            total['rss'] += usage['rss']
+            total['pss'] = None if usage['pss'] is None or total['pss'] is None else total['pss'] + usage['pss']
+            total['processes'] += usage['processes']
+            total['sessions'] += 1
+        return total
+
+    def close(self):
+        """Close every session of the pool
+        """
+        with self._sessions_lock:
+            self._closed = True
+            sessions = list(self._sessions)
+            self._sessions = []
+        for session in sessions:
+            session.quit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
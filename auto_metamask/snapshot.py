@@ -0,0 +1,154 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+from .cache import cache_path
+from .extension import extensionId, extensionVersion
+
+logger = logging.getLogger(__name__)
+
+snapshot_path = os.path.join(cache_path, 'snapshots')
+
+# Chrome regenerates these on launch, copying them only slows the clone down
+# and the Singleton* links would make Chrome think the profile is in use.
+_SKIP_NAMES = {
+    'SingletonLock', 'SingletonSocket', 'SingletonCookie', 'RunningChromeVersion',
+    'Crashpad', 'BrowserMetrics', 'Cache', 'Code Cache', 'GPUCache', 'ShaderCache',
+    'GrShaderCache', 'GraphiteDawnCache', 'component_crx_cache', 'Safe Browsing',
+}
+
+# LevelDB table files are never modified after they are written, so a
+# snapshot and its clones can safely share them through hardlinks.
+_IMMUTABLE_SUFFIXES = ('.ldb', '.sst')
+
+
+def snapshotKey(metamask_path, recovery_phrase, networks=None, password=None):
+    """Build the snapshot key of an onboarded profile
+
+    The password is part of the key, the wallet of a snapshot only unlocks with the password it
+    was onboarded with. So is the id of an unpacked extension: the wallet is stored under it, and
+    it changes with the directory (another cache, a re-downloaded zip of the same version).
+
+    :param metamask_path: Extension file path (.zip) or unpacked extension directory
+    :type metamask_path: String
+    :param recovery_phrase: Recovery phrase
+    :type recovery_phrase: String
+    :param networks: Custom networks, a list of addNetwork arguments, default is None.
+    :type networks: List
+    :param password: Wallet password, default is None.
+    :type password: String
+    :return: Snapshot key
+    :rtype: String
+    """
+    digest = hashlib.sha256()
+    digest.update(' '.join(recovery_phrase.split()).encode('utf-8'))
+    digest.update(json.dumps([list(n) for n in networks or []]).encode('utf-8'))
+    if password is not None:
+        digest.update(b'\0' + hashlib.sha256(password.encode('utf-8')).digest())
+    if os.path.isdir(metamask_path):
+        digest.update(b'\0' + extensionId(metamask_path).encode('ascii'))
+    return extensionVersion(metamask_path) + '-' + digest.hexdigest()[:16]
+
+
+def findSnapshot(key):
+    """Find a saved snapshot
+
+    :param key: Snapshot key
+    :type key: String
+    :return: Snapshot directory, None if not found
+    :rtype: String
+    """
+    path = os.path.join(snapshot_path, key)
+    if os.path.isdir(path):
+        return path
+    return None
+
+
+def saveSnapshot(user_data_dir, key):
+    """Save a Chrome user data directory as a snapshot
+
+    The browser using the directory must be closed first.
+
+    :param user_data_dir: Chrome user data directory
+    :type user_data_dir: String
+    :param key: Snapshot key
+    :type key: String
+    :return: Snapshot directory
+    :rtype: String
+    """
+    os.makedirs(snapshot_path, exist_ok=True)
+    target = os.path.join(snapshot_path, key)
+
+    temp_dir = tempfile.mkdtemp(prefix='.' + key + '-', dir=snapshot_path)
+    _cloneTree(user_data_dir, temp_dir, link=False)
+
+    try:
+        os.rename(temp_dir, target)
+    except OSError:
+        # Another worker saved the same snapshot first
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        logger.info("Snapshot " + key + " already exists")
+        return target
+
+    logger.info("Snapshot " + key + " saved")
+    return target
+
+
+def restoreSnapshot(key, user_data_dir=None):
+    """Clone a snapshot into a throwaway Chrome user data directory
+
+    :param key: Snapshot key
+    :type key: String
+    :param user_data_dir: Target directory, a temporary directory is created if not provided, default is None.
+    :type user_data_dir: String
+    :return: Chrome user data directory
+    :rtype: String
+    """
+    source = findSnapshot(key)
+    if not source:
+        raise FileNotFoundError("Snapshot " + key + " not found")
+
+    if not user_data_dir:
+        user_data_dir = tempfile.mkdtemp(prefix='auto-metamask-')
+
+    _cloneTree(source, user_data_dir, link=True)
+    logger.info("Snapshot " + key + " restored to " + user_data_dir)
+    return user_data_dir
+
+
+def _cloneTree(source, target, link):
+    for root, dirs, files in os.walk(source):
+        dirs[:] = [d for d in dirs if d not in _SKIP_NAMES]
+        relative = os.path.relpath(root, source)
+        target_root = os.path.join(target, relative) if relative != '.' else target
+        os.makedirs(target_root, exist_ok=True)
+
+        for name in files:
+            if name in _SKIP_NAMES:
+                continue
+            src = os.path.join(root, name)
+            dst = os.path.join(target_root, name)
+            if os.path.islink(src):
+                continue
+            if link and name.endswith(_IMMUTABLE_SUFFIXES):
+                try:
+                    os.link(src, dst)
+                    continue
+                except OSError:
+                    pass
+            _copyFile(src, dst)
+
+
+def _copyFile(source, target):
+    # Try a copy-on-write clone first (btrfs, xfs), then a regular copy
+    try:
+        import fcntl
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), 0x40049409, src.fileno())  # FICLONE
+        shutil.copystat(source, target)
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copy2(source, target)
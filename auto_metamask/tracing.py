@@ -0,0 +1,324 @@
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+# Spans are handed to a queue on the calling thread and written to the sinks by
+# a listener thread, so a slow sink never delays the browser automation.
+_queue = queue.SimpleQueue()
+
+
+class _SpanQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # The span is all the sinks need, skip formatting the message
+        return record
+
+
+_handler = _SpanQueueHandler(_queue)
+_sinks = []
+_listener = None
+_sinks_lock = threading.Lock()
+
+_current = contextvars.ContextVar('auto_metamask_span', default=None)
+
+
+class Span:
+    """A timed operation, created with span()
+
+    :param name: Operation name, e.g. 'confirm', 'wait' or 'click'
+    :type name: String
+    :param parent: Enclosing span, default is None.
+    :type parent: Span
+    :param attributes: Details of the operation, e.g. element, selector, retries
+    :type attributes: Dict
+    """
+
+    __slots__ = ('name', 'span_id', 'trace_id', 'parent_id', 'attributes', 'outcome', 'error', 'start')
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes or {}
+        self.outcome = 'ok'
+        self.error = None
+        self.start = time.time()
+
+    def set(self, **attributes):
+        """Add attributes to the span
+        """
+        self.attributes.update(attributes)
+
+    def fail(self, outcome, error):
+        """Mark the span as failed without an exception, e.g. for an operation returning a failed result
+
+        :param outcome: 'timeout' or 'error'
+        :type outcome: String
+        :param error: Error message
+        :type error: String
+        """
+        self.outcome = outcome
+        self.error = error[:500]
+
+    def toDict(self, duration):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start,
+            'duration': duration,
+            'outcome': self.outcome,
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+
+class _NullSpan:
+    def set(self, **attributes):
+        pass
+
+    def fail(self, outcome, error):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def isTracing():
+    """Check if any sink is listening
+
+    :return: True if spans are recorded
+    :rtype: Boolean
+    """
+    return bool(_sinks)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time a block of code, e.g. with span('wait', element='footer-next') as s: ...
+
+    Spans opened inside the block are its children. An exception marks the span as 'timeout'
+    (for TimeoutException) or 'error' and is re-raised. Nothing is recorded without a sink.
+
+    :param name: Operation name
+    :type name: String
+    :param attributes: Details of the operation
+    :return: Span, use span.set() to add attributes
+    :rtype: Span
+    """
+    if not _sinks:
+        yield _NULL_SPAN
+        return
+
+    current = Span(name, _current.get(), attributes)
+    token = _current.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.outcome = 'timeout' if type(e).__name__ == 'TimeoutException' else 'error'
+        current.error = (type(e).__name__ + ': ' + str(e).strip())[:500]
+        raise
+    finally:
+        _current.reset(token)
+        _emit(current.toDict(time.perf_counter() - start))
+
+
+def record(name, duration, start=None, outcome='ok', error=None, **attributes):
+    """Record a span measured elsewhere, e.g. a step timed inside the page
+
+    :param name: Operation name
+    :type name: String
+    :param duration: Duration (seconds)
+    :type duration: Number
+    :param start: Start time (seconds since the epoch), default is now minus the duration.
+    :type start: Number
+    :param outcome: 'ok', 'timeout', 'skipped' or 'error', default is 'ok'.
+    :type outcome: String
+    :param error: Error message, default is None.
+    :type error: String
+    :param attributes: Details of the operation
+    """
+    if not _sinks:
+        return
+    current = Span(name, _current.get(), attributes)
+    current.start = start if start is not None else time.time() - duration
+    current.outcome = outcome
+    current.error = error
+    _emit(current.toDict(duration))
+
+
+def _emit(data):
+    _handler.handle(logging.makeLogRecord({
+        'name': 'auto_metamask.trace', 'levelno': logging.INFO, 'levelname': 'INFO',
+        'msg': data['name'], 'span': data,
+    }))
+
+
+def addSink(sink):
+    """Send spans to a sink
+
+    :param sink: JsonLinesSink, MemorySink, OTelSink or any logging.Handler, the span is in record.span
+    :type sink: logging.Handler
+    :return: The sink
+    :rtype: logging.Handler
+    """
+    with _sinks_lock:
+        _sinks.append(sink)
+        _restartListener()
+    return sink
+
+
+def removeSink(sink):
+    """Stop sending spans to a sink, pending spans are delivered first
+
+    :param sink: Sink added with addSink
+    :type sink: logging.Handler
+    """
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+            _restartListener()
+
+
+def flushSpans():
+    """Wait until every recorded span reached the sinks
+    """
+    with _sinks_lock:
+        _restartListener()
+
+
+def _restartListener():
+    global _listener
+    if _listener:
+        # Delivers what is queued before returning
+        _listener.stop()
+        _listener = None
+    if _sinks:
+        _listener = QueueListener(_queue, *_sinks)
+        _listener.start()
+
+
+@atexit.register
+def _stopListener():
+    if _listener:
+        _listener.stop()
+
+
+class JsonLinesSink(logging.FileHandler):
+    """Append spans to a file, one JSON object per line
+
+    :param path: File path
+    :type path: String
+    """
+
+    def __init__(self, path):
+        super().__init__(path, encoding='utf-8')
+
+    def format(self, record):
+        return json.dumps(record.span, default=str)
+
+
+def _label(data):
+    element = data['attributes'].get('element')
+    return data['name'] + ' ' + element if element else data['name']
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class MemorySink(logging.Handler):
+    """Keep the latest spans in memory and aggregate them
+
+    :param capacity: Number of spans kept, default is 10000.
+    :type capacity: Number
+    """
+
+    def __init__(self, capacity=10000):
+        super().__init__()
+        self.spans = deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.spans.append(record.span)
+
+    def clear(self):
+        """Forget the recorded spans
+        """
+        self.spans.clear()
+
+    def summary(self):
+        """Aggregate the spans by name (and element, for waits and clicks)
+
+        :return: {label: {'count', 'errors', 'total', 'p50', 'p95', 'max'}}, times in seconds
+        :rtype: Dict
+        """
+        groups = {}
+        for data in list(self.spans):
+            groups.setdefault(_label(data), []).append(data)
+
+        result = {}
+        for label, spans in groups.items():
+            durations = [s['duration'] for s in spans]
+            result[label] = {
+                'count': len(spans),
+                'errors': sum(1 for s in spans if s['outcome'] not in ('ok', 'skipped')),
+                'total': sum(durations),
+                'p50': _percentile(durations, 50),
+                'p95': _percentile(durations, 95),
+                'max': max(durations),
+            }
+        return result
+
+
+class OTelSink(logging.Handler):
+    """Export spans through an OpenTelemetry tracer (requires opentelemetry-api)
+
+    Children finish before their parent, so the spans of an operation are buffered until its
+    top-level span arrives and then exported as one tree with their recorded times.
+
+    :param tracer: OpenTelemetry tracer, default is the global tracer provider's 'auto_metamask' tracer.
+    :type tracer: Tracer
+    """
+
+    def __init__(self, tracer=None):
+        super().__init__()
+        from opentelemetry import trace
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer('auto_metamask')
+        self._pending = {}
+
+    def emit(self, record):
+        data = record.span
+        if data['parent_id']:
+            self._pending.setdefault(data['trace_id'], []).append(data)
+            # Operations whose top-level span never comes (sink added midway)
+            if len(self._pending) > 100:
+                self._pending.pop(next(iter(self._pending)))
+            return
+        self._export(data, self._pending.pop(data['trace_id'], []), None)
+
+    def _export(self, data, spans, context):
+        start = int(data['start'] * 1e9)
+        attributes = {k: v if isinstance(v, (str, bool, int, float)) else str(v)
+                      for k, v in data['attributes'].items() if v is not None}
+        attributes['outcome'] = data['outcome']
+        current = self.tracer.start_span(data['name'], context=context, start_time=start, attributes=attributes)
+        if data['outcome'] not in ('ok', 'skipped'):
+            current.set_status(self._trace.Status(self._trace.StatusCode.ERROR, data['error']))
+
+        child_context = self._trace.set_span_in_context(current)
+        for child in spans:
+            if child['parent_id'] == data['span_id']:
+                self._export(child, spans, child_context)
+        current.end(end_time=start + int(data['duration'] * 1e9))
@@ -0,0 +1,250 @@
+import copy
+import time
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.webdriver.support.wait import WebDriverWait
+from .tracing import span, isTracing
+
+# Resolves on the first DOM mutation, or after arguments[0] milliseconds so that
+# changes a MutationObserver can't see (layout, transitions) are still noticed.
+_MUTATION_SCRIPT = """
+var timeout = arguments[0], done = arguments[arguments.length - 1];
+var timer = null, observer = null;
+function finish(changed) {
+    if (observer) observer.disconnect();
+    if (timer) clearTimeout(timer);
+    done(changed);
+}
+if (typeof MutationObserver === 'undefined' || !document.documentElement) {
+    return done(null);
+}
+observer = new MutationObserver(function () { finish(true); });
+observer.observe(document.documentElement, {subtree: true, childList: true, attributes: true, characterData: true});
+timer = setTimeout(function () { finish(false); }, timeout);
+"""
+
+
+class EventWait:
+    """Drop-in replacement for WebDriverWait that re-checks on DOM mutations
+
+    Instead of sleeping a fixed interval between checks, it waits inside the page for the next
+    DOM mutation, so the condition is re-evaluated as soon as the page changes. When the observer
+    can't be used (page navigating, no document) it falls back to polling every poll_frequency.
+
+    :param driver: Selenium WebDriver
+    :type driver: WebDriver
+    :param timeout: Timeout (seconds)
+    :type timeout: Number
+    :param poll_frequency: Fallback polling interval (seconds), default is 0.05.
+    :type poll_frequency: Number
+    :param ignored_exceptions: Exceptions ignored while checking, default is (NoSuchElementException,).
+    :type ignored_exceptions: Tuple
+    :param idle: Longest time to wait for a mutation before checking again (seconds), default is 0.25.
+    :type idle: Number
+    """
+
+    def __init__(self, driver, timeout, poll_frequency=0.05, ignored_exceptions=None, idle=0.25):
+        self._driver = driver
+        self._timeout = float(timeout)
+        self._poll = poll_frequency
+        self._idle = idle
+        self._ignored_exceptions = (NoSuchElementException,) + tuple(ignored_exceptions or ())
+
+    def __repr__(self):
+        return '<{0.__class__.__name__}(timeout={0._timeout})>'.format(self)
+
+    def until(self, method, message=''):
+        """Wait until the method returns a truthy value
+
+        :param method: Condition called with the driver, e.g. an expected_conditions object
+        :type method: Callable
+        :param message: Message of the TimeoutException, default is ''.
+        :type message: String
+        :return: Value returned by the method
+        """
+        end_time = time.monotonic() + self._timeout
+        while True:
+            try:
+                value = method(self._driver)
+                if value:
+                    return value
+            except self._ignored_exceptions:
+                pass
+            if time.monotonic() > end_time:
+                break
+            self._waitForChange(end_time)
+        raise TimeoutException(message)
+
+    def until_not(self, method, message=''):
+        """Wait until the method returns a falsy value
+
+        :param method: Condition called with the driver, e.g. an expected_conditions object
+        :type method: Callable
+        :param message: Message of the TimeoutException, default is ''.
+        :type message: String
+        :return: Value returned by the method
+        """
+        end_time = time.monotonic() + self._timeout
+        while True:
+            try:
+                value = method(self._driver)
+                if not value:
+                    return value
+            except self._ignored_exceptions:
+                return True
+            if time.monotonic() > end_time:
+                break
+            self._waitForChange(end_time)
+        raise TimeoutException(message)
+
+    def _waitForChange(self, end_time):
+        remaining = end_time - time.monotonic()
+        idle = max(min(self._idle, remaining), 0)
+        try:
+            changed = self._driver.execute_async_script(_MUTATION_SCRIPT, int(idle * 1000))
+        except WebDriverException:
+            changed = None
+        if changed is None:
+            time.sleep(min(self._poll, max(remaining, 0)))
+
+
+class TracedElement(WebElement):
+    """WebElement returned by TracedWait, clicks and typing are recorded as spans
+
+    :param element: Element found by the wait
+    :type element: WebElement
+    :param name: Logical element name used in the spans
+    :type name: String
+    """
+
+    def __init__(self, element, name):
+        super().__init__(element.parent, element.id)
+        self._name = name
+
+    def click(self):
+        with span('click', element=self._name):
+            super().click()
+
+    def send_keys(self, *value):
+        # The typed text is not recorded, it is often a password or a key
+        with span('type', element=self._name):
+            super().send_keys(*value)
+
+
+class OperationCancelled(Exception):
+    """Raised inside a wait when the operation it belongs to was cancelled
+    """
+
+
+class TracedWait:
+    """Wrap a wait object so that every wait is recorded as a span and can be cancelled
+
+    The span carries the element and the selector that matched (for SelectorCatalog conditions),
+    how many times the condition was re-checked and the outcome. Once the cancel event is set,
+    the next check raises OperationCancelled. With a budget, waits for catalog elements use the
+    deadline learned for the element instead of the fixed timeout, are recorded in its latency
+    profile, and every wait ends by the deadline of the running call.
+
+    :param wait: EventWait or WebDriverWait
+    :type wait: EventWait
+    :param cancel: Event that cancels the waits, default is None.
+    :type cancel: threading.Event
+    :param budget: Timeouts of the session, default is None.
+    :type budget: WaitBudget
+    :param adaptive: Use the learned deadlines, default is True.
+    :type adaptive: Boolean
+    """
+
+    def __init__(self, wait, cancel=None, budget=None, adaptive=True):
+        self._wait = wait
+        self._cancel = cancel
+        self._budget = budget
+        self._adaptive = adaptive
+
+    def __repr__(self):
+        return '<TracedWait({!r})>'.format(self._wait)
+
+    def until(self, method, message=''):
+        """Same as EventWait.until
+        """
+        return self._traced('until', method, message)
+
+    def until_not(self, method, message=''):
+        """Same as EventWait.until_not
+        """
+        return self._traced('until_not', method, message)
+
+    def _traced(self, mode, method, message):
+        checks = [0]
+
+        def check(driver):
+            if self._cancel is not None and self._cancel.is_set():
+                raise OperationCancelled()
+            checks[0] += 1
+            return method(driver)
+
+        name = getattr(method, 'element', None) or getattr(method, '__name__', type(method).__name__)
+        wait = self._wait
+        # Only catalog elements are profiled, other conditions have no stable name
+        step = None
+        if self._budget is not None:
+            step = getattr(method, 'element', None)
+            if step and mode == 'until_not':
+                step = 'not ' + step
+            timeout = self._budget.timeout(step, wait._timeout, self._adaptive)
+            if timeout != wait._timeout:
+                wait = copy.copy(wait)
+                wait._timeout = timeout
+        start = time.perf_counter()
+
+        if not isTracing():
+            try:
+                value = getattr(wait, mode)(check, message)
+            except TimeoutException as e:
+                # Read by OperationResult.fromException
+                e.step = name
+                raise
+            if step:
+                self._budget.record(step, time.perf_counter() - start)
+            return value
+
+        with span('wait', element=name, condition=getattr(method, 'condition', None), mode=mode,
+                  timeout=wait._timeout) as current:
+            try:
+                value = getattr(wait, mode)(check, message)
+            except TimeoutException as e:
+                e.step = name
+                raise
+            finally:
+                current.set(retries=max(checks[0] - 1, 0), selector=getattr(method, 'selector', None))
+        if step:
+            self._budget.record(step, time.perf_counter() - start)
+        if type(value) is WebElement:
+            return TracedElement(value, name)
+        if hasattr(value, 'trace_name'):
+            # CdpElement records its own spans
+            value.trace_name = name
+        return value
+
+
+def createWait(driver, timeout, engine='event', cancel=None, budget=None, adaptive=True):
+    """Create a wait object for the given engine
+
+    :param driver: Selenium WebDriver
+    :type driver: WebDriver
+    :param timeout: Timeout (seconds)
+    :type timeout: Number
+    :param engine: 'event' for EventWait, 'poll' for WebDriverWait polling once per second, default is 'event'.
+    :type engine: String
+    :param cancel: Event that cancels the waits, default is None.
+    :type cancel: threading.Event
+    :param budget: Timeouts of the session, learned deadlines and the deadline of the running call, default is None.
+    :type budget: WaitBudget
+    :param adaptive: Use the learned deadlines instead of the timeout, default is True.
+    :type adaptive: Boolean
+    :return: Wait object, recording a span per wait when tracing
+    :rtype: TracedWait
+    """
+    if engine == 'poll':
+        return TracedWait(WebDriverWait(driver, timeout, 1), cancel, budget, adaptive)
+    return TracedWait(EventWait(driver, timeout), cancel, budget, adaptive)
@@ -0,0 +1,104 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationWatcher:
+    """Watch for MetaMask notification windows in a background thread
+
+    MetaMask opens notification.html in a popup window for every dapp request. The watcher lists
+    the browser targets over CDP (Target.getTargets, which doesn't change the driver's current
+    window) every interval seconds and wakes up waiters as soon as a notification window appears.
+
+    :param driver: Selenium Chrome WebDriver
+    :type driver: WebDriver
+    :param notification_url: MetaMask notification page, e.g. chrome-extension://<id>/notification.html
+    :type notification_url: String
+    :param interval: Time between two target lists (seconds), default is 0.1.
+    :type interval: Number
+    """
+
+    def __init__(self, driver, notification_url, interval=0.1):
+        self.driver = driver
+        self.notification_url = notification_url
+        self.interval = interval
+        # Open notification windows, oldest first
+        self.handles = []
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start watching
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching
+        """
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify_all()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                targets = self.driver.execute_cdp_cmd('Target.getTargets', {})['targetInfos']
+            except Exception:
+                # The browser is gone or busy, keep trying until stopped
+                logger.debug("List targets failed")
+                self._stopped.wait(self.interval * 10)
+                continue
+
+            target_ids = [t['targetId'] for t in targets
+                          if t.get('type') == 'page' and t.get('url', '').startswith(self.notification_url)]
+            with self._condition:
+                opened = [t for t in target_ids if t not in self.handles]
+                self.handles = [h for h in self.handles if h in target_ids] + opened
+                if opened:
+                    logger.info("Notification window opened")
+                    self._condition.notify_all()
+
+            self._stopped.wait(self.interval)
+
+    def next(self, timeout):
+        """Wait for a notification window
+
+        :param timeout: Timeout (seconds)
+        :type timeout: Number
+        :return: Window handle of the oldest open notification window, None on timeout
+        :rtype: String
+        """
+        end_time = time.monotonic() + timeout
+        with self._condition:
+            while not self.handles and not self._stopped.is_set():
+                remaining = end_time - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            if not self.handles:
+                return None
+            target_id = self.handles[0]
+
+        # Window handles are the target ids, older chromedrivers prefix them
+        for handle in self.driver.window_handles:
+            if handle == target_id or handle.endswith(target_id):
+                return handle
+        return None
+
+    def isOpen(self, handle):
+        """Check if a notification window is still open
+
+        :param handle: Window handle
+        :type handle: String
+        :return: True if the window is open
+        :rtype: Boolean
+        """
+        with self._condition:
+            return any(handle == h or handle.endswith(h) for h in self.handles)
@@ -17,19 +17,21 @@ DESCRIPTION = 'Web3 automation testing tool.'
 URL = 'https://github.com/aimkiray/auto-metamask'
 EMAIL = 'root@meowwoo.com'
 AUTHOR = 'aimkiray'
-REQUIRES_PYTHON = '>=3.6.0'
+REQUIRES_PYTHON = '>=3.8.0'
 VERSION = ''
 
 # What packages are required for this module to be executed?
 REQUIRED = [
         'selenium-stealth >= 1.0.6',
         'selenium >= 4.2.0',
-        'webdriver-manager >= 3.7.0',
+        'webdriver-manager >= 3.7.0, < 5',
     ],
 
 # What packages are optional?
 EXTRAS = {
     # 'fancy feature': ['django'],
+    'cdp': ['websocket-client >= 1.0.0'],
+    'pytest': ['pytest >= 7.0.0', 'pytest-xdist >= 3.0.0'],
 }
 
 # The rest you shouldn't have to touch too much :)
@@ -112,6 +114,10 @@ setup(
     # entry_points={
     #     'console_scripts': ['mycli=mymodule:cli'],
     # },
+    entry_points={
+        'console_scripts': ['auto-metamask-load=auto_metamask.load:main'],
+        'pytest11': ['auto_metamask = auto_metamask.pytest_plugin'],
+    },
     install_requires=REQUIRED,
     extras_require=EXTRAS,
     include_package_data=True,
@@ -122,7 +128,7 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: Implementation :: CPython',
         'Programming Language :: Python :: Implementation :: PyPy'
     ],